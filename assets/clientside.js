@@ -0,0 +1,319 @@
+// --- Clientside mode of the dashboards (DASH_CLIENTSIDE=1, see cube.py) ---
+// Filters the daily aggregate cube by date, regroups it by day/week/month and builds
+// the KPI cards and figures in the browser, the same way test.py and
+// dashboard_julia.py do on the server.
+
+(function () {
+    var DAY = 86400000;
+
+    // --- Cube queries ---
+    function bisect(values, target) {
+        var lo = 0, hi = values.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >> 1;
+            if (values[mid] < target) { lo = mid + 1; } else { hi = mid; }
+        }
+        return lo;
+    }
+
+    function dayRange(cube, start, end) {
+        // [lo, hi) positions in cube.days of the days in [start, end]
+        var lo = bisect(cube.days, String(start).slice(0, 10));
+        var hi = bisect(cube.days, String(end).slice(0, 10) + "~");
+        return [lo, Math.max(lo, hi)];
+    }
+
+    function total(cube, name, range) {
+        var values = cube.totals[name], sum = 0;
+        for (var i = range[0]; i < range[1]; i++) { sum += values[i]; }
+        return sum;
+    }
+
+    function groupSums(cube, name, range, keep) {
+        // {key: sum} over the range, largest first; `keep(key)` filters composite keys
+        var group = cube.groups[name], sums = {};
+        for (var i = bisect(group.day, range[0]); i < group.day.length && group.day[i] < range[1]; i++) {
+            var key = group.keys[group.key[i]];
+            if (keep && !keep(key)) { continue; }
+            var label = Array.isArray(key) ? key[key.length - 1] : key;
+            sums[label] = (sums[label] || 0) + group.value[i];
+        }
+        return Object.keys(sums).map(function (k) { return [k, sums[k]]; })
+            .sort(function (a, b) { return b[1] - a[1]; });
+    }
+
+    // --- Granularity (pandas' D, W = weeks ending on Sunday, M = month ends) ---
+    var LABELS = {D: "dia", W: "semana", M: "mês"};
+
+    function parseDay(text) {
+        var p = text.split("-");
+        return Date.UTC(+p[0], +p[1] - 1, +p[2]);
+    }
+
+    function formatDay(time) {
+        return new Date(time).toISOString().slice(0, 10);
+    }
+
+    function bucketOf(time, freq) {
+        var d = new Date(time);
+        if (freq === "W") { return time + ((7 - d.getUTCDay()) % 7) * DAY; }
+        if (freq === "M") { return Date.UTC(d.getUTCFullYear(), d.getUTCMonth() + 1, 0); }
+        return time;
+    }
+
+    function nextBucket(time, freq) {
+        if (freq === "M") {
+            var d = new Date(time);
+            return Date.UTC(d.getUTCFullYear(), d.getUTCMonth() + 2, 0);
+        }
+        return time + (freq === "W" ? 7 : 1) * DAY;
+    }
+
+    function resolveFreq(freq, start, end, maxPoints) {
+        if (freq !== "auto") { return freq; }
+        var days = (parseDay(String(end).slice(0, 10)) - parseDay(String(start).slice(0, 10))) / DAY + 1;
+        if (days <= maxPoints) { return "D"; }
+        if (days / 7 <= maxPoints) { return "W"; }
+        return "M";
+    }
+
+    function series(cube, names, range, freq) {
+        // {x: [bucket labels], <name>: [sums]} with empty buckets as 0, like pd.Grouper
+        var out = {x: []}, positions = {};
+        names.forEach(function (name) { out[name] = []; });
+        if (range[0] >= range[1]) { return out; }
+        var last = bucketOf(parseDay(cube.days[range[1] - 1]), freq);
+        for (var b = bucketOf(parseDay(cube.days[range[0]]), freq); b <= last; b = nextBucket(b, freq)) {
+            positions[b] = out.x.length;
+            out.x.push(formatDay(b));
+            names.forEach(function (name) { out[name].push(0); });
+        }
+        for (var i = range[0]; i < range[1]; i++) {
+            var position = positions[bucketOf(parseDay(cube.days[i]), freq)];
+            names.forEach(function (name) { out[name][position] += cube.totals[name][i]; });
+        }
+        return out;
+    }
+
+    // --- Downsampling (same as downsample.lttb) ---
+    function lttb(values, threshold) {
+        var count = values.length, indices = [0];
+        if (threshold >= count || threshold < 3) {
+            return values.map(function (_, i) { return i; });
+        }
+        var size = (count - 2) / (threshold - 2), selected = 0;
+        for (var bucket = 0; bucket < threshold - 2; bucket++) {
+            var start = Math.floor(bucket * size) + 1, end = Math.floor((bucket + 1) * size) + 1;
+            var nextStart = end, nextEnd = Math.min(Math.floor((bucket + 2) * size) + 1, count);
+            if (nextStart >= nextEnd) { nextStart = count - 1; nextEnd = count; }
+            var avgX = (nextStart + nextEnd - 1) / 2, avgY = 0;
+            for (var j = nextStart; j < nextEnd; j++) { avgY += values[j]; }
+            avgY /= nextEnd - nextStart;
+            var best = start, bestArea = -1, yA = values[selected];
+            for (var k = start; k < end; k++) {
+                var area = Math.abs((selected - avgX) * (values[k] - yA) - (selected - k) * (avgY - yA));
+                if (area > bestArea) { best = k; bestArea = area; }
+            }
+            indices.push(best);
+            selected = best;
+        }
+        indices.push(count - 1);
+        return indices;
+    }
+
+    function linePoints(points, names, maxPoints) {
+        // Union of the LTTB points of each line, like downsample.line_points
+        if (points.x.length <= maxPoints) { return {points: points, sampled: false}; }
+        var keep = {};
+        names.forEach(function (name) {
+            lttb(points[name], maxPoints).forEach(function (i) { keep[i] = true; });
+        });
+        var indices = Object.keys(keep).map(Number).sort(function (a, b) { return a - b; });
+        var out = {x: indices.map(function (i) { return points.x[i]; })};
+        names.forEach(function (name) { out[name] = indices.map(function (i) { return points[name][i]; }); });
+        return {points: out, sampled: true};
+    }
+
+    function chartTitle(title, freq, requested, sampled) {
+        var notes = [];
+        if (requested === "auto") { notes.push("por " + LABELS[freq]); }
+        if (sampled) { notes.push("amostrado"); }
+        return notes.length ? title + " (" + notes.join(", ") + ")" : title;
+    }
+
+    // --- Figures and components ---
+    function figure(cube, data, layout) {
+        return {data: data, layout: Object.assign({}, cube.layout, layout)};
+    }
+
+    function lineFigure(cube, lines, names, traces, title, freq, requested) {
+        var reduced = linePoints(lines, names, cube.max_points);
+        var mode = reduced.points.x.length > 60 ? "lines" : "lines+markers";
+        return figure(cube, names.map(function (name, i) {
+            return Object.assign({type: "scatter", mode: mode, x: reduced.points.x, y: reduced.points[name]}, traces[i]);
+        }), {title: {text: chartTitle(title, freq, requested, reduced.sampled)}});
+    }
+
+    function barFigure(cube, pairs, title, trace, layout) {
+        var values = pairs.map(function (p) { return p[1]; });
+        return figure(cube, [Object.assign({
+            type: "bar", x: pairs.map(function (p) { return p[0]; }), y: values, text: values, textposition: "auto"
+        }, trace)], Object.assign({title: {text: title}}, layout || {}));
+    }
+
+    function emptyFigure(cube, title) {
+        return figure(cube, [], {title: {text: title}});
+    }
+
+    function el(type, props, children) {
+        return {type: type, namespace: "dash_html_components", props: Object.assign({children: children}, props)};
+    }
+
+    function formatMoney(value) {
+        return "R$ " + value.toLocaleString("en-US", {minimumFractionDigits: 2, maximumFractionDigits: 2});
+    }
+
+    // --- test.py ---
+    var BIG_CARD = {border: "1px solid #ddd", padding: "20px", borderRadius: "10px", textAlign: "center",
+        backgroundColor: "white", minWidth: "200px", boxShadow: "0 4px 6px rgba(0,0,0,0.1)", margin: "10px", flex: "1"};
+    var SMALL_CARD = {border: "1px solid #eee", padding: "10px", borderRadius: "8px", textAlign: "center",
+        backgroundColor: "#fcfcfc", minWidth: "100px", margin: "5px", flex: "1"};
+
+    function bigCard(title, value, color) {
+        return el("Div", {style: BIG_CARD}, [
+            el("H3", {style: {color: color, fontSize: "1.1em", marginBottom: "5px"}}, title),
+            el("P", {style: {fontSize: "2.5em", fontWeight: "bold", color: color, margin: "0"}}, String(value))
+        ]);
+    }
+
+    function categoryBox(title, values, totalColor) {
+        var small = function (label, value, color) {
+            return el("Div", {style: SMALL_CARD}, [
+                el("Span", {style: {fontSize: "0.8em"}}, label), el("Br", {}, null),
+                el("Strong", {style: {fontSize: "1.5em", color: color}}, String(value))
+            ]);
+        };
+        return el("Div", {style: {flex: "1", backgroundColor: "white", padding: "10px", borderRadius: "10px",
+                                  boxShadow: "0 2px 4px rgba(0,0,0,0.05)"}}, [
+            el("H4", {style: {textAlign: "center", color: "#333", marginBottom: "10px"}}, title),
+            el("Div", {style: {display: "flex", justifyContent: "space-between"}}, [
+                small("Total", values[0], totalColor), small("Manhã", values[1], "#28a745"), small("Tarde", values[2], "#e0a800")
+            ])
+        ]);
+    }
+
+    function formulasDashboard(start, end, requested, cube) {
+        var NO_DATA = "Nenhum dado encontrado.";
+        var range = cube ? dayRange(cube, start, end) : [0, 0];
+        if (!cube || range[0] >= range[1]) {
+            var empty = emptyFigure(cube || {}, NO_DATA), out = [[el("Div", {style: {textAlign: "center", color: "red"}}, NO_DATA)]];
+            for (var i = 0; i < 12; i++) { out.push(empty); }
+            return out;
+        }
+        var t = function (name) { return total(cube, name, range); };
+        var kpis = el("Div", {}, [
+            el("Div", {style: {display: "flex", justifyContent: "space-around", flexWrap: "wrap", marginBottom: "15px"}}, [
+                bigCard("Total Fórmulas", t("count"), "#0056b3"),
+                bigCard("Geral Manhã", t("manha"), "#28a745"),
+                bigCard("Geral Tarde", t("tarde"), "#e0a800")
+            ]),
+            el("Div", {style: {display: "flex", flexWrap: "wrap", gap: "20px"}}, [
+                categoryBox("Sólidos (Cápsulas) + SL + Sachês", [t("solids"), t("solids_manha"), t("solids_tarde")], "#0056b3"),
+                categoryBox("Semi-Sólidos + Líquidos", [t("semi"), t("semi_manha"), t("semi_tarde")], "#17a2b8")
+            ])
+        ]);
+
+        var groups = function (name) { return groupSums(cube, name, range); };
+        var tipos = groups("tipo_formula");
+        var pie = figure(cube, [{type: "pie", labels: tipos.map(function (p) { return p[0]; }),
+            values: tipos.map(function (p) { return p[1]; }), hole: 0.4, textposition: "inside", textinfo: "percent+label"}],
+            {title: {text: "Distribuição por Tipo"}});
+
+        var production = {};
+        groups("pesagem").concat(groups("manipulacao")).forEach(function (p) { production[p[0]] = (production[p[0]] || 0) + p[1]; });
+        production = Object.keys(production).map(function (k) { return [k, production[k]]; })
+            .sort(function (a, b) { return b[1] - a[1]; });
+
+        var freq = resolveFreq(requested, start, end, cube.max_points);
+        var counts = series(cube, ["count"], range, freq);
+        var stock = series(cube, ["estoque_feito", "estoque_usado"], range, freq);
+
+        return [
+            [kpis],
+            pie,
+            barFigure(cube, production, "Produção (Pesagem + Manipulação)", {}, {showlegend: false}),
+            barFigure(cube, groups("pm"), "Verificadas (PM)", {marker: {color: "#6f42c1"}}),
+            barFigure(cube, groups("pesagem"), "Pesagem"),
+            barFigure(cube, groups("manipulacao"), "Manipulação"),
+            barFigure(cube, groups("pm"), "Verificadas (PM) Detalhe"),
+            barFigure(cube, groups("estoque_feito"), "Estoque Feito"),
+            barFigure(cube, groups("refeito_exc"), "Refeito EXC"),
+            barFigure(cube, groups("refeito_pm"), "Refeito PM"),
+            lineFigure(cube, counts, ["count"], [{name: "Fórmulas"}], "Histórico de Produção", freq, requested),
+            lineFigure(cube, stock, ["estoque_feito", "estoque_usado"], [{name: "Estoque Feito"}, {name: "Estoque Usado"}],
+                       "Estoque (Linha do Tempo)", freq, requested),
+            barFigure(cube, groups("pm_mais_20"), "PM +20")
+        ];
+    }
+
+    // --- dashboard_julia.py ---
+    var COST_CARD = {border: "1px solid #ddd", padding: "20px", borderRadius: "10px", textAlign: "center",
+        backgroundColor: "white", minWidth: "200px", boxShadow: "0 4px 6px rgba(0,0,0,0.1)", margin: "10px", flex: "1"};
+
+    function costCard(title, value, color) {
+        return el("Div", {style: COST_CARD}, [
+            el("H3", {style: {color: color, marginBottom: "5px"}}, title),
+            el("P", {style: {fontSize: "2em", fontWeight: "bold", color: "#333"}}, value)
+        ]);
+    }
+
+    function errorsDashboard(start, end, requested, employee, cube) {
+        if (!cube || !cube.days.length) {
+            var none = emptyFigure(cube || {}, "Sem dados");
+            return [[el("Div", {}, "Sem dados")], none, none, none];
+        }
+        var range = dayRange(cube, start, end);
+        if (range[0] >= range[1]) {
+            var empty = emptyFigure(cube, "Sem dados");
+            return [[el("Div", {}, "Sem dados neste período")], empty, empty, empty];
+        }
+        var totalCost = total(cube, "valor", range), totalErrors = total(cube, "count", range);
+        var kpis = [
+            costCard("Custo Total", formatMoney(totalCost), "#d9534f"),
+            costCard("Quantidade de Erros", String(totalErrors), "#f0ad4e"),
+            costCard("Custo Médio", formatMoney(totalCost / totalErrors), "#5bc0de")
+        ];
+
+        var freq = resolveFreq(requested, start, end, cube.max_points);
+        var cost = series(cube, ["valor"], range, freq);
+        cost.valor = cost.valor.map(function (v) { return Math.round(v * 100) / 100; });
+        var figTime = lineFigure(cube, cost, ["valor"], [{name: "Prejuízo", line: {color: "#d9534f", width: 3}}],
+                                 "Evolução do Prejuízo Financeiro", freq, requested);
+        figTime.layout.yaxis = Object.assign({}, figTime.layout.yaxis, {title: {text: "Valor (R$)"}});
+        figTime.layout.xaxis = Object.assign({}, figTime.layout.xaxis, {title: {text: "Data"}});
+
+        var byEmployee = groupSums(cube, "funcionario", range).reverse();  // ascending, like the server
+        var figEmployee = figure(cube, [{type: "bar", orientation: "h",
+            x: byEmployee.map(function (p) { return p[1]; }), y: byEmployee.map(function (p) { return p[0]; }),
+            text: byEmployee.map(function (p) { return p[1].toFixed(2); }), textposition: "outside",
+            marker: {color: "#337ab7"}, textfont: {size: 12}}],
+            {title: {text: "Prejuízo Total por Funcionário"}, xaxis: {title: {text: "Valor Total (R$)"}}});
+
+        var figDetail;
+        if (employee) {
+            var types = groupSums(cube, "tipos_erro", range, function (key) { return key[0] === employee; });
+            figDetail = types.length
+                ? barFigure(cube, types, "Tipos de Erro Cometidos por: " + employee, {marker: {color: "#d9534f"}},
+                            {yaxis: {title: {text: "Qtd Ocorrências"}}})
+                : emptyFigure(cube, "Sem dados para " + employee + " no período");
+        } else {
+            figDetail = emptyFigure(cube, "Selecione um funcionário");
+        }
+        return [kpis, figTime, figEmployee, figDetail];
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        formulas: {update_dashboard: formulasDashboard},
+        errors: {update_dashboard: errorsDashboard}
+    });
+})();
@@ -0,0 +1,220 @@
+import bisect
+
+from indexes import ROLES
+
+# --- Bitmap indexes for the formula counts ---
+# Most production charts are "how many formulas with flag X, grouped by the employee in
+# role Y, within a date range". With one bitmap (bit i = record i) per flag, employee,
+# tipo_formula, turno and day, such a count is a few ANDs and a popcount per bar
+# instead of a scan over every record.
+#
+# Bitmaps are Python ints, stored from their lowest set bit up: a day or a recent
+# employee only costs bits from its first record on, not for the whole history.
+
+FLAGS = ("refeito_pm", "refeito_exc", "estoque_feito", "pm_mais_20", "refeito_semi_solidos")
+GROUPS = tuple(ROLES) + ("tipo_formula", "turno")
+
+
+class Bitmap:
+    """A set of record ids as the bits of an int, offset by its lowest id (`base`)."""
+
+    __slots__ = ("base", "bits")
+
+    def __init__(self, base=0, bits=0):
+        self.base = base
+        self.bits = bits
+
+    @classmethod
+    def from_ids(cls, ids):
+        ids = list(ids)
+        if not ids:
+            return cls()
+        base = min(ids)
+        buffer = bytearray((max(ids) - base) // 8 + 1)
+        for record_id in ids:
+            offset = record_id - base
+            buffer[offset >> 3] |= 1 << (offset & 7)
+        return cls(base, int.from_bytes(buffer, "little"))
+
+    @classmethod
+    def full(cls, size):
+        """Ids 0..size-1."""
+        return cls(0, (1 << size) - 1)
+
+    def __and__(self, other):
+        if not self.bits or not other.bits:
+            return Bitmap()
+        base = max(self.base, other.base)
+        return Bitmap(base, (self.bits >> (base - self.base)) & (other.bits >> (base - other.base)))
+
+    def __or__(self, other):
+        if not self.bits:
+            return other
+        if not other.bits:
+            return self
+        base = min(self.base, other.base)
+        return Bitmap(base, (self.bits << (self.base - base)) | (other.bits << (other.base - base)))
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def ids(self):
+        """Record ids in increasing order."""
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            yield self.base + low.bit_length() - 1
+            bits ^= low
+
+
+class BitmapIndex:
+    """key -> Bitmap of record ids. `key_func` returns an iterable of keys for a record.
+
+    add() only buffers the id; the bitmap of a key is (re)built on its next read, so
+    loading a large collection costs one pass instead of one big-int copy per record.
+    """
+
+    def __init__(self, key_func):
+        self.key_func = key_func
+        self.clear()
+
+    def clear(self):
+        self.bitmaps = {}
+        self._pending = {}
+        self._sorted_keys = None
+
+    def add(self, record_id, record):
+        for key in self.key_func(record):
+            if key not in self.bitmaps and key not in self._pending:
+                self._sorted_keys = None
+            self._pending.setdefault(key, []).append(record_id)
+
+    def lookup(self, key):
+        pending = self._pending.pop(key, None)
+        if pending:
+            self.bitmaps[key] = self.bitmaps.get(key, Bitmap()) | Bitmap.from_ids(pending)
+        return self.bitmaps.get(key, Bitmap())
+
+    def keys(self):
+        return self.bitmaps.keys() | self._pending.keys()
+
+    def range(self, start=None, end=None):
+        """Union of the bitmaps with start <= key <= end (either bound may be None)."""
+        if self._sorted_keys is None:
+            self._sorted_keys = sorted(self.keys())
+        keys = self._sorted_keys
+        lo = 0 if start is None else bisect.bisect_left(keys, start)
+        hi = len(keys) if end is None else bisect.bisect_right(keys, end)
+        result = Bitmap()
+        for key in keys[lo:hi]:
+            result = result | self.lookup(key)
+        return result
+
+
+# --- Key functions ---
+def formula_day(record):
+    day = record.get("date")
+    return [str(day)[:10]] if day else []
+
+
+def formula_flags(record):
+    # Same test the dashboard charts use (`== True`): True or 1
+    return [flag for flag in FLAGS if record.get(flag) == True]
+
+
+def formula_tipo(record):
+    tipo = record.get("tipo_formula")
+    return [tipo] if tipo else []
+
+
+def formula_turno(record):
+    # Filled from the time for records that had none (see schema.py)
+    turno = record.get("turno")
+    return [turno] if turno else []
+
+
+class FormulaBitmaps:
+    """Bitmap indexes over the formulas, registered on the Store like the other indexes.
+
+    With a `codec` (encoding.FormulaCodec) employees are keyed by their stable id, so a
+    rename needs no rebuild; counts are still reported by name.
+    """
+
+    def __init__(self, codec=None):
+        self.codec = codec
+        self.days = BitmapIndex(formula_day)
+        self.flags = BitmapIndex(formula_flags)
+        self.groups = {role: BitmapIndex(self._employee_key(field)) for role, field in ROLES.items()}
+        self.groups["tipo_formula"] = BitmapIndex(formula_tipo)
+        self.groups["turno"] = BitmapIndex(formula_turno)
+        self.size = 0
+
+    def _employee_code(self, name):
+        if self.codec is None:
+            return name
+        return self.codec.dictionaries["employees"].lookup(name)
+
+    def _employee_key(self, field):
+        def key_func(record):
+            name = record.get(field)
+            if not name:
+                return []
+            code = self._employee_code(name)
+            return [] if code is None else [code]
+        return key_func
+
+    def _label(self, group, key):
+        if self.codec is not None and group in ROLES:
+            return self.codec.dictionaries["employees"].values[key]
+        return key
+
+    def clear(self):
+        for index in (self.days, self.flags, *self.groups.values()):
+            index.clear()
+        self.size = 0
+
+    def add(self, record_id, record):
+        for index in (self.days, self.flags, *self.groups.values()):
+            index.add(record_id, record)
+        self.size = max(self.size, record_id + 1)
+
+    def select(self, start=None, end=None, flag=None, tipos=None, turno=None, employee=None, within=None):
+        """Bitmap of the formulas matching every given filter (dates are ISO strings).
+
+        `within` narrows an earlier selection instead of starting from every formula.
+        """
+        selection = Bitmap.full(self.size) if within is None else within
+        if start is not None or end is not None:
+            selection = selection & self.days.range(start and str(start)[:10], end and str(end)[:10])
+        if flag is not None:
+            selection = selection & self.flags.lookup(flag)
+        if tipos is not None:
+            tipo_index = self.groups["tipo_formula"]
+            union = Bitmap()
+            for tipo in tipos:
+                union = union | tipo_index.lookup(tipo)
+            selection = selection & union
+        if turno is not None:
+            selection = selection & self.groups["turno"].lookup(turno)
+        if employee is not None:
+            # In any of the production roles
+            code = self._employee_code(employee)
+            union = Bitmap()
+            for role in ROLES:
+                union = union | self.groups[role].lookup(code)
+            selection = selection & union
+        return selection
+
+    def counts(self, group, selection):
+        """{key: count} of `selection` per employee (role name), tipo_formula or turno,
+        largest first."""
+        index = self.groups[group]
+        counts = {}
+        for key in list(index.keys()):
+            count = len(index.lookup(key) & selection)
+            if count:
+                counts[self._label(group, key)] = count
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
@@ -0,0 +1,154 @@
+from collections import OrderedDict, namedtuple
+
+from shards import ShardFollower
+
+# --- Catalog of the error records, for the paged result views ---
+# A search used to hand the window every matching record, read from the shards, and
+# the window rendered all of them at once. Now it gets a record source instead: one
+# small Entry per match (the fields the view sorts and filters on) and a fetch() that
+# reads the whole records of a single page.
+#
+#   source = CATALOG.source(nr="12345")
+#   entries = source.select(sort="valor_desc", funcionario="Ana")   # no record is read
+#   records = source.fetch(entries[20:40])                           # only this page
+#
+# ShardCatalog keeps the entries of every record of a ShardedCollection in a JSON file
+# next to its manifest, keyed by (month, position) like textsearch.ShardTextIndex, and
+# with the same bookkeeping (shards.ShardFollower): only the shards that grew since it
+# was saved are read. ListSource gives records already in hand (server mode, a
+# full-text result) the same interface.
+
+CATALOG_FORMAT = "catalog-v2"
+CATALOG_FILE = "catalog.json"
+CACHED_SHARDS = 4  # shards kept in memory for page fetches
+
+Entry = namedtuple("Entry", "key nr date time funcionario valor")
+
+SORTS = {
+    "date_desc": ("Mais recentes", lambda entry: (entry.date, entry.time), True),
+    "date_asc": ("Mais antigos", lambda entry: (entry.date, entry.time), False),
+    "valor_desc": ("Maior valor", lambda entry: entry.valor, True),
+    "funcionario": ("Funcionário", lambda entry: (entry.funcionario.casefold(), entry.date, entry.time), False),
+}
+
+
+def summary(record):
+    """[nr, date, time, funcionario, valor] of a record, as stored in the catalog."""
+    try:
+        valor = float(record.get("valor") or 0)
+    except (TypeError, ValueError):
+        valor = 0.0
+    return [str(record.get("nr")), str(record.get("date") or ""), str(record.get("time") or ""),
+            str(record.get("funcionario") or ""), valor]
+
+
+class _Source:
+    def __init__(self, entries):
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def employees(self):
+        return sorted({entry.funcionario for entry in self.entries}, key=str.casefold)
+
+    def select(self, sort="date_desc", funcionario=None, start=None, end=None):
+        """The entries passing the filters, in `sort` order (see SORTS)."""
+        entries = [entry for entry in self.entries
+                   if (not funcionario or entry.funcionario == funcionario)
+                   and (not start or entry.date >= start) and (not end or entry.date <= end)]
+        _, key, reverse = SORTS[sort]
+        entries.sort(key=key, reverse=reverse)
+        return entries
+
+
+class ListSource(_Source):
+    """Records already loaded, e.g. from server.py."""
+
+    def __init__(self, records):
+        self.records = records
+        super().__init__([Entry(position, *summary(record)) for position, record in enumerate(records)])
+
+    def fetch(self, entries):
+        return [self.records[entry.key] for entry in entries]
+
+
+class CatalogSource(_Source):
+    def __init__(self, catalog, entries):
+        super().__init__(entries)
+        self.catalog = catalog
+
+    def fetch(self, entries):
+        return self.catalog.fetch([entry.key for entry in entries])
+
+
+class ShardCatalog(ShardFollower):
+    """Entries of every record of a ShardedCollection (shards.py), saved next to its manifest."""
+
+    format = CATALOG_FORMAT
+    file_name = CATALOG_FILE
+
+    def __init__(self, collection):
+        self.rows = {}    # month -> [summary of each row of that shard]
+        self._by_nr = None
+        self._shards = OrderedDict()  # month -> ((count, revision), rows), recently used last
+        super().__init__(collection)
+
+    def _changed(self):
+        self._by_nr = None
+
+    def _clear(self):
+        self.rows = {}
+
+    def _state(self):
+        return {"rows": self.rows}
+
+    def _load_state(self, data):
+        self.rows = data["rows"]
+
+    def _fold(self, month, start, rows):
+        new_rows = [summary(record) for record in rows[start:]]
+        self.rows.setdefault(month, []).extend(new_rows)
+        return {"rows": new_rows}
+
+    def _apply_delta(self, delta):
+        self.rows.setdefault(delta["month"], []).extend(delta["rows"])
+
+    def _entries(self):
+        for month, rows in self.rows.items():
+            for position, row in enumerate(rows):
+                yield Entry((month, position), *row)
+
+    def source(self, nr=None):
+        """A record source over every record, or over the records of one NR."""
+        self.refresh()
+        if nr is None:
+            return CatalogSource(self, list(self._entries()))
+        if self._by_nr is None:
+            by_nr = {}
+            for entry in self._entries():
+                by_nr.setdefault(entry.nr, []).append(entry)
+            self._by_nr = by_nr
+        return CatalogSource(self, list(self._by_nr.get(str(nr), [])))
+
+    # --- Records ---
+    def _read(self, month, manifest):
+        entry = manifest["shards"][month]
+        cached = self._shards.get(month)
+        version = (entry["count"], entry.get("revision", 0))
+        if cached is None or cached[0] != version:
+            cached = (version, self.collection.read_rows(entry, manifest))
+            self._shards[month] = cached
+            if len(self._shards) > CACHED_SHARDS:
+                self._shards.popitem(last=False)
+        self._shards.move_to_end(month)
+        return cached[1]
+
+    def fetch(self, keys):
+        """Records by (month, position), in the given order; each shard is read once."""
+        manifest = self.collection.manifest()
+        records = []
+        for month, position in keys:
+            rows = self._read(month, manifest) if month in manifest["shards"] else []
+            records.append(rows[position] if position < len(rows) else {})
+        return records
@@ -0,0 +1,68 @@
+import os
+
+import pandas as pd
+
+from downsample import MAX_POINTS, SLIM_TEMPLATE
+
+# --- Clientside mode: a daily aggregate cube for the browser ---
+# With DASH_CLIENTSIDE=1 the dashboards send the browser, once per data version, the
+# per-day aggregates their charts are made of, and the date range, D/W/M regrouping and
+# KPI cards are computed in the browser (assets/clientside.js). Changing the filters
+# then costs no round trip, and the server only works when the data changes.
+#
+#   {"days":   ["2025-09-01", "2025-09-02", ...],             # sorted, days with data
+#    "totals": {"count": [31, 28, ...], "valor": [...]},      # one value per day
+#    "groups": {"pesagem": {"keys": ["Ana", "Bob", ...],      # per day and key, sparse:
+#                           "day": [0, 0, 1, ...],            #   entry i is value[i] for
+#                           "key": [0, 1, 0, ...],            #   keys[key[i]] on days[day[i]]
+#                           "value": [12, 9, 14, ...]}},      #   (sorted by day)
+#    "max_points": 400, "layout": {...}}                      # downsample.py settings
+#
+# Columns of numbers instead of a list of dicts keep the cube small: a year of formulas
+# is a few tens of KB.
+
+CLIENTSIDE = os.environ.get("DASH_CLIENTSIDE", "0") not in ("", "0", "false", "False")
+
+
+def _numbers(series):
+    """Plain ints when the values are whole, floats rounded to cents otherwise."""
+    values = series.round(2).tolist()
+    return [int(value) if float(value).is_integer() else value for value in values]
+
+
+def build(frame, totals, groups):
+    """The cube of `frame` (records with a datetime "date" column).
+
+    `totals`: {name: Series aligned with frame}, summed per day (a boolean mask counts rows).
+    `groups`: {name: (rows, key column, value column or None)}, where `rows` is a subset of
+    frame (same index, possibly exploded), summed per day and key (counted when None).
+    """
+    cube = {"days": [], "totals": {}, "groups": {}, "max_points": MAX_POINTS, "layout": SLIM_TEMPLATE["layout"]}
+    if frame.empty:
+        return cube
+
+    day_names = frame["date"].dt.strftime("%Y-%m-%d")
+    codes, days = pd.factorize(day_names, sort=True)
+    day_codes = pd.Series(codes, index=frame.index)
+    all_days = range(len(days))
+    cube["days"] = list(days)
+    for name, values in totals.items():
+        summed = values.astype(float).groupby(codes).sum().reindex(all_days, fill_value=0)
+        cube["totals"][name] = _numbers(summed)
+
+    for name, (rows, key, value) in groups.items():
+        rows = rows[rows[key].notna() & (rows[key] != "")]
+        table = pd.DataFrame({
+            "day": day_codes.loc[rows.index].to_numpy(),
+            "key": rows[key].to_numpy(),
+            "value": rows[value].astype(float).to_numpy() if value else 1.0,
+        })
+        summed = table.groupby(["day", "key"], sort=True)["value"].sum().reset_index()
+        key_codes, keys = pd.factorize(summed["key"], sort=True)
+        cube["groups"][name] = {
+            "keys": [list(k) if isinstance(k, tuple) else k for k in keys],
+            "day": summed["day"].tolist(),
+            "key": key_codes.tolist(),
+            "value": _numbers(summed["value"]),
+        }
+    return cube
@@ -1,13 +1,25 @@
+import bisect
+import threading
+
 import pandas as pd
 import dash
-from dash import html, dcc, Input, Output
+from dash import html, dcc, Input, Output, State, ClientsideFunction
 import plotly.express as px
 import plotly.graph_objects as go
 import os
 import base64
 
+import cube
+import dashcache
+import export_reports
+from precompute import Precomputer, default_ranges
+import shards
+from profiling import profiler
+from downsample import AUTO, chart_title, compact_figure, line_points, resolve_freq
+from live_updates import SERVER_URL, LiveCollection
+
 # --- CONFIGURATION ---
-DATA_FILE = "data_julia.json"
+DATA_FILE = "data_julia.json"  # stored as monthly shards under data_julia/ (see shards.py)
 LOGO_FILE = "logo.png"
 
 # --- HELPER: IMAGE ENCODING ---
@@ -19,20 +31,124 @@ def encode_image(image_file):
     return None
 
 # --- LOAD DATA ---
+EMPTY_COLUMNS = ['date', 'time', 'nr', 'tipos_erro', 'funcionario', 'valor', 'desconto', 'cobrado']
+
+def frame_from_records(records):
+    if not records:
+        return pd.DataFrame(columns=EMPTY_COLUMNS)
+    df = pd.DataFrame(records)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+def errors_cube(frame):
+    """Daily aggregates behind every chart, for the clientside mode (cube.py)."""
+    exploded = frame.explode('tipos_erro')
+    exploded = exploded[exploded['tipos_erro'].notna()]
+    exploded = exploded.assign(employee_tipo=list(zip(exploded['funcionario'], exploded['tipos_erro'])))
+    totals = {'count': pd.Series(1, index=frame.index), 'valor': frame['valor'].fillna(0)}
+    groups = {
+        'funcionario': (frame, 'funcionario', 'valor'),
+        'tipos_erro': (exploded, 'employee_tipo', None),  # keys are [employee, error type]
+    }
+    return cube.build(frame, totals, groups)
+
+ERRORS = shards.errors(DATA_FILE)
+# month -> (manifest entry, DataFrame). Only shards whose entry changed (count, or the
+# revision after a rename) are parsed again, so a refresh normally re-reads the
+# current month and never the sealed archives.
+_shard_frames = {}
+_loaded_months = []  # months of the last load, in row order
+
 def load_data():
-    if not os.path.exists(DATA_FILE):
-        return pd.DataFrame(columns=['date', 'time', 'nr', 'tipos_erro', 'funcionario', 'valor', 'desconto', 'cobrado'])
-    
+    """(DataFrame of every shard, how many rows at its start are the same as in the last load)."""
+    global _loaded_months
     try:
-        df = pd.read_json(DATA_FILE)
-        if not df.empty:
-            df['date'] = pd.to_datetime(df['date'])
-        return df
-    except ValueError:
-        return pd.DataFrame(columns=['date', 'time', 'nr', 'tipos_erro', 'funcionario', 'valor', 'desconto', 'cobrado'])
+        manifest = ERRORS.open().manifest()
+        frames, months, unchanged, same = [], [], 0, True
+        for month, entry in ERRORS.shards(manifest=manifest):
+            cached = _shard_frames.get(month)
+            reused = cached is not None and cached[0] == entry
+            if not reused:
+                cached = _shard_frames[month] = (entry, frame_from_records(ERRORS.read_rows(entry, manifest)))
+            same = same and reused and _loaded_months[len(months):len(months) + 1] == [month]
+            if same:
+                unchanged += len(cached[1])
+            months.append(month)
+            if not cached[1].empty:
+                frames.append(cached[1])
+        _loaded_months = months
+        return (pd.concat(frames, ignore_index=True) if frames else frame_from_records([])), unchanged
+    except (OSError, ValueError):
+        _loaded_months = []
+        return frame_from_records([]), 0
+
+# --- CACHED DATA ---
+# Local mode: the shards are only re-read when the manifest changes on disk.
+# Server mode (SERVER_URL set): records are loaded once from server.py and new ones are
+# pushed over SSE and appended to the cached DataFrame.
+live = LiveCollection(SERVER_URL, "errors") if SERVER_URL else None
+# employee_rows: employee -> row positions in df, for the first `folded` rows
+_cache = {"version": None, "df": None, "employee_rows": None, "folded": 0}
+_cache_lock = threading.Lock()
+
+def data_version():
+    """Version of the data the callbacks see. In live mode the new records are folded
+    into the cached frame first, so a cache key never names data not in the frame yet."""
+    if live is not None:
+        get_data()
+        return live.taken_version
+    return os.path.getmtime(ERRORS.manifest_path) if os.path.exists(ERRORS.manifest_path) else None
+
+def get_data():
+    with _cache_lock:
+        if live is not None:
+            if _cache["df"] is None:
+                _cache["df"] = frame_from_records(live.load())
+                live.start()
+            new_records, reset = live.take()
+            if reset:
+                _cache["df"] = frame_from_records(live.load())
+                _keep_employee_rows(0)
+            elif new_records:
+                # Appended at the end: the rows already folded keep their positions
+                _cache["df"] = pd.concat([_cache["df"], frame_from_records(new_records)], ignore_index=True)
+            return _cache["df"]
+
+        version = data_version()
+        if _cache["df"] is None or _cache["version"] != version:
+            _cache["df"], unchanged = load_data()
+            _cache["version"] = version
+            _keep_employee_rows(unchanged)
+        return _cache["df"]
+
+def _keep_employee_rows(rows):
+    """Drops the positions from `rows` on (those rows changed); they are folded again
+    by the next get_employee_rows(). Caller holds the lock."""
+    if _cache["folded"] > rows:
+        _cache["employee_rows"] = {employee: positions[:bisect.bisect_left(positions, rows)]
+                                   for employee, positions in _cache["employee_rows"].items()}
+        _cache["folded"] = rows
+
+def get_employee_rows(df, employee):
+    """Row positions of an employee in df. The postings are extended with only the rows
+    added since the last call, not grouped again from scratch."""
+    with _cache_lock:
+        if _cache["df"] is not df:  # not the cached frame: nothing to reuse
+            return (df['funcionario'] == employee).to_numpy().nonzero()[0].tolist() if not df.empty else []
+        if _cache["employee_rows"] is None:
+            _cache["employee_rows"], _cache["folded"] = {}, 0
+        folded = _cache["folded"]
+        if len(df) > folded:
+            for name, positions in df.iloc[folded:].groupby('funcionario').indices.items():
+                _cache["employee_rows"].setdefault(name, []).extend((positions + folded).tolist())
+            _cache["folded"] = len(df)
+        return list(_cache["employee_rows"].get(employee, []))
+
+# Results shared by the worker processes of serve_dash.py (a pass-through otherwise)
+shared_cache = dashcache.for_app("dashboard_julia")
 
 # Initialize Data for Dropdowns
-df_init = load_data()
+df_init = get_data()
 
 # Handle empty data init for DatePicker
 if not df_init.empty:
@@ -47,6 +163,7 @@ else:
 # --- DASH APP ---
 app = dash.Dash(__name__, meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1"}])
 app.title = "Dashboard Financeiro de Erros"
+profiler.install(app)
 
 # Get encoded logo
 logo_src = encode_image(LOGO_FILE)
@@ -62,6 +179,12 @@ app.layout = html.Div(
             html.H1("Dashboard de Custos de Erros", style={"color": "#333", "margin": "0"})
         ]),
 
+        # --- Live updates: a cheap version check, the dashboard only recomputes on change ---
+        dcc.Interval(id='live_tick', interval=1000),
+        dcc.Store(id='data_version'),
+        # Clientside mode only (DASH_CLIENTSIDE=1): the daily aggregates the browser filters
+        dcc.Store(id='cube'),
+
         # --- Controls ---
         html.Div(
             className="row",
@@ -81,7 +204,8 @@ app.layout = html.Div(
                     html.Label("Agrupar Tempo por:", style={'fontWeight': 'bold'}),
                     dcc.Dropdown(
                         id='time_agg',
-                        options=[{"label": "Dia", "value": "D"}, {"label": "Semana", "value": "W"}, {"label": "Mês", "value": "M"}],
+                        options=[{"label": "Dia", "value": "D"}, {"label": "Semana", "value": "W"}, {"label": "Mês", "value": "M"},
+                                 {"label": "Automático", "value": AUTO}],
                         value="D",
                         clearable=False
                     )
@@ -128,18 +252,33 @@ app.layout = html.Div(
 )
 
 @app.callback(
-    [Output('kpi_cards', 'children'),
-     Output('cost_over_time_chart', 'figure'),
-     Output('cost_by_employee_chart', 'figure'),
-     Output('employee_detail_chart', 'figure')], # New Output
-    [Input('date_picker', 'start_date'),
-     Input('date_picker', 'end_date'),
-     Input('time_agg', 'value'),
-     Input('employee_selector', 'value')] # New Input
+    Output('data_version', 'data'),
+    [Input('live_tick', 'n_intervals')],
+    [State('data_version', 'data')]
 )
-def update_dashboard(start_date, end_date, freq, selected_employee):
-    # Reload data to get realtime updates
-    df = load_data()
+def check_live_updates(_, known_version):
+    version = data_version()
+    if version == known_version:
+        return dash.no_update
+    return version
+
+DASHBOARD_OUTPUTS = [
+    Output('kpi_cards', 'children'),
+    Output('cost_over_time_chart', 'figure'),
+    Output('cost_by_employee_chart', 'figure'),
+    Output('employee_detail_chart', 'figure')] # New Output
+FILTER_INPUTS = [
+    Input('date_picker', 'start_date'),
+    Input('date_picker', 'end_date'),
+    Input('time_agg', 'value'),
+    Input('employee_selector', 'value')] # New Input
+
+@profiler.timed("update_dashboard")
+@shared_cache.memoize("update_dashboard", data_version, arguments=4)
+def update_dashboard(start_date, end_date, freq, selected_employee, _data_version):
+    # Cached; only re-read when the shards have changed (or new records were pushed)
+    df = get_data()
+    profiler.lap("load_data")
     
     empty_fig = go.Figure().update_layout(title="Sem dados")
 
@@ -149,6 +288,7 @@ def update_dashboard(start_date, end_date, freq, selected_employee):
     # Filter by Date
     mask = (df['date'] >= start_date) & (df['date'] <= end_date)
     filtered_df = df.loc[mask]
+    profiler.lap("filter")
 
     if filtered_df.empty:
         return [html.Div("Sem dados neste período")], empty_fig, empty_fig, empty_fig
@@ -178,23 +318,32 @@ def update_dashboard(start_date, end_date, freq, selected_employee):
             html.P(f"R$ {avg_cost:,.2f}", style={"fontSize": "2em", "fontWeight": "bold", "color": "#333"})
         ]),
     ]
+    profiler.lap("kpis")
 
     # --- 1. Cost Over Time ---
-    cost_over_time = filtered_df.groupby(pd.Grouper(key='date', freq=freq))['valor'].sum().reset_index()
-    fig_time = px.line(cost_over_time, x='date', y='valor', markers=True, title="Evolução do Prejuízo Financeiro")
-    fig_time.update_layout(yaxis_title="Valor (R$)", xaxis_title="Data")
-    fig_time.update_traces(line_color='#d9534f', line_width=3)
+    # Kept under downsample.MAX_POINTS points whatever the date range
+    bucket = resolve_freq(freq, start_date, end_date)
+    cost_over_time = filtered_df.groupby(pd.Grouper(key='date', freq=bucket))['valor'].sum().reset_index()
+    dates, values, sampled = line_points(cost_over_time, 'date', ['valor'])
+    fig_time = go.Figure(go.Scatter(x=dates, y=[round(value, 2) for value in values['valor']], mode='lines+markers',
+                                    name='Prejuízo', line={'color': '#d9534f', 'width': 3}))
+    fig_time.update_layout(title=chart_title("Evolução do Prejuízo Financeiro", bucket, freq, sampled),
+                           yaxis_title="Valor (R$)", xaxis_title="Data")
+    compact_figure(fig_time)
+    profiler.lap("cost_over_time_chart")
 
     # --- 2. Cost by Employee (Bar) ---
     cost_by_emp = filtered_df.groupby('funcionario')['valor'].sum().reset_index().sort_values('valor', ascending=True)
     fig_emp = px.bar(cost_by_emp, x='valor', y='funcionario', orientation='h', title="Prejuízo Total por Funcionário", text_auto='.2f')
     fig_emp.update_traces(marker_color='#337ab7', textfont_size=12, textposition="outside")
     fig_emp.update_layout(xaxis_title="Valor Total (R$)", yaxis_title=None)
+    profiler.lap("cost_by_employee_chart")
 
     # --- 3. Individual Employee Detail (New Graph) ---
     if selected_employee:
-        # Filter for the specific employee
-        emp_df = filtered_df[filtered_df['funcionario'] == selected_employee].copy()
+        # Rows of the specific employee (posting list lookup), then the date filter
+        emp_df = df.iloc[get_employee_rows(df, selected_employee)]
+        emp_df = emp_df[(emp_df['date'] >= start_date) & (emp_df['date'] <= end_date)].copy()
         
         if not emp_df.empty:
             # Important: Use explode because 'tipos_erro' is a list like ['A', 'B']
@@ -218,9 +367,40 @@ def update_dashboard(start_date, end_date, freq, selected_employee):
             fig_detail = go.Figure().update_layout(title=f"Sem dados para {selected_employee} no período")
     else:
         fig_detail = go.Figure().update_layout(title="Selecione um funcionário")
+    profiler.lap("employee_detail_chart")
 
     return kpi_html, fig_time, fig_emp, fig_detail
 
+if cube.CLIENTSIDE:
+    # Filters run in the browser (assets/clientside.js); the server only rebuilds the
+    # cube when the data changes
+    @app.callback(Output('cube', 'data'), [Input('data_version', 'data')])
+    @profiler.timed("update_cube")
+    @shared_cache.memoize("update_cube", data_version, arguments=0)
+    def update_cube(_data_version):
+        return errors_cube(get_data())
+
+    app.clientside_callback(ClientsideFunction(namespace='errors', function_name='update_dashboard'),
+                            DASHBOARD_OUTPUTS, FILTER_INPUTS + [Input('cube', 'data')])
+else:
+    app.callback(DASHBOARD_OUTPUTS, FILTER_INPUTS + [Input('data_version', 'data')])(update_dashboard)
+
+# --- Precompute: the default views and each employee's totals are in the cache before anyone opens them ---
+def precompute_views():
+    if cube.CLIENTSIDE:
+        return {"cube": lambda: update_cube(None)}
+    ranges = default_ranges(min_date, max_date)
+    views = {view: (lambda start=start, end=end: update_dashboard(start, end, 'D', None, None))
+             for view, (start, end) in ranges.items()}
+    start, end = ranges["all"]
+    for employee in unique_employees:
+        views[f"employee:{employee}"] = lambda employee=employee: update_dashboard(start, end, 'D', employee, None)
+    return views
+
+precomputer = Precomputer("dashboard_julia", data_version, precompute_views, getattr(shared_cache, "directory", None)).start()
+precomputer.install(app)
+export_reports.install(app)  # closed periods, pre-rendered by export_reports.py
+
 if __name__ == "__main__":
     print("Starting Financial Dashboard on Port 8052...")
     app.run(debug=True, host='127.0.0.1', port=8052)
\ No newline at end of file
@@ -0,0 +1,154 @@
+import functools
+import hashlib
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import storage
+
+# --- Cache shared by the dashboard workers ---
+# With DASH_CACHE_DIR set (serve_dash.py sets it), a callback's result is stored on disk
+# under the data version it was computed from and the callback's arguments:
+#
+#   dash_cache/test/<hash of the version>/update_dashboard-<hash of the arguments>.pkl
+#
+# Any worker process then serves it without recomputing: the counts, aggregates and
+# rendered figures are computed once per data version and filter combination, whatever
+# the number of workers. A worker computing an entry holds its lock, so the others wait
+# for it instead of computing the same figures in parallel.
+#
+# A new data version starts a new directory; the directories of older versions are
+# removed once no worker can still be using them. Without DASH_CACHE_DIR (running
+# test.py directly) results are kept in the process's memory instead, for the current
+# data version only. Either way precompute.py can fill the cache ahead of the viewers.
+
+CACHE_DIR = os.environ.get("DASH_CACHE_DIR")
+MAX_BYTES = int(os.environ.get("DASH_CACHE_MB", "200")) * 1024 * 1024
+STALE_SECONDS = 120  # older versions are kept this long after their last write
+PRUNE_EVERY = 50     # writes between size checks
+LOCAL_ENTRIES = 128  # results kept per process without DASH_CACHE_DIR
+
+
+def _digest(value):
+    return hashlib.sha1(repr(value).encode('utf-8')).hexdigest()[:16]
+
+
+class SharedCache:
+    def __init__(self, directory, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._writes = 0
+
+    def _version_dir(self, version):
+        return os.path.join(self.directory, _digest(version))
+
+    def get_or_compute(self, version, key, compute):
+        """The cached value of `key` for `version`, computed (once across workers) if missing."""
+        version_dir = self._version_dir(version)
+        path = os.path.join(version_dir, f"{key}.pkl")
+        value = self._read(path)
+        if value is not None:
+            return value[0]
+
+        os.makedirs(version_dir, exist_ok=True)
+        with storage.locked(path):
+            value = self._read(path)  # computed by another worker while we waited
+            if value is not None:
+                return value[0]
+            result = compute()
+            storage.write_bytes(path, pickle.dumps((result,), protocol=pickle.HIGHEST_PROTOCOL))
+
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 1:
+            self.prune(version_dir)
+        return result
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def prune(self, current_dir):
+        """Removes stale versions, then the oldest entries while over `max_bytes`."""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            version_dir = os.path.join(self.directory, name)
+            try:
+                if version_dir != current_dir and now - os.path.getmtime(version_dir) > STALE_SECONDS:
+                    shutil.rmtree(version_dir, ignore_errors=True)
+                    continue
+                for file_name in os.listdir(version_dir):
+                    if file_name.endswith(".pkl"):
+                        path = os.path.join(version_dir, file_name)
+                        stat = os.stat(path)
+                        entries.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                continue  # removed by another worker meanwhile
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def memoize(self, name, version_func, arguments=None):
+        return _memoize(self, name, version_func, arguments)
+
+
+class LocalCache:
+    """Same interface, in this process's memory: the latest results of one data version."""
+
+    def __init__(self, max_entries=LOCAL_ENTRIES):
+        self.max_entries = max_entries
+        self.version = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, version, key, compute):
+        with self.lock:
+            if version != self.version:
+                self.version = version
+                self.entries.clear()
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        result = compute()
+        with self.lock:
+            if version == self.version:
+                self.entries[key] = result
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return result
+
+    def memoize(self, name, version_func, arguments=None):
+        return _memoize(self, name, version_func, arguments)
+
+
+def _memoize(cache, name, version_func, arguments):
+    """Decorator: caches a callback's result per data version and arguments (only the
+    first `arguments` ones form the key, e.g. to leave out a data_version Input)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = f"{name}-{_digest(args[:arguments])}"
+            return cache.get_or_compute(version_func(), key, lambda: func(*args))
+        return wrapper
+    return decorator
+
+
+def for_app(app_name):
+    """The cache of a dashboard: shared on disk with DASH_CACHE_DIR, else in memory."""
+    if not CACHE_DIR:
+        return LocalCache()
+    directory = os.path.join(CACHE_DIR, app_name)
+    os.makedirs(directory, exist_ok=True)
+    return SharedCache(directory)
@@ -0,0 +1,115 @@
+import datetime
+import os
+
+# --- Long-range time-series charts ---
+# A daily line over a few years is over a thousand points, each shipped to the browser
+# as full Plotly JSON and drawn with a marker. The dashboards keep every line under a
+# point budget instead:
+#
+#   * "auto" granularity picks the finest of day/week/month that fits the budget;
+#   * a line still over it (e.g. "Dia" picked by hand for two years) is reduced with
+#     LTTB (Largest-Triangle-Three-Buckets), which keeps the peaks and dips a plain
+#     every-n-th sample would drop;
+#   * compact_figure() sends dates as "YYYY-MM-DD", drops markers on long lines and
+#     replaces Plotly's default template (several KB per figure) with a small one.
+
+MAX_POINTS = int(os.environ.get("CHART_MAX_POINTS", "400"))
+MARKER_LIMIT = 60  # lines with more points are drawn without markers
+AUTO = "auto"
+# (pandas frequency, days per bucket, label), finest first
+FREQUENCIES = (("D", 1, "dia"), ("W", 7, "semana"), ("M", 30.44, "mês"))
+
+SLIM_TEMPLATE = {
+    "layout": {
+        "font": {"family": "Helvetica, Arial, sans-serif", "color": "#2a3f5f"},
+        "plot_bgcolor": "#E5ECF6",
+        "xaxis": {"gridcolor": "white", "zeroline": False},
+        "yaxis": {"gridcolor": "white", "zeroline": False},
+        "hovermode": "x unified",
+        "margin": {"l": 50, "r": 20, "t": 60, "b": 40},
+    }
+}
+
+
+def resolve_freq(freq, start, end, max_points=MAX_POINTS):
+    """`freq`, or for AUTO the finest frequency giving at most `max_points` buckets."""
+    if freq != AUTO:
+        return freq
+    days = (datetime.date.fromisoformat(str(end)[:10]) - datetime.date.fromisoformat(str(start)[:10])).days + 1
+    for candidate, length, _ in FREQUENCIES:
+        if days / length <= max_points:
+            return candidate
+    return FREQUENCIES[-1][0]
+
+
+def freq_label(freq):
+    return {candidate: label for candidate, _, label in FREQUENCIES}.get(freq, freq)
+
+
+def lttb(values, threshold):
+    """Indices of the `threshold` points of an evenly spaced series that best keep its
+    shape (Largest-Triangle-Three-Buckets). First and last points are always kept."""
+    count = len(values)
+    if threshold >= count or threshold < 3:
+        return list(range(count))
+
+    indices = [0]
+    bucket_size = (count - 2) / (threshold - 2)
+    selected = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        # Average of the next bucket (the last point for the last bucket)
+        next_start, next_end = end, min(int((bucket + 2) * bucket_size) + 1, count)
+        if next_start >= next_end:
+            next_start, next_end = count - 1, count
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = sum(values[next_start:next_end]) / (next_end - next_start)
+
+        # Point of this bucket making the largest triangle with the last kept point and that average
+        best, best_area = start, -1.0
+        x_a, y_a = selected, values[selected]
+        for index in range(start, end):
+            area = abs((x_a - avg_x) * (values[index] - y_a) - (x_a - index) * (avg_y - y_a))
+            if area > best_area:
+                best, best_area = index, area
+        indices.append(best)
+        selected = best
+    indices.append(count - 1)
+    return indices
+
+
+def line_points(frame, x, columns, max_points=MAX_POINTS):
+    """(x labels, {column: values}, sampled) of an aggregated frame, ready for go.Scatter.
+
+    With several columns each one is reduced on its own and the union is kept, so
+    every line keeps its own peaks.
+    """
+    series = {column: frame[column].tolist() for column in columns}
+    count = len(frame)
+    sampled = count > max_points
+    if sampled:
+        keep = sorted(set().union(*(lttb(values, max_points) for values in series.values())))
+        series = {column: [values[index] for index in keep] for column, values in series.items()}
+        frame = frame.iloc[keep]
+    labels = frame[x].dt.strftime("%Y-%m-%d").tolist()
+    return labels, series, sampled
+
+
+def chart_title(title, freq, requested, sampled):
+    """Title noting an automatic granularity or a sampled line."""
+    notes = []
+    if requested == AUTO:
+        notes.append(f"por {freq_label(freq)}")
+    if sampled:
+        notes.append("amostrado")
+    return f"{title} ({', '.join(notes)})" if notes else title
+
+
+def compact_figure(fig, marker_limit=MARKER_LIMIT):
+    """Trims what the figure sends to the browser (see the notes above)."""
+    fig.update_layout(template=SLIM_TEMPLATE)
+    for trace in fig.data:
+        if trace.x is not None and len(trace.x) > marker_limit:
+            trace.mode = "lines"
+    return fig
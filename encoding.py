@@ -0,0 +1,234 @@
+import json
+
+import storage
+
+# --- Dictionary-encoded formula records ---
+# Instead of a list of dicts repeating every key and three employee names per record,
+# formulas are stored as:
+#
+#   {"format": "formulas/encoded-v1",
+#    "columns": ["date", "time", ..., "funcionario_pesagem", ...],
+#    "dictionaries": {"employees": ["Tati", "Dani", ...], "tipos": ["Cápsulas", ...]},
+#    "rows": [["2025-09-16", "11:21", 123, null, 0, 0, 1, 0, false, ...], ...]}
+#
+# Employee names and formula types are stored as integer codes into the dictionaries.
+# Codes are stable: removing an employee keeps the code (old records still decode) and
+# renaming one is a single dictionary update. Records are decoded back to the usual
+# dicts at the edges (API responses, dashboards), so nothing downstream changes.
+#
+# Fields outside COLUMNS are kept in a trailing dict. A field stored as null reads back
+# as missing. The monthly shards (shards.py) omit "dictionaries" and share the ones in
+# their manifest.
+
+FORMAT = "formulas/encoded-v1"
+EMPLOYEE_FIELDS = ("funcionario_pesagem", "funcionario_manipulacao", "funcionario_pm")
+COLUMNS = ("date", "time", "horario", "nr", "turno", "tipo_formula") + EMPLOYEE_FIELDS + (
+    "refeito_pm", "refeito_exc", "estoque_usado", "estoque_feito", "pm_mais_20", "refeito_semi_solidos")
+DICTIONARY_FIELDS = {"tipo_formula": "tipos", **{field: "employees" for field in EMPLOYEE_FIELDS}}
+_COLUMN_SET = set(COLUMNS)
+
+
+class Dictionary:
+    """Append-only value <-> integer code table."""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def lookup(self, value):
+        return self.codes.get(value)
+
+    def add(self, code, value):
+        """Idempotent: only appends when `code` is the next free code."""
+        if code == len(self.values):
+            self.values.append(value)
+            self.codes[value] = code
+
+    def rename(self, code, value):
+        del self.codes[self.values[code]]
+        self.values[code] = value
+        self.codes[value] = code
+
+
+class FormulaCodec:
+    def __init__(self):
+        self.dictionaries = {"employees": Dictionary(), "tipos": Dictionary()}
+
+    # --- Codes ---
+    def intern(self, dictionary, value):
+        """Returns (code, new_entry) where new_entry is None if the value was already known."""
+        table = self.dictionaries[dictionary]
+        code = table.lookup(value)
+        if code is not None:
+            return code, None
+        code = len(table.values)
+        table.add(code, value)
+        return code, {"op": "code", "dict": dictionary, "id": code, "value": value}
+
+    def apply(self, entry):
+        """Replays a "code" or "rename" WAL entry."""
+        table = self.dictionaries[entry["dict"]]
+        if entry["op"] == "code":
+            table.add(entry["id"], entry["value"])
+        elif entry["op"] == "rename" and table.values[entry["id"]] != entry["value"]:
+            table.rename(entry["id"], entry["value"])
+
+    # --- Rows ---
+    def encode(self, record):
+        """Returns (row, new_code_entries)."""
+        new_codes = []
+        row = []
+        for column in COLUMNS:
+            value = record.get(column)
+            dictionary = DICTIONARY_FIELDS.get(column)
+            if dictionary is not None and value is not None:
+                value, new_entry = self.intern(dictionary, value)
+                if new_entry is not None:
+                    new_codes.append(new_entry)
+            row.append(value)
+        extras = {key: value for key, value in record.items() if key not in _COLUMN_SET}
+        row.append(extras or None)
+        while row and row[-1] is None:
+            row.pop()
+        return row, new_codes
+
+    def decode(self, row):
+        record = {}
+        for column, value in zip(COLUMNS, row):
+            if value is None:
+                continue
+            dictionary = DICTIONARY_FIELDS.get(column)
+            record[column] = self.dictionaries[dictionary].values[value] if dictionary else value
+        if len(row) > len(COLUMNS) and row[len(COLUMNS)]:
+            record.update(row[len(COLUMNS)])
+        return record
+
+    # --- Files ---
+    def load(self, data):
+        """Rows from a file's content: an encoded document or a legacy list of dicts."""
+        if is_encoded(data):
+            self.dictionaries = {name: Dictionary(values) for name, values in data["dictionaries"].items()}
+            columns = data["columns"]
+            if list(columns) == list(COLUMNS):
+                return data["rows"]
+            # Written with another column layout: re-encode through plain dicts
+            old = FormulaCodec()
+            old.dictionaries = self.dictionaries
+            return [self._reencode(old, columns, row) for row in data["rows"]]
+        self.dictionaries = {"employees": Dictionary(), "tipos": Dictionary()}
+        return [self.encode(record)[0] for record in data or []]
+
+    def load_dictionaries(self, dictionaries):
+        self.dictionaries = {"employees": Dictionary(), "tipos": Dictionary()}
+        self.dictionaries.update((name, Dictionary(values)) for name, values in dictionaries.items())
+
+    def load_rows(self, data):
+        """Rows of an encoded document that uses this codec's dictionaries (see shards.py)."""
+        if list(data["columns"]) == list(COLUMNS):
+            return data["rows"]
+        return [self._reencode(self, data["columns"], row) for row in data["rows"]]
+
+    def _reencode(self, old, columns, row):
+        record = {}
+        for column, value in zip(columns, row):
+            if value is not None:
+                dictionary = DICTIONARY_FIELDS.get(column)
+                record[column] = old.dictionaries[dictionary].values[value] if dictionary else value
+        if len(row) > len(columns) and row[len(columns)]:
+            record.update(row[len(columns)])
+        return self.encode(record)[0]
+
+    def dump(self, rows, dictionaries=True):
+        """Encoded document; without dictionaries for files that share them (see shards.py)."""
+        document = {"format": FORMAT, "columns": list(COLUMNS)}
+        if dictionaries:
+            document["dictionaries"] = self.dump_dictionaries()
+        document["rows"] = rows
+        return document
+
+    def dumps(self, rows, dictionaries=True):
+        return dumps(self.dump(rows, dictionaries))
+
+    def dump_dictionaries(self):
+        return {name: table.values for name, table in self.dictionaries.items()}
+
+    def rows_to_rewrite(self, entry, rows):
+        """Positions of the rows whose stored form shows the value of a "rename" entry:
+        none, the shards hold codes and the manifest the dictionaries."""
+        return []
+
+    def copy(self):
+        """A codec with copies of the dictionaries, for writing a snapshot outside the
+        Store's lock while new codes and renames keep arriving."""
+        codec = type(self)()
+        codec.dictionaries = {name: Dictionary(table.values) for name, table in self.dictionaries.items()}
+        return codec
+
+
+class ErrorCodec(FormulaCodec):
+    """Error records (data_julia.json) with "funcionario" held as an employee code, so a
+    rename is one dictionary update here too.
+
+    Only the in-memory rows are encoded: the shard files keep plain records with the
+    current name plus "funcionario_id", so the apps reading them directly still work
+    and a restart finds every record's employee by id even if the name on disk is an
+    older one. The dictionary is kept in the shards' manifest.
+    """
+
+    def encode(self, record):
+        name = record.get("funcionario")
+        if name is None:
+            return dict(record), []
+        code, new_entry = self.intern("employees", name)
+        return dict(record, funcionario=code), [new_entry] if new_entry is not None else []
+
+    def decode(self, row):
+        code = row.get("funcionario")
+        if not isinstance(code, int) or isinstance(code, bool):
+            return row  # logged before the errors were encoded: holds the name
+        return dict(row, funcionario=self.dictionaries["employees"].values[code])
+
+    def rows_to_rewrite(self, entry, rows):
+        """The shard files show names: the rows of the renamed employee."""
+        if entry["dict"] != "employees":
+            return []
+        return [position for position, row in enumerate(rows) if row.get("funcionario") == entry["id"]]
+
+    def _load_record(self, record):
+        record = dict(record)
+        code = record.pop("funcionario_id", None)
+        if isinstance(code, int) and 0 <= code < len(self.dictionaries["employees"].values):
+            record["funcionario"] = code
+            return record
+        return self.encode(record)[0]
+
+    def load(self, data):
+        return [self._load_record(record) for record in data or []]
+
+    def load_rows(self, data):
+        return self.load(data)
+
+    def dump(self, rows, dictionaries=True):
+        records = []
+        for row in rows:
+            record = self.decode(row)
+            if record is not row:
+                record["funcionario_id"] = row["funcionario"]
+            records.append(record)
+        return records
+
+    def dumps(self, rows, dictionaries=True):
+        return storage.dumps(self.dump(rows))
+
+
+def is_encoded(data):
+    return isinstance(data, dict) and data.get("format") == FORMAT
+
+
+def dumps(document):
+    """Serializes an encoded document with one compact row per line."""
+    header = {key: value for key, value in document.items() if key != "rows"}
+    head = json.dumps(header, ensure_ascii=False)[:-1]
+    rows = ",\n".join(storage.dumps(row) for row in document["rows"])
+    return f'{head}, "rows": [\n{rows}\n]}}\n'
+
@@ -0,0 +1,66 @@
+import argparse
+import os
+import sys
+
+import shards
+import storage
+
+# Readable copy of the data for people (the data files themselves are compact):
+#
+#   python export_json.py formulas --start 2025-09-01 --end 2025-09-30
+#   python export_json.py errors -o erros.json
+#   python export_json.py funcionarios.json
+#
+# Collections are streamed shard by shard, so exporting the whole history does not
+# load it into memory at once.
+
+COLLECTIONS = {
+    "formulas": lambda: shards.formulas("formulas.json"),
+    "errors": lambda: shards.errors("data_julia.json"),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Exporta os dados em JSON indentado (legível).")
+    parser.add_argument("source", help="formulas, errors ou o caminho de um arquivo JSON")
+    parser.add_argument("--start", help="Data inicial (AAAA-MM-DD), só para formulas/errors")
+    parser.add_argument("--end", help="Data final (AAAA-MM-DD), só para formulas/errors")
+    parser.add_argument("-o", "--output", help="Arquivo de saída (padrão: <origem>_export.json)")
+    return parser.parse_args()
+
+
+def in_range(record, start, end):
+    day = str(record.get("date") or "")[:10]
+    return (not start or day >= start) and (not end or day <= end)
+
+
+def write_records(f, records):
+    """Writes an indented JSON array one record at a time."""
+    f.write("[")
+    for count, record in enumerate(records):
+        f.write(",\n    " if count else "\n    ")
+        f.write(storage.dumps_pretty(record).replace("\n", "\n    "))
+    f.write("\n]\n")
+
+
+def main():
+    args = parse_args()
+    name = os.path.splitext(os.path.basename(args.source))[0]
+    output = args.output or f"{name}_export.json"
+
+    if args.source in COLLECTIONS:
+        records = COLLECTIONS[args.source]().iter_records(args.start, args.end)
+        with open(output, 'w', encoding='utf-8') as f:
+            write_records(f, (record for record in records if in_range(record, args.start, args.end)))
+    elif os.path.exists(args.source):
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(storage.dumps_pretty(storage.read_json(args.source)) + "\n")
+    else:
+        print(f"Origem desconhecida: {args.source}")
+        sys.exit(1)
+
+    print(f"Exportado para {output}")
+
+
+if __name__ == "__main__":
+    main()
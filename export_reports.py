@@ -0,0 +1,213 @@
+import argparse
+import datetime
+import html
+import importlib
+import json
+import os
+import re
+from multiprocessing import Pool
+
+# Static reports of closed periods, rendered ahead of time:
+#
+#   python export_reports.py formulas --months 12 --weeks 8 --workers 4
+#   python export_reports.py errors --months 6 --employees
+#
+# Each period gets the dashboard's whole set of KPIs and figures, as computed by the
+# dashboard's own callback, written to
+#
+#   reports/<painel>/<período>.html   # opens without the dashboard running
+#   reports/<painel>/<período>.json   # the figures (Plotly JSON) and the KPI components
+#   reports/index.html                # links to every report
+#
+# A month or week that is over does not change, so its files are only written once
+# (--force renders them again, e.g. after back-dated records). The dashboards serve the
+# folder at /reports/, so last month's numbers cost no computation at all.
+#
+# The dashboard is loaded once before the pool starts; on Linux the worker processes
+# share it, on Windows each worker loads it again.
+
+REPORTS_DIR = os.environ.get("REPORTS_DIR", "reports")
+DASHBOARDS = {"formulas": "test", "errors": "dashboard_julia"}
+TITLES = {"formulas": "Produção de Fórmulas", "errors": "Custos de Erros"}
+
+_dashboard = None  # the dashboard module, in each worker
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Gera relatórios estáticos (HTML/JSON) de períodos encerrados.")
+    parser.add_argument("dashboard", choices=sorted(DASHBOARDS), help="formulas (test.py) ou errors (dashboard_julia.py)")
+    parser.add_argument("--months", type=int, default=12, help="Últimos N meses encerrados (0: nenhum).")
+    parser.add_argument("--weeks", type=int, default=8, help="Últimas N semanas encerradas (0: nenhuma).")
+    parser.add_argument("--employees", action="store_true",
+                        help="Também um relatório por funcionário em cada mês (só errors).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processos.")
+    parser.add_argument("--force", action="store_true", help="Refaz relatórios já existentes.")
+    parser.add_argument("-o", "--output", default=REPORTS_DIR, help="Pasta de saída.")
+    return parser.parse_args()
+
+
+# --- Periods ---
+def closed_months(min_date, today, count):
+    """(label, start, end) of the last `count` whole months before today's, from min_date on."""
+    months = []
+    end = today.replace(day=1) - datetime.timedelta(days=1)
+    while len(months) < count and end >= min_date:
+        start = end.replace(day=1)
+        months.append((start.strftime("%Y-%m"), start, end))
+        end = start - datetime.timedelta(days=1)
+    return months
+
+
+def closed_weeks(min_date, today, count):
+    """(label, monday, sunday) of the last `count` whole weeks before this one."""
+    weeks = []
+    end = today - datetime.timedelta(days=today.weekday() + 1)
+    while len(weeks) < count and end >= min_date:
+        start = end - datetime.timedelta(days=6)
+        year, week, _ = start.isocalendar()
+        weeks.append((f"{year}-W{week:02d}", start, end))
+        end = start - datetime.timedelta(days=1)
+    return weeks
+
+
+def slug(text):
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", text).strip("_") or "_"
+
+
+# --- Rendering (in the workers) ---
+def load_dashboard(name):
+    global _dashboard
+    _dashboard = importlib.import_module(DASHBOARDS[name])
+
+
+def css_name(key):
+    """fontSize -> font-size"""
+    return re.sub(r"([A-Z])", r"-\1", key).lower()
+
+
+def component_html(component):
+    """Static HTML of a Dash html.* tree (the KPI cards)."""
+    if component is None:
+        return ""
+    if isinstance(component, (list, tuple)):
+        return "".join(component_html(child) for child in component)
+    if not hasattr(component, "to_plotly_json"):
+        return html.escape(str(component))
+    tag = type(component).__name__.lower()
+    props = component.to_plotly_json()["props"]
+    style = "; ".join(f"{css_name(key)}: {value}" for key, value in (props.get("style") or {}).items())
+    attributes = f' style="{html.escape(style)}"' if style else ""
+    if tag == "br":
+        return "<br>"
+    return f"<{tag}{attributes}>{component_html(props.get('children'))}</{tag}>"
+
+
+def render(task):
+    """Computes one period with the dashboard's callback and writes its files."""
+    dashboard, label, start, end, employee, directory = task
+    args = [str(start), str(end), "D"]
+    if dashboard == "errors":
+        args.append(employee)
+    outputs = _dashboard.update_dashboard(*args, None)
+
+    figures, kpis = {}, None
+    for output, value in zip(_dashboard.DASHBOARD_OUTPUTS, outputs):
+        if output.component_property == "figure":
+            figures[output.component_id] = value
+        else:
+            kpis = value
+
+    from plotly.io import to_json
+    title = f"{TITLES[dashboard]} — {label}" + (f" — {employee}" if employee else "")
+    data = {"title": title, "start": str(start), "end": str(end), "employee": employee,
+            "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "figures": {key: json.loads(to_json(figure)) for key, figure in figures.items()},
+            "kpis": json.loads(to_json(kpis))}
+    base = os.path.join(directory, label)
+    with open(base + ".json", 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+    charts = "".join(f'<div class="chart">{figure.to_html(full_html=False, include_plotlyjs=False)}</div>'
+                     for figure in figures.values())
+    with open(base + ".html", 'w', encoding='utf-8') as f:
+        f.write(PAGE.format(title=html.escape(title), kpis=component_html(kpis), charts=charts,
+                            generated=data["generated_at"]))
+    return label
+
+
+PAGE = """<!DOCTYPE html>
+<html lang="pt-br"><head><meta charset="utf-8"><title>{title}</title>
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<script src="../plotly.min.js"></script>
+<style>body{{font-family: Arial, sans-serif; background: #f4f6f9; padding: 20px}}
+.charts{{display: flex; flex-wrap: wrap}} .chart{{flex: 1 1 45%; min-width: 400px; background: white; margin: 5px}}</style>
+</head><body><h1>{title}</h1>{kpis}<div class="charts">{charts}</div>
+<p style="color: #888">Gerado em {generated}</p></body></html>
+"""
+
+
+# --- Index ---
+def write_index(output):
+    sections = []
+    for dashboard in sorted(DASHBOARDS):
+        directory = os.path.join(output, dashboard)
+        if not os.path.isdir(directory):
+            continue
+        pages = sorted((name for name in os.listdir(directory) if name.endswith(".html")), reverse=True)
+        links = "".join(f'<li><a href="{dashboard}/{html.escape(name)}">{html.escape(name[:-5])}</a></li>' for name in pages)
+        sections.append(f"<h2>{TITLES[dashboard]}</h2><ul>{links}</ul>")
+    with open(os.path.join(output, "index.html"), 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html><html lang="pt-br"><head><meta charset="utf-8"><title>Relatórios</title></head>'
+                f'<body style="font-family: Arial, sans-serif"><h1>Relatórios</h1>{"".join(sections)}</body></html>\n')
+
+
+def install(app):
+    """Serves the reports folder at /reports/ on a Dash app's Flask server."""
+    from flask import send_from_directory
+
+    def reports_endpoint(path="index.html"):
+        return send_from_directory(os.path.abspath(REPORTS_DIR), path)
+
+    app.server.add_url_rule("/reports/", "reports_index", reports_endpoint)
+    app.server.add_url_rule("/reports/<path:path>", "reports", reports_endpoint)
+
+
+def main():
+    args = parse_args()
+    # Only the callbacks are needed: no background precompute in the export
+    os.environ["DASH_PRECOMPUTE"] = "0"
+    load_dashboard(args.dashboard)
+    directory = os.path.join(args.output, args.dashboard)
+    os.makedirs(directory, exist_ok=True)
+
+    plotly_js = os.path.join(args.output, "plotly.min.js")
+    if not os.path.exists(plotly_js):
+        from plotly.offline import get_plotlyjs
+        with open(plotly_js, 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+
+    today = datetime.date.today()
+    periods = closed_months(_dashboard.min_date, today, args.months) + closed_weeks(_dashboard.min_date, today, args.weeks)
+    tasks = [(args.dashboard, label, start, end, None, directory) for label, start, end in periods]
+    if args.employees and args.dashboard == "errors":
+        for label, start, end in closed_months(_dashboard.min_date, today, args.months):
+            tasks += [(args.dashboard, f"{label}_{slug(employee)}", start, end, employee, directory)
+                      for employee in _dashboard.unique_employees]
+    if not args.force:
+        tasks = [task for task in tasks if not os.path.exists(os.path.join(directory, task[1] + ".html"))]
+
+    if tasks:
+        if args.workers > 1:
+            with Pool(min(args.workers, len(tasks)), initializer=load_dashboard, initargs=(args.dashboard,)) as pool:
+                done = list(pool.imap_unordered(render, tasks))
+        else:
+            done = [render(task) for task in tasks]
+        print(f"{len(done)} relatórios gerados em {directory}")
+    else:
+        print("Nenhum relatório novo (use --force para refazer).")
+    write_index(args.output)
+    print(f"Índice: {os.path.join(args.output, 'index.html')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import argparse
+import csv
+import io
+import re
+import sys
+import zipfile
+from xml.sax.saxutils import escape
+
+import shards
+from schema import FLAGS as FORMULA_FLAGS
+from validation import ERROR_FLAGS
+
+# Spreadsheet copy of the data (CSV or Excel), e.g. for the accountant:
+#
+#   python export_table.py errors --start 2025-01-01 --end 2025-12-31 -o erros_2025.xlsx
+#   python export_table.py formulas --employee Ana --tipo-formula Cápsula -o ana.csv
+#
+# server.py serves the same files at GET /formulas/export and /errors/export.
+#
+# Records are streamed (shard by shard from the files, in chunks from the server's
+# store) and written row by row: the CSV as text chunks, the XLSX as a zip whose sheet
+# is compressed while it is written. Memory stays the same whatever the period. The
+# XLSX is written by hand (inline strings, no shared string table), so no spreadsheet
+# library is needed; past Excel's row limit the rows continue on a new sheet.
+
+COLUMNS = {
+    "formulas": ["date", "time", "nr", "turno", "tipo_formula", "funcionario_pesagem",
+                 "funcionario_manipulacao", "funcionario_pm", *FORMULA_FLAGS],
+    "errors": ["date", "time", "nr", "funcionario", "valor", "tipos_erro", *ERROR_FLAGS, "observacoes"],
+}
+COLLECTIONS = {
+    "formulas": lambda: shards.formulas("formulas.json"),
+    "errors": lambda: shards.errors("data_julia.json"),
+}
+FORMATS = {"csv": "text/csv; charset=utf-8",
+           "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+EMPLOYEE_FIELDS = {"formulas": ("funcionario_pesagem", "funcionario_manipulacao", "funcionario_pm"),
+                   "errors": ("funcionario",)}
+CHUNK_ROWS = 1000
+SHEET_ROWS = 1048576  # Excel's limit, header included
+
+
+# --- Filtering (for the files; the server filters on its indexes) ---
+def matches(collection, record, start=None, end=None, employee=None, tipo_formula=None, tipo_erro=None):
+    day = str(record.get("date") or "")[:10]
+    if (start and day < start) or (end and day > end):
+        return False
+    if employee and employee not in (record.get(field) for field in EMPLOYEE_FIELDS[collection]):
+        return False
+    if tipo_formula and record.get("tipo_formula") != tipo_formula:
+        return False
+    if tipo_erro:
+        types = record.get("tipos_erro") or []
+        if tipo_erro not in ([types] if isinstance(types, str) else types):
+            return False
+    return True
+
+
+def cell_value(value):
+    """Lists as "a, b"; missing values as empty cells."""
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    return value
+
+
+# --- CSV ---
+def csv_chunks(records, columns, delimiter=","):
+    """The CSV as text chunks of CHUNK_ROWS rows (with a BOM so Excel reads the accents)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\r\n")
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    for count, record in enumerate(records, 1):
+        writer.writerow([cell_value(record.get(column)) for column in columns])
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# --- XLSX ---
+_ILLEGAL_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+{sheets}</Types>"""
+_SHEET_TYPE = ('<Override PartName="/xl/worksheets/sheet{0}.xml" '
+               'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>\n')
+_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets>{sheets}</sheets></workbook>"""
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+{sheets}<Relationship Id="rIdStyles" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+_SHEET_REL = ('<Relationship Id="rId{0}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+              'Target="worksheets/sheet{0}.xml"/>\n')
+_STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="1"><fill><patternFill patternType="none"/></fill></fills>
+<borders count="1"><border/></borders>
+<cellStyleXfs count="1"><xf/></cellStyleXfs>
+<cellXfs count="1"><xf/></cellXfs>
+</styleSheet>"""
+_SHEET_START = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_SHEET_END = "</sheetData></worksheet>"
+
+
+def xlsx_cell(value):
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f"<c><v>{value!r}</v></c>"
+    text = escape(_ILLEGAL_XML.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_row(values):
+    return "<row>" + "".join(xlsx_cell(cell_value(value)) for value in values) + "</row>"
+
+
+class _Chunks:
+    """Write-only file object collecting what the zip writes (it cannot seek, so
+    zipfile streams the entries with data descriptors)."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def xlsx_chunks(records, columns, sheet_name="Dados"):
+    """The XLSX as byte chunks, compressed as the rows are written."""
+    sink = _Chunks()
+    header = xlsx_row(columns)
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as workbook:
+        sheet_count, rows = 1, 1
+        sheet = workbook.open("xl/worksheets/sheet1.xml", "w")
+        sheet.write((_SHEET_START + header).encode("utf-8"))
+        lines = []
+        for record in records:
+            if rows == SHEET_ROWS:
+                sheet.write(("".join(lines) + _SHEET_END).encode("utf-8"))
+                sheet.close()
+                sheet_count, rows, lines = sheet_count + 1, 1, []
+                sheet = workbook.open(f"xl/worksheets/sheet{sheet_count}.xml", "w")
+                sheet.write((_SHEET_START + header).encode("utf-8"))
+            lines.append(xlsx_row(record.get(column) for column in columns))
+            rows += 1
+            if len(lines) == CHUNK_ROWS:
+                sheet.write("".join(lines).encode("utf-8"))
+                lines = []
+                yield sink.take()
+        sheet.write(("".join(lines) + _SHEET_END).encode("utf-8"))
+        sheet.close()
+
+        numbers = range(1, sheet_count + 1)
+        names = [sheet_name if number == 1 else f"{sheet_name} {number}" for number in numbers]
+        workbook.writestr("[Content_Types].xml", _CONTENT_TYPES.format(sheets="".join(_SHEET_TYPE.format(n) for n in numbers)))
+        workbook.writestr("_rels/.rels", _ROOT_RELS)
+        workbook.writestr("xl/workbook.xml", _WORKBOOK.format(sheets="".join(
+            f'<sheet name="{escape(name)}" sheetId="{n}" r:id="rId{n}"/>' for n, name in zip(numbers, names))))
+        workbook.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS.format(sheets="".join(_SHEET_REL.format(n) for n in numbers)))
+        workbook.writestr("xl/styles.xml", _STYLES)
+    yield sink.take()
+
+
+def table_chunks(fmt, records, columns, delimiter=","):
+    if fmt == "xlsx":
+        return xlsx_chunks(records, columns)
+    return csv_chunks(records, columns, delimiter)
+
+
+# --- CLI ---
+def parse_args():
+    parser = argparse.ArgumentParser(description="Exporta fórmulas ou erros em CSV ou Excel (XLSX).")
+    parser.add_argument("collection", choices=sorted(COLLECTIONS), help="formulas ou errors")
+    parser.add_argument("--start", help="Data inicial (AAAA-MM-DD)")
+    parser.add_argument("--end", help="Data final (AAAA-MM-DD)")
+    parser.add_argument("--employee", help="Funcionário (em qualquer função, para fórmulas)")
+    parser.add_argument("--tipo-formula", help="Tipo de fórmula (só formulas)")
+    parser.add_argument("--tipo-erro", help="Tipo de erro (só errors)")
+    parser.add_argument("--format", choices=sorted(FORMATS), help="csv ou xlsx (padrão: pela extensão de -o)")
+    parser.add_argument("--sep", default=",", help="Separador do CSV (use ';' para o Excel em português)")
+    parser.add_argument("-o", "--output", help="Arquivo de saída (padrão: <coleção>_export.<formato>)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    fmt = args.format or (args.output.rsplit(".", 1)[-1].lower() if args.output and "." in args.output else "csv")
+    if fmt not in FORMATS:
+        print(f"Formato desconhecido: {fmt} (use csv ou xlsx)")
+        sys.exit(1)
+    output = args.output or f"{args.collection}_export.{fmt}"
+
+    records = COLLECTIONS[args.collection]().iter_records(args.start, args.end)
+    records = (record for record in records
+               if matches(args.collection, record, args.start, args.end, args.employee, args.tipo_formula, args.tipo_erro))
+    columns = COLUMNS[args.collection]
+    if fmt == "xlsx":
+        with open(output, 'wb') as f:
+            for chunk in xlsx_chunks(records, columns):
+                f.write(chunk)
+    else:
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            for chunk in csv_chunks(records, columns, args.sep):
+                f.write(chunk)
+
+    print(f"Exportado para {output}")
+
+
+if __name__ == "__main__":
+    main()
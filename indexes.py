@@ -0,0 +1,211 @@
+import bisect
+
+# Secondary indexes over list collections of the Store. Record ids are positions in
+# the collection, and the Store calls add() for every insert (including WAL replay),
+# so the indexes never need a full rescan after startup.
+
+
+class HashIndex:
+    """key -> list of record ids. `key_func` returns an iterable of keys for a record."""
+
+    def __init__(self, key_func):
+        self.key_func = key_func
+        self.postings = {}
+
+    def clear(self):
+        self.postings = {}
+
+    def add(self, record_id, record):
+        for key in self.key_func(record):
+            self.postings.setdefault(key, []).append(record_id)
+
+    def lookup(self, key):
+        return self.postings.get(key, [])
+
+    def keys(self):
+        return self.postings.keys()
+
+
+class SortedIndex:
+    """Ordered (key, id) pairs for range queries, e.g. ISO dates."""
+
+    def __init__(self, key_func):
+        self.key_func = key_func
+        self.keys = []
+        self.ids = []
+
+    def clear(self):
+        self.keys = []
+        self.ids = []
+
+    def add(self, record_id, record):
+        key = self.key_func(record)
+        if key is None:
+            return
+        # Records arrive mostly in order, so this is usually an append
+        position = bisect.bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.ids.insert(position, record_id)
+
+    def range(self, start=None, end=None):
+        """Ids with start <= key <= end (either bound may be None)."""
+        lo = 0 if start is None else bisect.bisect_left(self.keys, start)
+        hi = len(self.keys) if end is None else bisect.bisect_right(self.keys, end)
+        return self.ids[lo:hi]
+
+
+# --- Key functions for the error records (data_julia.json) ---
+def error_nr(record):
+    return [str(record.get("nr"))]
+
+
+def error_date(record):
+    return record.get("date")
+
+
+def error_employee(codec):
+    """Key function: the employee's code in the errors' dictionary (encoding.ErrorCodec),
+    so the postings survive a rename like the formulas' ones."""
+    def key_func(record):
+        code = codec.dictionaries["employees"].lookup(record.get("funcionario"))
+        return [] if code is None else [code]
+    return key_func
+
+
+def error_types(record):
+    # Older records store a single type as a string, newer ones a list
+    types = record.get("tipos_erro", [])
+    return [types] if isinstance(types, str) else list(dict.fromkeys(types))
+
+
+# --- Employee postings (formulas) ---
+ROLES = {"pesagem": "funcionario_pesagem", "manipulacao": "funcionario_manipulacao", "pm": "funcionario_pm"}
+
+
+def employee_role(role, codec):
+    """Key function: the stable employee id (see encoding.py) in one production role.
+
+    Keyed by id rather than name so renaming an employee leaves the postings valid.
+    """
+    field = ROLES[role]
+
+    def key_func(record):
+        code = codec.dictionaries["employees"].lookup(record.get(field))
+        return [] if code is None else [code]
+    return key_func
+
+
+# --- NR join between formulas and error records ---
+
+
+class NrJoin:
+    """Joins formulas and error records on NR and keeps error-cost totals up to date.
+
+    Register `join.formulas` on the formulas collection and `join.errors` on the errors
+    collection. The cost of an NR (sum of its errors' valor) is split evenly between the
+    formulas with that NR (an NR made twice splits its cost), and each share is added to
+    the formula's employees (per role) and tipo_formula. When either side of an NR
+    changes only that NR's contribution is recomputed.
+    """
+
+    def __init__(self, codec=None):
+        """With a `codec` (encoding.FormulaCodec) employees are keyed by their stable id,
+        so a rename needs no rebuild; the report still shows names."""
+        self.codec = codec
+        self.formulas_by_nr = {}  # nr -> [(id, {role: employee}, tipo_formula)]
+        self.errors_by_nr = {}    # nr -> [(id, valor)]
+        self.by_employee = {}
+        self.by_tipo_formula = {}
+        self.unmatched_cost = 0.0
+        self.formulas = _JoinSide(self, self.formulas_by_nr, self._formula_entry)
+        self.errors = _JoinSide(self, self.errors_by_nr, self._error_entry)
+
+    def _formula_entry(self, record_id, record):
+        employees = {role: self._employee_key(record.get(field)) for role, field in ROLES.items() if record.get(field)}
+        return record_id, employees, record.get("tipo_formula")
+
+    def _employee_key(self, name):
+        if self.codec is None:
+            return name
+        code = self.codec.dictionaries["employees"].lookup(name)
+        return name if code is None else code
+
+    def _employee_name(self, key):
+        if self.codec is None or not isinstance(key, int):
+            return key
+        return self.codec.dictionaries["employees"].values[key]
+
+    @staticmethod
+    def _error_entry(record_id, record):
+        try:
+            valor = float(record.get("valor") or 0)
+        except (TypeError, ValueError):
+            valor = 0.0
+        return record_id, valor
+
+    def _contribute(self, nr, sign):
+        errors = self.errors_by_nr.get(nr)
+        if not errors:
+            return
+        cost = sum(valor for _, valor in errors)
+        formulas = self.formulas_by_nr.get(nr)
+        if not formulas:
+            self.unmatched_cost += sign * cost
+            return
+        share = sign * cost / len(formulas)
+        involved = set()
+        for _, employees, tipo in formulas:
+            for role, employee in employees.items():
+                totals = self.by_employee.setdefault(employee, {"pesagem": 0.0, "manipulacao": 0.0, "pm": 0.0, "errors": 0})
+                totals[role] += share
+                involved.add(employee)
+            if tipo:
+                self.by_tipo_formula[tipo] = self.by_tipo_formula.get(tipo, 0.0) + share
+        # Each error counts once per employee involved in the NR, whatever the role
+        for employee in involved:
+            self.by_employee[employee]["errors"] += sign * len(errors)
+
+    def _recompute(self):
+        self.by_employee = {}
+        self.by_tipo_formula = {}
+        self.unmatched_cost = 0.0
+        for nr in self.errors_by_nr:
+            self._contribute(nr, +1)
+
+    def lookup(self, nr):
+        """(formula ids, error ids) sharing this NR."""
+        nr = str(nr)
+        return ([entry[0] for entry in self.formulas_by_nr.get(nr, ())],
+                [entry[0] for entry in self.errors_by_nr.get(nr, ())])
+
+    def report(self):
+        by_employee = {}
+        for employee, totals in self.by_employee.items():
+            row = {key: round(value, 2) for key, value in totals.items() if key != "errors"}
+            row["total"] = round(totals["pesagem"] + totals["manipulacao"] + totals["pm"], 2)
+            row["errors"] = totals["errors"]
+            by_employee[self._employee_name(employee)] = row
+        return {
+            "by_employee": by_employee,
+            "by_tipo_formula": {tipo: round(value, 2) for tipo, value in self.by_tipo_formula.items()},
+            "unmatched_cost": round(self.unmatched_cost, 2),
+        }
+
+
+class _JoinSide:
+    """Index adapter feeding one collection into an NrJoin."""
+
+    def __init__(self, join, by_nr, make_entry):
+        self.join = join
+        self.by_nr = by_nr
+        self.make_entry = make_entry
+
+    def clear(self):
+        self.by_nr.clear()
+        self.join._recompute()
+
+    def add(self, record_id, record):
+        nr = str(record.get("nr"))
+        self.join._contribute(nr, -1)
+        self.by_nr.setdefault(nr, []).append(self.make_entry(record_id, record))
+        self.join._contribute(nr, +1)
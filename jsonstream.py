@@ -0,0 +1,108 @@
+import json
+from itertools import islice
+
+# --- Streaming reader for JSON array files ---
+# json.load() builds the whole document (and keeps the whole text) in memory at once,
+# several times the file size for a big array of records. iter_array() reads the file
+# in blocks and yields one element at a time, so memory stays at about one block plus
+# the record being decoded, whatever the file size. Works with the pretty-printed
+# (indent=4) files the apps have always written.
+
+BLOCK_SIZE = 1 << 16
+CHUNK_SIZE = 10000
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+_WHITESPACE_BOM = _WHITESPACE + "\ufeff"  # files saved by Windows editors may start with a BOM
+
+
+def first_char(path):
+    """First non-whitespace character of a file ("" if empty): "[" for an array."""
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                return ""
+            stripped = block.lstrip(_WHITESPACE_BOM)
+            if stripped:
+                return stripped[0]
+
+
+def iter_array(path, block_size=BLOCK_SIZE):
+    """Yields the elements of the JSON array stored in `path`, one at a time."""
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _Reader(f, block_size)
+        if reader.next_char() != "[":
+            raise ValueError(f"{path}: not a JSON array")
+        reader.position += 1
+        if reader.next_char() == "]":
+            return
+        while True:
+            yield reader.decode()
+            separator = reader.next_char()
+            reader.position += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"{path}: expected ',' or ']' at offset {reader.offset()}")
+
+
+def chunked(iterable, size=CHUNK_SIZE):
+    """Lists of up to `size` items, e.g. to build a DataFrame or write a batch per chunk."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _Reader:
+    def __init__(self, f, block_size):
+        self.f = f
+        self.block_size = block_size
+        self.buffer = ""
+        self.position = 0
+        self.consumed = 0  # characters dropped from the front of the buffer
+        self.eof = False
+
+    def offset(self):
+        return self.consumed + self.position
+
+    def _fill(self):
+        """Reads more text (at least as much as is buffered, so long records stay linear)."""
+        if self.position > self.block_size:
+            self.consumed += self.position
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+        block = self.f.read(max(self.block_size, len(self.buffer)))
+        if not block:
+            self.eof = True
+        self.buffer += block
+
+    def next_char(self):
+        """Skips whitespace and returns the next character without consuming it."""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in _WHITESPACE_BOM:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                raise ValueError(f"unexpected end of JSON at offset {self.offset()}")
+            self._fill()
+
+    def decode(self):
+        self.next_char()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # A number running into the end of the buffer may continue in the next block
+            if end == len(self.buffer) and not self.eof:
+                self._fill()
+                continue
+            self.position = end
+            return value
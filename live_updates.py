@@ -0,0 +1,201 @@
+import json
+import os
+import threading
+import time
+import urllib.request
+from urllib.parse import urlencode
+
+import storage
+
+# Live updates for the Dash apps.
+#
+# With SERVER_URL set (e.g. http://192.168.0.10:5000), a dashboard loads its data from
+# server.py once and then follows the /events stream (Server-Sent Events) in a
+# background thread. New records are queued here and folded into the dashboard's
+# DataFrame on the next callback, without re-reading or re-parsing the whole file.
+#
+# Each open stream holds one of server.py's threads, so a dashboard served by several
+# processes (serve_dash.py with gunicorn) opens only one: the master follows the stream
+# and publishes the data version in a file of the shared cache dir (DASH_CACHE_DIR),
+# and the workers, when they see a newer version there, fetch just the changes with a
+# short GET /changes.
+
+SERVER_URL = os.environ.get("SERVER_URL", "").rstrip("/")
+SHARED_DIR = os.environ.get("DASH_CACHE_DIR")
+RECONNECT_DELAY = 2
+# Seconds without data before a request to server.py is given up (OSError): a stalled
+# server must not hang the callbacks. The stream gets keep-alives every 15 seconds
+# (server.py EVENTS_KEEPALIVE), so a longer silence means the connection is dead.
+LOAD_TIMEOUT = 60
+CHANGES_TIMEOUT = 10
+STREAM_TIMEOUT = 45
+
+
+def fetch_collection(server_url, collection):
+    """GET /<collection> from server.py; returns (records, version)."""
+    with urllib.request.urlopen(f"{server_url}/{collection}", timeout=LOAD_TIMEOUT) as response:
+        records = json.load(response)
+        version = int(response.headers.get("X-Data-Version", 0))
+    return records, version
+
+
+class LiveCollection:
+    """Follows one collection of server.py over SSE and queues the new records."""
+
+    def __init__(self, server_url, collection, shared_dir=SHARED_DIR):
+        self.server_url = server_url
+        self.collection = collection
+        self.version_path = os.path.join(shared_dir, f"live-{collection}.version") if shared_dir else None
+        self.lock = threading.Lock()
+        self._version = 0
+        self.taken_version = 0  # version of the data handed out by load()/take()
+        self._pending = []
+        self._reset = False
+        self._queue = True    # False in a process that only publishes the version
+        self._shared = False  # True in the worker processes, which read the published version
+        self._published = None
+        self._catch_up_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def version(self):
+        """Last version seen; a worker process first catches up with the published one."""
+        if self._shared:
+            self._catch_up()
+        return self._version
+
+    def load(self):
+        """Initial full fetch; returns the records and starts following from there."""
+        records, version = fetch_collection(self.server_url, self.collection)
+        with self.lock:
+            self._version = self.taken_version = version
+            self._pending = []
+        return records
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"live-{self.collection}", daemon=True)
+        self._thread.start()
+        return self
+
+    # --- Several processes (serve_dash.py) ---
+    def publish_for_workers(self, keep_records=True):
+        """In the gunicorn master: follows the stream for every worker and publishes the
+        version. Without `keep_records` (nothing in this process folds them, e.g. no
+        precompute thread) the records are not queued, only the version moves."""
+        if self.version_path is None:
+            raise ValueError("publishing the data version needs a shared dir (DASH_CACHE_DIR)")
+        with self.lock:
+            self._queue = keep_records
+            if not keep_records:
+                self._pending = []
+        self._publish()  # replaces the version of an earlier run
+        if self._thread is None:
+            self.start()
+
+    def follow_published(self):
+        """In a forked worker (the master's thread did not come along): no stream of its
+        own, the version published by the master tells when to fetch changes."""
+        self.lock = threading.Lock()
+        self._catch_up_lock = threading.Lock()
+        self._queue = True
+        self._shared = True
+        self._thread = None
+
+    def _publish(self):
+        try:
+            storage.write_text(self.version_path, str(self._version))
+        except OSError as e:
+            print(f"Live updates ({self.collection}): could not publish the version ({e})")
+
+    def _catch_up(self):
+        try:
+            published = int(storage.read_text(self.version_path))
+        except (OSError, ValueError):
+            return
+        if published in (self._published, self._version) or not self._catch_up_lock.acquire(blocking=False):
+            return  # nothing new, or another thread is already fetching it
+        try:
+            query = urlencode({"since": self._version, "collection": self.collection})
+            with urllib.request.urlopen(f"{self.server_url}/changes?{query}", timeout=CHANGES_TIMEOUT) as response:
+                feed = json.load(response)
+            with self.lock:
+                if feed["reset"]:
+                    self._apply("reset", {})
+                for change in feed["changes"]:
+                    self._apply(change["op"], change)
+                self._version = feed["version"]
+            self._published = published
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Live updates ({self.collection}): could not fetch the changes ({e})")
+        finally:
+            self._catch_up_lock.release()
+
+    def take(self):
+        """Returns (new_records, reset) accumulated since the last call.
+
+        When reset is True the feed lost track (server restarted or the client fell too
+        far behind) and the caller should reload everything with load(). Once the caller
+        folded them its data is at `taken_version`: that, not `version`, is what a cache
+        key may use.
+        """
+        if self._shared:
+            self._catch_up()
+        with self.lock:
+            pending, self._pending = self._pending, []
+            reset, self._reset = self._reset, False
+            self.taken_version = self._version
+        return pending, reset
+
+    def _run(self):
+        while True:
+            try:
+                self._follow()
+            except (OSError, ValueError) as e:
+                print(f"Live updates ({self.collection}): connection lost ({e}), retrying...")
+            time.sleep(RECONNECT_DELAY)
+
+    def _follow(self):
+        query = urlencode({"since": self._version, "collection": self.collection})
+        request = urllib.request.Request(f"{self.server_url}/events?{query}",
+                                         headers={"Accept": "text/event-stream"})
+        with urllib.request.urlopen(request, timeout=STREAM_TIMEOUT) as response:
+            event, data, event_id = "message", [], None
+            for raw_line in response:
+                line = raw_line.decode("utf-8").rstrip("\r\n")
+                if line == "":
+                    if data:
+                        self._dispatch(event, "\n".join(data), event_id)
+                        if self.version_path is not None:
+                            self._publish()
+                    event, data, event_id = "message", [], None
+                elif line.startswith(":"):
+                    continue
+                else:
+                    field, _, value = line.partition(":")
+                    value = value[1:] if value.startswith(" ") else value
+                    if field == "event":
+                        event = value
+                    elif field == "data":
+                        data.append(value)
+                    elif field == "id":
+                        event_id = value
+
+    def _dispatch(self, event, data, event_id):
+        with self.lock:
+            if event_id:
+                event_version = int(event_id)
+                if event != "reset" and event_version <= self._version:
+                    return  # already part of the last full load
+                self._version = event_version
+            self._apply(event, json.loads(data))
+
+    def _apply(self, event, change):
+        """Queues one change of the feed (an SSE event or an item of /changes). Caller holds the lock."""
+        if not self._queue:
+            return
+        if event in ("reset", "rename"):
+            # A rename changes records already loaded: reload them all
+            self._reset = True
+            self._pending = []
+        elif event == "insert":
+            self._pending.append(change["record"])
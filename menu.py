@@ -1,8 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
 import os
-import datetime
+
+import storage
+from shards import append_formula
+from validation import LABELS, describe, validate_employee, validate_formula
 
 DATABASE_FILE = "funcionarios.json"
 FORMULAS_FILE = "formulas.json"
@@ -18,16 +20,14 @@ def load_json(filename, default_value):
         save_json(filename, default_value)
         return default_value
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return storage.read_json(filename, default_value)
     except:
         return default_value
 
 
 def save_json(filename, data):
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        storage.write_json(filename, data)
         return True
     except Exception as e:
         print(e)
@@ -45,6 +45,9 @@ def add_employee_logic(name, is_farmaceutico):
         return False, "Funcionário já existe."
 
     role = "Farmaceutico" if is_farmaceutico else "Operador"
+    _, errors = validate_employee({"name": name, "role": role})
+    if errors:
+        return False, describe(errors, LABELS, portuguese=True)
     employees[name] = {"role": role}
 
     if save_json(DATABASE_FILE, employees):
@@ -65,9 +68,8 @@ def remove_employee_logic(name):
 
 
 def save_formula_logic(formula_data):
-    formulas = load_json(FORMULAS_FILE, [])
-    formulas.append(formula_data)
-    return save_json(FORMULAS_FILE, formulas)
+    # Stored as monthly shards under formulas/ (see shards.py); only this month's file is rewritten
+    return append_formula(FORMULAS_FILE, formula_data)
 
 
 # -------------------------
@@ -215,29 +217,8 @@ class App:
         pesagem = self.pesagem_var.get()
         manipulacao = self.manipulacao_var.get()
 
-        if not nr or not pesagem or not manipulacao:
-            messagebox.showerror("Erro", "Preencha NR, Pesagem e Manipulação.")
-            return
-
-        try:
-            nr = int(nr)
-        except:
-            messagebox.showerror("Erro", "NR deve ser número.")
-            return
-
-        manual_date = self.date_entry.get().strip()
-        final_date = datetime.date.today().isoformat()
-
-        if manual_date:
-            try:
-                datetime.datetime.strptime(manual_date, '%Y-%m-%d')
-                final_date = manual_date
-            except:
-                messagebox.showerror("Erro", "Data inválida.")
-                return
-
         formula_data = {
-            "date": final_date,
+            "date": self.date_entry.get().strip(),  # blank: today
             "nr": nr,
             "turno": self.turno_var.get(),  # NEW SHIFT FLAG
             "tipo_formula": self.formula_type_var.get(),
@@ -251,6 +232,11 @@ class App:
             "pm_mais_20": self.pm_plus_20_var.get()
         }
 
+        formula_data, errors = validate_formula(formula_data)
+        if errors:
+            messagebox.showerror("Erro", describe(errors, LABELS, portuguese=True))
+            return
+
         if save_formula_logic(formula_data):
             messagebox.showinfo("Sucesso", "Fórmula salva!")
             self.nr_entry.delete(0, tk.END)
@@ -1,12 +1,17 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
 import os
-import datetime
+
+import shards
+import storage
+from indexes import ROLES
+from shards import append_formula
+from validation import LABELS, describe, validate_employee, validate_formula
 
 # --- Configuration ---
 DATABASE_FILE = "funcionarios.json"
 FORMULAS_FILE = "formulas.json"
+ERRORS_FILE = "data_julia.json"
 LOGO_FILE = "logo.png"
 
 # -------------------------
@@ -18,15 +23,13 @@ def load_json(filename, default_value):
         save_json(filename, default_value)
         return default_value
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return storage.read_json(filename, default_value)
     except:
         return default_value
 
 def save_json(filename, data):
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        storage.write_json(filename, data)
         return True
     except Exception as e:
         print(e)
@@ -42,16 +45,41 @@ def add_employee_logic(name, is_farmaceutico):
         return False, "Funcionário já existe."
 
     role = "Farmaceutico" if is_farmaceutico else "Operador"
+    _, errors = validate_employee({"name": name, "role": role})
+    if errors:
+        return False, describe(errors, LABELS, portuguese=True)
     employees[name] = {"role": role}
 
     if save_json(DATABASE_FILE, employees):
         return True, f"Funcionário {name} cadastrado!"
     return False, "Erro ao salvar."
 
-def remove_employee_logic(name):
+REFERENCE_LABELS = {"pesagem": "Pesagem", "manipulacao": "Manipulação", "pm": "PM", "errors": "Erros"}
+
+def employee_references(name):
+    """How many formulas (per role) and error records name the employee."""
+    counts = dict.fromkeys(REFERENCE_LABELS, 0)
+    # One shard in memory at a time
+    for record in shards.formulas(FORMULAS_FILE).iter_records():
+        for role, field in ROLES.items():
+            if record.get(field) == name:
+                counts[role] += 1
+    for record in shards.errors(ERRORS_FILE).iter_records():
+        if record.get("funcionario") == name:
+            counts["errors"] += 1
+    return counts
+
+def describe_references(counts):
+    return "\n".join(f"{REFERENCE_LABELS[key]}: {count}" for key, count in counts.items() if count)
+
+def remove_employee_logic(name, force=False):
+    """Refuses to remove an employee still named by formulas or error records, unless `force`."""
     employees = get_employees()
 
     if name in employees:
+        counts = {} if force else employee_references(name)
+        if any(counts.values()):
+            return False, "Funcionário possui registros:\n" + describe_references(counts)
         del employees[name]
         if save_json(DATABASE_FILE, employees):
             return True, "Funcionário removido."
@@ -60,9 +88,8 @@ def remove_employee_logic(name):
     return False, "Funcionário não encontrado."
 
 def save_formula_logic(formula_data):
-    formulas = load_json(FORMULAS_FILE, [])
-    formulas.append(formula_data)
-    return save_json(FORMULAS_FILE, formulas)
+    # Stored as monthly shards under formulas/ (see shards.py); only this month's file is rewritten
+    return append_formula(FORMULAS_FILE, formula_data)
 
 
 # -------------------------
@@ -231,29 +258,8 @@ class App:
         pesagem = self.pesagem_var.get()
         manipulacao = self.manipulacao_var.get()
 
-        if not nr or not pesagem or not manipulacao:
-            messagebox.showerror("Erro", "Preencha NR, Pesagem e Manipulação.")
-            return
-
-        try:
-            nr = int(nr)
-        except:
-            messagebox.showerror("Erro", "NR deve ser número.")
-            return
-
-        manual_date = self.date_entry.get().strip()
-        final_date = datetime.date.today().isoformat()
-
-        if manual_date:
-            try:
-                datetime.datetime.strptime(manual_date, '%Y-%m-%d')
-                final_date = manual_date
-            except:
-                messagebox.showerror("Erro", "Data inválida.")
-                return
-
         formula_data = {
-            "date": final_date,
+            "date": self.date_entry.get().strip(),  # blank: today
             "nr": nr,
             "turno": self.turno_var.get(),  # Capturing the Shift
             "tipo_formula": self.formula_type_var.get(),
@@ -267,6 +273,11 @@ class App:
             "pm_mais_20": self.pm_plus_20_var.get()
         }
 
+        formula_data, errors = validate_formula(formula_data)
+        if errors:
+            messagebox.showerror("Erro", describe(errors, LABELS, portuguese=True))
+            return
+
         if save_formula_logic(formula_data):
             messagebox.showinfo("Sucesso", "Fórmula salva!")
             self.nr_entry.delete(0, tk.END)
@@ -336,7 +347,14 @@ class App:
     def handle_remove_employee(self, window):
         name = self.remove_var.get()
         if name and name != "Selecione...":
-            success, message = remove_employee_logic(name)
+            counts = employee_references(name)
+            if any(counts.values()) and not messagebox.askyesno(
+                    "Confirmar",
+                    f"{name} aparece em registros existentes:\n{describe_references(counts)}\n\n"
+                    "Remover mesmo assim? Os registros continuam com o nome.",
+                    parent=window):
+                return
+            success, message = remove_employee_logic(name, force=True)
             if success:
                 messagebox.showinfo("Sucesso", message)
                 self.employees = get_employees() 
@@ -0,0 +1,140 @@
+import argparse
+import os
+import textwrap
+import time
+from collections import deque
+from multiprocessing import Pool
+
+import schema
+import shards
+import storage
+from encoding import FormulaCodec, is_encoded
+from jsonstream import chunked, first_char, iter_array
+from validation import describe, validate_formula_chunk
+
+# Brings formula records to the canonical schema (schema.py):
+#
+#   python migrate_formulas.py                                  # upgrade formulas/ in place
+#   python migrate_formulas.py --import antigo.json fake_data.json --workers 4
+#
+# Imported files are streamed a chunk at a time (jsonstream.py), validated and upgraded
+# by worker processes, grouped by month (spilled to disk past shards.SPLIT_BUFFER) and
+# appended to the monthly shards, each written once, so inputs of any size use bounded
+# memory. Invalid records (validation.py) are not imported; they are written to
+# "<file>.rejeitados.json" with their problems, to be fixed and imported again.
+# The apps also upgrade old shards by themselves when they open them; running this first
+# does it with all cores, before the shop opens.
+
+FORMULAS_FILE = "formulas.json"
+# Chunks handed to the workers and not yet written, per worker: caps the memory used
+# when reading the input is faster than appending to the shards
+CHUNKS_IN_FLIGHT = 2
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Converte registros de fórmulas para o formato atual.")
+    parser.add_argument("--import", dest="inputs", nargs="+", default=[],
+                        help="Arquivos JSON (lista de fórmulas) a importar para formulas/")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processos para a conversão.")
+    parser.add_argument("--target", default=FORMULAS_FILE, help="Coleção de destino.")
+    return parser.parse_args()
+
+
+def read_records(path):
+    """Records of an input file: a (pretty-printed) JSON array, streamed, or an encoded file."""
+    if first_char(path) == "[":
+        return iter_array(path)
+    data = storage.read_json(path)
+    if not is_encoded(data):
+        raise ValueError(f"{path}: not a list of formulas")
+    codec = FormulaCodec()
+    return (codec.decode(row) for row in codec.load(data))
+
+
+def import_chunk(records):
+    """(valid records upgraded, [(record, errors)]) of one chunk."""
+    valid, rejected = validate_formula_chunk(records)
+    return schema.upgrade_chunk(valid), rejected
+
+
+def bounded_map(pool, limit):
+    """Like pool.imap (results in order), with at most `limit` chunks submitted and not
+    yet consumed; pool.imap reads its whole input ahead."""
+    def map_chunks(func, chunks):
+        pending = deque()
+        for chunk in chunks:
+            if len(pending) >= limit:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(func, (chunk,)))
+        while pending:
+            yield pending.popleft().get()
+    return map_chunks
+
+
+class RejectedWriter:
+    """Writes "<file>.rejeitados.json" as the invalid records arrive instead of keeping
+    them all; the file appears when close() is called."""
+
+    def __init__(self, path):
+        self.output = path + ".rejeitados.json"
+        self.count = 0
+        self._tmp_path = f"{self.output}.{os.getpid()}.tmp"
+        self._file = None
+
+    def write(self, rejected):
+        for record, errors in rejected:
+            if self._file is None:
+                self._file = open(self._tmp_path, 'w', encoding='utf-8')
+                self._file.write("[\n")
+            else:
+                self._file.write(",\n")
+            item = {"registro": record, "problemas": describe(errors)}
+            self._file.write(textwrap.indent(storage.dumps_pretty(item), "    "))
+            self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.write("\n]")
+            self._file.close()
+            self._file = None
+            os.replace(self._tmp_path, self.output)
+
+
+def valid_records(results, rejected):
+    """The valid records of import_chunk's results; the rejected go to `rejected`."""
+    for records, chunk_rejected in results:
+        rejected.write(chunk_rejected)
+        yield from records
+
+
+def main():
+    args = parse_args()
+    collection = shards.formulas(args.target)
+    started = time.perf_counter()
+
+    pool = Pool(args.workers) if args.workers > 1 else None
+    map_chunks = bounded_map(pool, args.workers * CHUNKS_IN_FLIGHT) if pool is not None else map
+    try:
+        collection.upgrade_schema(map_chunks)
+        for path in args.inputs:
+            rejected = RejectedWriter(path)
+            try:
+                results = map_chunks(import_chunk, chunked(read_records(path)))
+                # Each month's shard is written once, at the end (a back-dated file touches many)
+                count = collection.import_many(valid_records(results, rejected), upgraded=True)
+            finally:
+                rejected.close()
+            print(f"{path}: {count} formulas imported")
+            if rejected.count:
+                print(f"{path}: {rejected.count} invalid formulas skipped, see {rejected.output}")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
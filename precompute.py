@@ -0,0 +1,141 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+import storage
+
+# --- Background precompute of the default dashboard views ---
+# The first view after a restart or a data change used to pay the whole pandas cost.
+# A Precomputer runs the dashboard's callbacks for the common views in a background
+# thread, so their results are in the cache (dashcache.py) before anyone asks:
+#
+#   * at startup;
+#   * when the data version changes (a new batch of formulas or errors);
+#   * every night at DASH_PRECOMPUTE_AT (default 03:00), when "this month" and "last
+#     7 days" move on.
+#
+# /_precompute on the dashboard shows, per view, the data version it was computed for,
+# when, and how long it took. Under serve_dash.py with gunicorn the thread runs in the
+# master process and fills the shared disk cache for every worker; the workers read its
+# status from the cache directory.
+#
+# DASH_PRECOMPUTE=0 turns it off.
+
+PRECOMPUTE_ENABLED = os.environ.get("DASH_PRECOMPUTE", "1") not in ("", "0", "false", "False")
+PRECOMPUTE_AT = os.environ.get("DASH_PRECOMPUTE_AT", "03:00")
+POLL_SECONDS = 5
+STATUS_FILE = "precompute.json"
+
+
+def default_ranges(min_date, max_date, today=None):
+    """{view: (start, end)} as the date picker sends them: the whole period (the initial
+    view), the current month and the last 7 days."""
+    today = today or datetime.date.today()
+    return {
+        "all": (str(min_date), str(max_date)),
+        "current_month": (str(today.replace(day=1)), str(today)),
+        "last_7_days": (str(today - datetime.timedelta(days=6)), str(today)),
+    }
+
+
+class Precomputer:
+    def __init__(self, name, version_func, views_func, status_dir=None):
+        """`views_func()` returns {view name: callable computing it}; it is called on each
+        refresh, so the views can depend on today's date."""
+        self.name = name
+        self.version_func = version_func
+        self.views_func = views_func
+        self.status_path = os.path.join(status_dir, STATUS_FILE) if status_dir else None
+        self.status = {"running": False, "version": None, "last_refresh": None, "reason": None, "views": {}}
+        self.lock = threading.Lock()
+        self._thread = None
+
+    # --- Scheduling ---
+    def start(self):
+        if not PRECOMPUTE_ENABLED:
+            return self
+        self._thread = threading.Thread(target=self._run, name=f"precompute-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _next_nightly(self, now):
+        hour, minute = (int(part) for part in PRECOMPUTE_AT.split(":"))
+        moment = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return moment if moment > now else moment + datetime.timedelta(days=1)
+
+    def _run(self):
+        version = None
+        nightly = self._next_nightly(datetime.datetime.now())
+        while True:
+            reason = None
+            try:
+                current = self.version_func()
+            except (OSError, ValueError):
+                current = version
+            if current != version:
+                reason = "startup" if version is None else "data"
+            elif datetime.datetime.now() >= nightly:
+                reason = "nightly"
+                nightly = self._next_nightly(datetime.datetime.now())
+            if reason:
+                version = current
+                self.refresh(reason, current)
+            time.sleep(POLL_SECONDS)
+
+    # --- Work ---
+    def refresh(self, reason, version):
+        """Computes every view (errors are recorded, the other views still run)."""
+        with self.lock:
+            self.status.update(running=True, reason=reason)
+        started = time.time()
+        for view, compute in self.views_func().items():
+            view_started = time.perf_counter()
+            error = None
+            try:
+                compute()
+            except Exception as e:  # a broken view must not stop the scheduler
+                error = f"{type(e).__name__}: {e}"
+            with self.lock:
+                self.status["views"][view] = {
+                    "version": str(version),
+                    "computed_at": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "seconds": round(time.perf_counter() - view_started, 3),
+                    "error": error,
+                }
+        with self.lock:
+            self.status.update(running=False, version=str(version),
+                               last_refresh=datetime.datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+                               seconds=round(time.time() - started, 3))
+            self._save_status()
+        print(f"Precompute ({self.name}): {len(self.status['views'])} views refreshed ({reason}) "
+              f"in {self.status['seconds']:.2f}s")
+
+    def _save_status(self):
+        if self.status_path is None:
+            return
+        try:
+            storage.write_json(self.status_path, self.status)
+        except OSError:
+            pass
+
+    # --- Freshness ---
+    def summary(self):
+        """The status, from this process or (in a worker) from the file of the process running it."""
+        running_here = self._thread is not None and self._thread.is_alive()
+        if not running_here and self.status_path and os.path.exists(self.status_path):
+            status = storage.read_json(self.status_path, {})
+        else:
+            with self.lock:
+                status = json.loads(json.dumps(self.status))
+        status["current_version"] = str(self.version_func())
+        status["fresh"] = status.get("version") == status["current_version"]
+        return status
+
+    def install(self, app):
+        """Exposes summary() as JSON at /_precompute on the Dash app's Flask server."""
+        def precompute_endpoint():
+            return app.server.response_class(json.dumps(self.summary(), indent=2), mimetype="application/json")
+
+        app.server.add_url_rule("/_precompute", "dash_precompute", precompute_endpoint)
@@ -0,0 +1,153 @@
+import cProfile
+import functools
+import heapq
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# --- Configuration (opt-in via environment) ---
+# DASH_PROFILE=1          -> time callbacks and their stages, expose /_profile
+# DASH_PROFILE_DIR=path   -> also dump cProfile stats of the slowest calls there
+# DASH_PROFILE_KEEP=5     -> how many slowest calls to keep dumps for, per callback
+PROFILE_ENABLED = os.environ.get("DASH_PROFILE", "0") not in ("", "0", "false", "False")
+PROFILE_DIR = os.environ.get("DASH_PROFILE_DIR")
+PROFILE_KEEP = int(os.environ.get("DASH_PROFILE_KEEP", "5"))
+SAMPLES_PER_STAGE = 1000
+
+
+def _percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+class _NullRun:
+    def lap(self, stage):
+        pass
+
+    def finish(self):
+        return 0.0
+
+
+class Run:
+    """One timed execution (a callback call or the data load), split into laps."""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = self.last = time.perf_counter()
+
+    def lap(self, stage):
+        """Records the time elapsed since the previous lap under `name/stage`."""
+        now = time.perf_counter()
+        self.profiler.record(f"{self.name}/{stage}", now - self.last)
+        self.last = now
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.start
+        self.profiler.record(self.name, elapsed)
+        return elapsed
+
+
+class Profiler:
+    def __init__(self, enabled=PROFILE_ENABLED, dump_dir=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.enabled = enabled
+        self.dump_dir = dump_dir if enabled else None
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._slowest = {}
+        self._local = threading.local()
+
+    # --- Recording ---
+    def record(self, name, seconds):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=SAMPLES_PER_STAGE)
+            samples.append(seconds)
+
+    def run(self, name):
+        if not self.enabled:
+            return _NullRun()
+        return Run(self, name)
+
+    def lap(self, stage):
+        """Laps the run of the callback currently executing on this thread."""
+        current = getattr(self._local, "run", None)
+        if current is not None:
+            current.lap(stage)
+
+    def timed(self, name):
+        """Decorator timing a Dash callback; use `profiler.lap()` inside it to split stages."""
+        def decorator(func):
+            if not self.enabled:
+                return func
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                current = self._local.run = Run(self, name)
+                profile = cProfile.Profile() if self.dump_dir else None
+                try:
+                    if profile is not None:
+                        return profile.runcall(func, *args, **kwargs)
+                    return func(*args, **kwargs)
+                finally:
+                    self._local.run = None
+                    elapsed = current.finish()
+                    if profile is not None:
+                        self._maybe_dump(name, elapsed, profile)
+            return wrapper
+        return decorator
+
+    def _maybe_dump(self, name, elapsed, profile):
+        """Keeps cProfile dumps only for the `keep` slowest calls of each callback."""
+        with self._lock:
+            heap = self._slowest.setdefault(name, [])
+            if len(heap) >= self.keep and elapsed <= heap[0][0]:
+                return
+            os.makedirs(self.dump_dir, exist_ok=True)
+            path = os.path.join(self.dump_dir, f"{name}-{elapsed * 1000:.0f}ms-{time.time_ns()}.prof")
+            profile.dump_stats(path)
+            if len(heap) >= self.keep:
+                _, evicted = heapq.heapreplace(heap, (elapsed, path))
+                try:
+                    os.remove(evicted)
+                except OSError:
+                    pass
+            else:
+                heapq.heappush(heap, (elapsed, path))
+
+    # --- Reporting ---
+    def summary(self):
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._samples.items()}
+            slowest = {name: [path for _, path in sorted(heap, reverse=True)] for name, heap in self._slowest.items()}
+        report = {}
+        for name, samples in sorted(snapshot.items()):
+            report[name] = {
+                "count": len(samples),
+                "p50_ms": round(_percentile(samples, 50) * 1000, 3),
+                "p95_ms": round(_percentile(samples, 95) * 1000, 3),
+                "max_ms": round(samples[-1] * 1000, 3),
+            }
+            if name in slowest:
+                report[name]["profiles"] = slowest[name]
+        return report
+
+    def install(self, app):
+        """Exposes the summary as JSON at /_profile on the Dash app's Flask server."""
+        if not self.enabled:
+            return
+
+        def profile_endpoint():
+            return app.server.response_class(json.dumps(self.summary(), indent=2), mimetype="application/json")
+
+        app.server.add_url_rule("/_profile", "dash_profile", profile_endpoint)
+        print("Profiling enabled: per-callback timings at /_profile")
+
+
+profiler = Profiler()
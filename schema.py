@@ -0,0 +1,60 @@
+# --- Canonical formula schema ---
+# Formula records were written with three layouts over time:
+#   v0 (fake_data.json):      "horario", no "turno", no "refeito_semi_solidos"
+#   v1 (older formulas.json): "time", some with "refeito_semi_solidos", no "turno"
+#   v1 (menu*.py, turno_tarde.py): "turno" and "pm_mais_20", no time at all
+# Version 2 is the union, always in the same shape:
+#   "time"  "HH:MM" when known (from "time" or "horario")
+#   "turno" "manha"/"tarde", from the record or else from the time (before 12h = manha)
+#   flags   every one of FLAGS present, as a bool
+# Every write path (shards.py, server.py) stores records upgraded, and shards written
+# with an older version are upgraded once (see migrate_formulas.py), so readers can
+# rely on this shape without checking which columns exist.
+
+VERSION = 2
+FLAGS = ("refeito_pm", "refeito_exc", "estoque_usado", "estoque_feito", "pm_mais_20", "refeito_semi_solidos")
+
+
+def parse_hour(value):
+    try:
+        return int(str(value).split(':')[0])
+    except ValueError:
+        return None
+
+
+def upgrade_formula(record):
+    """The version-2 form of a formula record of any version (idempotent)."""
+    record = dict(record)
+    if "horario" in record:
+        horario = record.pop("horario")
+        record.setdefault("time", horario)
+    if not record.get("time"):
+        record.pop("time", None)
+    if record.get("date"):
+        record["date"] = str(record["date"])[:10]
+    if not record.get("turno"):
+        hour = parse_hour(record.get("time"))
+        if hour is not None:
+            record["turno"] = "manha" if hour < 12 else "tarde"
+        else:
+            record.pop("turno", None)
+    for flag in FLAGS:
+        record[flag] = bool(record.get(flag))
+    return record
+
+
+def upgrade_chunk(records):
+    """upgrade_formula over a list, for worker processes (see migrate_formulas.py)."""
+    return [upgrade_formula(record) for record in records]
+
+
+class Schema:
+    """What shards.ShardedCollection needs to keep a collection on one version."""
+
+    def __init__(self, version, upgrade, upgrade_chunk):
+        self.version = version
+        self.upgrade = upgrade
+        self.upgrade_chunk = upgrade_chunk
+
+
+FORMULAS = Schema(VERSION, upgrade_formula, upgrade_chunk)
@@ -0,0 +1,53 @@
+import argparse
+import atexit
+import os
+import signal
+import sys
+
+# Production entry point for server.py:
+#
+#   pip install waitress
+#   python serve.py --threads 16
+#
+# server.py keeps the data in memory (store.py) and is the single writer of the JSON
+# files, so it runs as ONE process; the thread pool gives the concurrency. Reads are
+# memory lookups and writes are short WAL appends, so the threads rarely wait on disk.
+#
+# An open /events stream (live mode of the dashboards) keeps one thread for as long as
+# it lasts. Each dashboard opens one, whatever its number of processes (serve_dash.py),
+# so count one thread per live dashboard on top of those for the requests.
+
+DEFAULT_THREADS = 8
+KEEPALIVE_SECONDS = 60
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Servidor de produção para server.py")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "5000")))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("THREADS", str(DEFAULT_THREADS))),
+                        help="Threads de atendimento.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        from waitress import serve
+    except ImportError:
+        print("Instale o waitress: pip install waitress")
+        sys.exit(1)
+
+    from server import app, shutdown
+
+    # Final snapshot on exit; waitress leaves serve() on Ctrl+C, treat SIGTERM the same way
+    atexit.register(shutdown)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    print(f"Serving with waitress on {args.host}:{args.port} ({args.threads} threads)")
+    serve(app, host=args.host, port=args.port, threads=args.threads,
+          channel_timeout=KEEPALIVE_SECONDS, connection_limit=1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import importlib
+import importlib.util
+import os
+import sys
+
+from precompute import PRECOMPUTE_ENABLED
+
+# Production entry point for the dashboards (test.py, dashboard_julia.py):
+#
+#   pip install gunicorn                                   # Linux
+#   python serve_dash.py test --workers 4
+#   pip install waitress                                   # Windows
+#   python serve_dash.py dashboard_julia --threads 8
+#
+# With gunicorn the dashboard is imported once, in the master process, before the
+# workers are forked (preload): the DataFrame and the bitmaps are loaded once and the
+# workers share those memory pages copy-on-write instead of each loading its own copy.
+# The workers also share a disk cache of the callbacks' results (dashcache.py) keyed by
+# data version, so a figure computed by one worker is served by all of them. More
+# workers then add throughput without multiplying memory or work. In live mode
+# (SERVER_URL) only the master follows server.py's event stream, which holds a server
+# thread; the workers learn the data version from it (see live_updates.py).
+#
+# gunicorn does not run on Windows (no fork there); waitress serves the dashboard from
+# one process with a thread pool, with the same cache.
+
+DASHBOARDS = {"test": 8050, "dashboard_julia": 8052}
+DEFAULT_THREADS = 8
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Servidor de produção para os painéis Dash")
+    parser.add_argument("dashboard", choices=sorted(DASHBOARDS), help="Painel a servir.")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, help="Porta (padrão: a do painel, 8050 ou 8052).")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WORKERS", "1")),
+                        help="Processos (gunicorn; mais de 1 só no Linux).")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("THREADS", str(DEFAULT_THREADS))),
+                        help="Threads por processo.")
+    parser.add_argument("--cache-dir", default=os.environ.get("DASH_CACHE_DIR", "dash_cache"),
+                        help="Pasta do cache compartilhado entre os processos.")
+    return parser.parse_args()
+
+
+def serve_gunicorn(module, args):
+    from gunicorn.app.base import BaseApplication
+
+    live = getattr(module, "live", None)
+    if live is not None:
+        # One event stream for the whole dashboard, not one per process. The precompute
+        # thread runs here too and folds the new records before computing (see
+        # data_version in the dashboards); without it nothing here would take them.
+        live.publish_for_workers(keep_records=PRECOMPUTE_ENABLED)
+
+    def post_fork(server, worker):
+        if live is not None:
+            live.follow_published()
+
+    class DashboardApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{args.host}:{args.port}")
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("preload_app", True)
+            self.cfg.set("post_fork", post_fork)
+
+        def load(self):
+            return module.app.server
+
+    print(f"Serving {args.dashboard} with gunicorn on {args.host}:{args.port} "
+          f"({args.workers} workers x {args.threads} threads)")
+    DashboardApplication().run()
+
+
+def serve_waitress(module, args):
+    from waitress import serve
+
+    print(f"Serving {args.dashboard} with waitress on {args.host}:{args.port} ({args.threads} threads)")
+    serve(module.app.server, host=args.host, port=args.port, threads=args.threads)
+
+
+def main():
+    args = parse_args()
+    args.port = args.port or DASHBOARDS[args.dashboard]
+    # Read by dashcache.py when the dashboard is imported
+    os.environ["DASH_CACHE_DIR"] = args.cache_dir
+
+    use_gunicorn = os.name != "nt" and importlib.util.find_spec("gunicorn") is not None
+    if not use_gunicorn:
+        if importlib.util.find_spec("waitress") is None:
+            print("Instale o gunicorn (Linux) ou o waitress (Windows): pip install gunicorn / pip install waitress")
+            sys.exit(1)
+        if args.workers > 1:
+            print("Sem o gunicorn o painel roda em um só processo; use --threads para mais atendimentos.")
+
+    # Loads the data once, before any worker exists
+    module = importlib.import_module(args.dashboard)
+    if use_gunicorn:
+        serve_gunicorn(module, args)
+    else:
+        serve_waitress(module, args)
+
+
+if __name__ == "__main__":
+    main()
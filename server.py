@@ -1,82 +1,496 @@
-from flask import Flask, request, jsonify
-import json
+from flask import Flask, request, jsonify, g, Response
+import atexit
+import heapq
 import os
+import time
 from flask_cors import CORS
 
+import export_table
+import indexes
+import shards
+import storage
+import textsearch
+from schema import upgrade_formula
+from validation import describe, validate_employee, validate_error, validate_formula, validate_many
+from bitmaps import FormulaBitmaps, FLAGS, GROUPS
+from encoding import ErrorCodec, FormulaCodec
+from store import Store
+from metrics import Registry, SIZE_BUCKETS, CONTENT_TYPE
+
 app = Flask(__name__)
 CORS(app)  # Allow cross-origin requests
 
 DATABASE_FILE = "funcionarios.json"
 FORMULAS_FILE = "formulas.json"
+ERRORS_FILE = "data_julia.json"
+
+# Requests slower than this (in ms) are logged. 0 disables the slow log.
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))
+# Upper bound for the long-poll wait of /changes, in seconds
+MAX_CHANGES_TIMEOUT = 60
+# Idle /events streams get a comment line this often so proxies keep them open
+EVENTS_KEEPALIVE = 15
+# Records decoded per lock acquisition while streaming an export
+EXPORT_CHUNK = 1000
+
+# --- Metrics ---
+registry = Registry()
+REQUEST_LATENCY = registry.histogram("http_request_duration_seconds", "Time spent handling a request.", ["method", "endpoint", "status"])
+RESPONSE_SIZE = registry.histogram("http_response_size_bytes", "Size of the response body.", ["method", "endpoint"], buckets=SIZE_BUCKETS)
+STORAGE_LOAD_LATENCY = registry.histogram("storage_load_seconds", "Time spent loading snapshots and replaying the WAL at startup.")
+STORAGE_WAL_LATENCY = registry.histogram("storage_wal_append_seconds", "Time spent appending (and fsyncing) a mutation to the WAL.", ["collection"])
+STORAGE_SNAPSHOT_LATENCY = registry.histogram("storage_snapshot_seconds", "Time spent writing snapshots of changed collections.")
+STORAGE_RECORDS = registry.gauge("storage_records", "Number of records held in memory.", ["collection"])
+STORAGE_FILE_BYTES = registry.gauge("storage_file_bytes", "Size of the snapshot file on disk after the last snapshot.", ["file"])
+
+# --- Storage (memory-resident, WAL + periodic snapshots) ---
+class InstrumentedStore(Store):
+    def open(self):
+        with STORAGE_LOAD_LATENCY.time():
+            super().open()
+        for name in self.files:
+            STORAGE_RECORDS.set(self.count(name), collection=name)
+        return self
+
+    def _log(self, entry, sync=True):
+        with STORAGE_WAL_LATENCY.time(collection=entry["c"]):
+            entry = super()._log(entry, sync)
+        STORAGE_RECORDS.set(len(self.data[entry["c"]]), collection=entry["c"])
+        return entry
+
+    def snapshot(self):
+        with STORAGE_SNAPSHOT_LATENCY.time():
+            super().snapshot()
+        for name, path in self.files.items():
+            if name in self.shards:
+                # Report the shard being written to; sealed archives no longer change
+                sharded = self.shards[name]
+                entry = sharded.manifest()["shards"].get(shards.current_month())
+                path = os.path.join(sharded.directory, entry["file"]) if entry else path
+            if os.path.exists(path):
+                STORAGE_FILE_BYTES.set(os.path.getsize(path), file=path)
+
+store = InstrumentedStore({
+    "employees": (DATABASE_FILE, {}),
+    "formulas": (FORMULAS_FILE, []),
+    "errors": (ERRORS_FILE, []),
+})
+formula_codec = FormulaCodec()
+store.set_codec("formulas", formula_codec)
+store.set_shards("formulas", shards.formulas(FORMULAS_FILE))
+store.set_shards("errors", shards.errors(ERRORS_FILE))
+# Errors hold their employee as a code too, so a rename reaches them in O(1)
+error_codec = ErrorCodec()
+store.set_codec("errors", error_codec)
+store.add_index("errors", "nr", indexes.HashIndex(indexes.error_nr))
+store.add_index("errors", "date", indexes.SortedIndex(indexes.error_date))
+store.add_index("errors", "funcionario", indexes.HashIndex(indexes.error_employee(error_codec)))
+store.add_index("errors", "tipo_erro", indexes.HashIndex(indexes.error_types))
+error_text = store.add_index("errors", "text", textsearch.TextIndex())
+for role in indexes.ROLES:
+    store.add_index("formulas", f"employee_{role}", indexes.HashIndex(indexes.employee_role(role, formula_codec)))
+formula_bitmaps = store.add_index("formulas", "bitmaps", FormulaBitmaps(formula_codec))
+nr_join = indexes.NrJoin(formula_codec)
+store.add_index("formulas", "nr_join", nr_join.formulas)
+store.add_index("errors", "nr_join", nr_join.errors)
+store.open()
 
-def create_databases():
-    for file_path in [DATABASE_FILE, FORMULAS_FILE]:
-        if not os.path.exists(file_path):
-            with open(file_path, 'w') as f:
-                json.dump({} if "funcionarios" in file_path else [], f)
+def assign_employee_ids():
+    """Gives every employee the stable integer id used to encode their formulas."""
+    with store.lock:
+        for name, employee in store.get("employees").items():
+            code = store.intern("formulas", "employees", name)
+            if employee.get("id") != code:
+                store.put("employees", name, dict(employee, id=code))
 
-create_databases()
+assign_employee_ids()
+
+# --- Request timing ---
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    elapsed = time.perf_counter() - g.get("start_time", time.perf_counter())
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_LATENCY.observe(elapsed, method=request.method, endpoint=endpoint, status=response.status_code)
+    # Measuring a streamed body (exports, /events) would buffer all of it first
+    if not (response.direct_passthrough or response.is_streamed):
+        RESPONSE_SIZE.observe(response.calculate_content_length() or 0, method=request.method, endpoint=endpoint)
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        app.logger.warning("Slow request: %s %s took %.1f ms (status %s)",
+                           request.method, request.path, elapsed * 1000, response.status_code)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(registry.render(), mimetype=CONTENT_TYPE)
 
 @app.route("/employees", methods=["GET"])
 def get_employees():
-    with open(DATABASE_FILE, 'r') as f:
-        data = json.load(f)
-    return jsonify(data)
+    employees, version = store.get_with_version("employees")
+    response = jsonify(employees)
+    response.headers["X-Data-Version"] = str(version)
+    return response
 
 @app.route("/employees", methods=["POST"])
 def add_employee():
-    content = request.json
-    name = content.get("name")
+    content, errors = validate_employee(request.json)
+    if errors:
+        return jsonify({"error": describe(errors)}), 400
+    name = content["name"]
     role = content.get("role")
 
-    with open(DATABASE_FILE, 'r') as f:
-        data = json.load(f)
-
-    if name in data:
-        return jsonify({"error": f"Employee '{name}' already exists."}), 400
-
-    data[name] = {"name": name}
+    employee = {"name": name}
     if role == "Farmaceutico":
-        data[name]["role"] = "Farmaceutico"
+        employee["role"] = "Farmaceutico"
 
-    with open(DATABASE_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+    with store.lock:
+        if name in store.data["employees"]:
+            return jsonify({"error": f"Employee '{name}' already exists."}), 400
+        # Re-adding a removed employee gets their old id back
+        employee["id"] = store.intern("formulas", "employees", name)
+        store.add("employees", name, employee)
 
     return jsonify({"success": True, "message": f"Employee '{name}' added."})
 
+def employee_references(name):
+    """Formula ids per role and error ids referencing an employee. Caller holds the lock."""
+    code = formula_codec.dictionaries["employees"].lookup(name)
+    references = {role: list(store.index("formulas", f"employee_{role}").lookup(code)) if code is not None else []
+                  for role in indexes.ROLES}
+    references["errors"] = list(store.index("errors", "funcionario").lookup(error_employee_code(name)))
+    return references
+
+def error_employee_code(name):
+    """Key of an employee in the errors' funcionario index (None if they have no error)."""
+    return error_codec.dictionaries["employees"].lookup(name)
+
+@app.route("/employees/<name>/records", methods=["GET"])
+def get_employee_records(name):
+    """Formulas per role (?role=pesagem|manipulacao|pm|errors to pick one) and error records."""
+    role = request.args.get("role")
+    with store.lock:
+        references = employee_references(name)
+        if role is not None and role not in references:
+            return jsonify({"error": f"Unknown role '{role}'."}), 400
+        records = {}
+        for key, ids in references.items():
+            if role is None or key == role:
+                records[key] = store.get_many("errors" if key == "errors" else "formulas", ids)
+    return jsonify({"name": name, "counts": {key: len(ids) for key, ids in references.items()}, "records": records})
+
 @app.route("/employees/<name>", methods=["DELETE"])
 def remove_employee(name):
-    with open(DATABASE_FILE, 'r') as f:
-        data = json.load(f)
+    """Refuses (409, with the counts) to remove an employee that formulas or error records
+    still reference, unless ?force=1."""
+    force = request.args.get("force") == "1"
+    with store.lock:
+        if name not in store.data["employees"]:
+            return jsonify({"error": f"Employee '{name}' not found."}), 404
+        counts = {key: len(ids) for key, ids in employee_references(name).items()}
+        if any(counts.values()) and not force:
+            return jsonify({"error": f"Employee '{name}' is referenced by {sum(counts.values())} records; "
+                                     "pass ?force=1 to remove anyway.", "references": counts}), 409
+        store.delete("employees", name)
+
+    # Their id stays in the dictionary, so the formulas below keep decoding to the name
+    return jsonify({"success": True, "message": f"Employee '{name}' removed.", "references": counts})
+
+@app.route("/employees/<name>", methods=["PUT"])
+def rename_employee(name):
+    """Renames an employee; their past formulas and error records follow since they
+    reference the employee's code. Followers of the feed get a "rename" change."""
+    content, errors = validate_employee(request.json)
+    if errors:
+        return jsonify({"error": describe(errors)}), 400
+    new_name = content["name"]
 
-    if name not in data:
-        return jsonify({"error": f"Employee '{name}' not found."}), 404
+    with store.lock:
+        employee = store.data["employees"].get(name)
+        if employee is None:
+            return jsonify({"error": f"Employee '{name}' not found."}), 404
+        if (formula_codec.dictionaries["employees"].lookup(new_name) is not None
+                or error_employee_code(new_name) is not None):
+            return jsonify({"error": f"Name '{new_name}' is already used by another employee."}), 400
 
-    del data[name]
+        store.rename_code("formulas", "employees", employee["id"], new_name)
+        error_code = error_employee_code(name)
+        if error_code is not None:
+            # The next snapshot rewrites this employee's months (see ErrorCodec.rows_to_rewrite)
+            store.rename_code("errors", "employees", error_code, new_name)
+        store.delete("employees", name)
+        store.add("employees", new_name, dict(employee, name=new_name))
 
-    with open(DATABASE_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+    return jsonify({"success": True, "message": f"Employee '{name}' renamed to '{new_name}'."})
 
-    return jsonify({"success": True, "message": f"Employee '{name}' removed."})
+def batch_errors(rejected):
+    return "; ".join(f"Record {position}: {describe(errors)}" for position, errors in rejected)
 
 @app.route("/formulas", methods=["POST"])
 def add_formula():
-    content = request.json
-    with open(FORMULAS_FILE, 'r') as f:
-        formulas = json.load(f)
+    record, errors = validate_formula(request.json)
+    if errors:
+        return jsonify({"error": describe(errors)}), 400
+    store.insert("formulas", upgrade_formula(record))
+
+    return jsonify({"success": True, "message": "Formula added."})
 
-    formulas.append(content)
+@app.route("/formulas/batch", methods=["POST"])
+def add_formulas_batch():
+    """All-or-nothing: one invalid record rejects the batch (the first ones are reported)."""
+    content = request.json
+    if not isinstance(content, list):
+        return jsonify({"error": "Body must be a list of records."}), 400
 
-    with open(FORMULAS_FILE, 'w') as f:
-        json.dump(formulas, f, indent=4)
+    records, rejected = validate_many(validate_formula, content)
+    if rejected:
+        return jsonify({"error": batch_errors(rejected)}), 400
 
-    return jsonify({"success": True, "message": "Formula added."})
+    ids = store.insert_many("formulas", [upgrade_formula(record) for record in records])
+    return jsonify({"success": True, "message": f"{len(ids)} formulas added.", "ids": ids})
 
 @app.route("/formulas", methods=["GET"])
 def get_formulas():
-    with open(FORMULAS_FILE, 'r') as f:
-        formulas = json.load(f)
-    return jsonify(formulas)
+    formulas, version = store.get_with_version("formulas")
+    response = jsonify(formulas)
+    response.headers["X-Data-Version"] = str(version)
+    return response
+
+@app.route("/formulas/counts", methods=["GET"])
+def get_formula_counts():
+    """Formula counts ?by=pesagem|manipulacao|pm|tipo_formula|turno, filtered by
+    ?start=&end= (YYYY-MM-DD), ?flag=, ?tipo_formula= (repeatable) and ?turno=."""
+    group = request.args.get("by", "manipulacao")
+    flag = request.args.get("flag")
+    if group not in GROUPS:
+        return jsonify({"error": f"Field 'by' must be one of: {', '.join(GROUPS)}."}), 400
+    if flag is not None and flag not in FLAGS:
+        return jsonify({"error": f"Field 'flag' must be one of: {', '.join(FLAGS)}."}), 400
+
+    with store.lock:
+        selection = formula_bitmaps.select(start=request.args.get("start"), end=request.args.get("end"), flag=flag,
+                                           tipos=request.args.getlist("tipo_formula") or None,
+                                           turno=request.args.get("turno"))
+        counts = formula_bitmaps.counts(group, selection)
+        version = store.version
+    response = jsonify({"by": group, "total": len(selection), "counts": counts})
+    response.headers["X-Data-Version"] = str(version)
+    return response
+
+# --- Error records (same format as sistema_julia.py / data_julia.json) ---
+@app.route("/errors", methods=["POST"])
+def add_error():
+    # Also fills a missing date/time with the current ones (validation.ERROR)
+    record, errors = validate_error(request.json)
+    if errors:
+        return jsonify({"error": describe(errors)}), 400
+
+    record_id = store.insert("errors", record)
+    return jsonify({"success": True, "message": "Error record added.", "id": record_id})
+
+@app.route("/errors/batch", methods=["POST"])
+def add_errors_batch():
+    content = request.json
+    if not isinstance(content, list):
+        return jsonify({"error": "Body must be a list of records."}), 400
+
+    records, rejected = validate_many(validate_error, content)
+    if rejected:
+        return jsonify({"error": batch_errors(rejected)}), 400
+
+    ids = store.insert_many("errors", records)
+    return jsonify({"success": True, "message": f"{len(ids)} error records added.", "ids": ids})
+
+@app.route("/errors/nr/<nr>", methods=["GET"])
+def get_errors_by_nr(nr):
+    with store.lock:
+        ids = list(store.index("errors", "nr").lookup(str(nr)))
+    return jsonify(store.get_many("errors", ids))
+
+@app.route("/errors/search", methods=["GET"])
+def search_errors():
+    """Error records whose notes or error types hold every word of ?q= (accents and case
+    ignored, words match as prefixes), newest first; at most ?limit= of them."""
+    query = request.args.get("q", "")
+    try:
+        limit = int(request.args.get("limit", 0)) or None
+    except ValueError:
+        return jsonify({"error": "'limit' must be a number."}), 400
+
+    with store.lock:
+        ids = error_text.search(query)
+        # Ranked on the stored rows (date and time are kept as they are): only the
+        # records returned get decoded
+        rows = store.data["errors"]
+
+        def newest(record_id):
+            return str(rows[record_id].get("date") or ""), str(rows[record_id].get("time") or "")
+        ranked = heapq.nlargest(limit, ids, key=newest) if limit else sorted(ids, key=newest, reverse=True)
+        records = store.get_many("errors", ranked)
+    return jsonify({"query": query, "total": len(ids), "records": records})
+
+@app.route("/errors", methods=["GET"])
+def get_errors():
+    """All error records, or those matching ?start=&end= (YYYY-MM-DD), ?funcionario=, ?tipo_erro=."""
+    start = request.args.get("start")
+    end = request.args.get("end")
+    funcionario = request.args.get("funcionario")
+    tipo_erro = request.args.get("tipo_erro")
+
+    if not (start or end or funcionario or tipo_erro):
+        errors, version = store.get_with_version("errors")
+        response = jsonify(errors)
+        response.headers["X-Data-Version"] = str(version)
+        return response
+
+    with store.lock:
+        records = store.get_many("errors", error_ids(start, end, funcionario, tipo_erro))
+    return jsonify(records)
+
+def error_ids(start=None, end=None, funcionario=None, tipo_erro=None):
+    """Sorted ids of the error records matching every given filter (call with store.lock held)."""
+    candidates = []
+    if start or end:
+        candidates.append(store.index("errors", "date").range(start, end))
+    if funcionario:
+        candidates.append(store.index("errors", "funcionario").lookup(error_employee_code(funcionario)))
+    if tipo_erro:
+        candidates.append(store.index("errors", "tipo_erro").lookup(tipo_erro))
+    if not candidates:
+        return list(range(len(store.data["errors"])))
+    # Intersect starting from the smallest posting list
+    candidates.sort(key=len)
+    ids = set(candidates[0])
+    for other in candidates[1:]:
+        ids.intersection_update(other)
+    return sorted(ids)
+
+# --- Spreadsheet export (CSV/XLSX, see export_table.py) ---
+def stream_records(collection, ids):
+    """Records by id, decoded EXPORT_CHUNK at a time so the lock is held only briefly."""
+    for position in range(0, len(ids), EXPORT_CHUNK):
+        yield from store.get_many(collection, ids[position:position + EXPORT_CHUNK])
+
+def export_response(collection, ids):
+    fmt = request.args.get("format", "csv")
+    if fmt not in export_table.FORMATS:
+        return jsonify({"error": f"Field 'format' must be one of: {', '.join(export_table.FORMATS)}."}), 400
+    # Checked here: once streaming, a csv.writer error could only cut the download short
+    sep = request.args.get("sep", ",")
+    if len(sep) != 1 or sep in '"\r\n':
+        return jsonify({"error": "Field 'sep' must be one character (not a quote or a line break)."}), 400
+    chunks = export_table.table_chunks(fmt, stream_records(collection, ids), export_table.COLUMNS[collection], sep)
+    return Response(chunks, mimetype=export_table.FORMATS[fmt],
+                    headers={"Content-Disposition": f'attachment; filename="{collection}.{fmt}"'})
+
+@app.route("/formulas/export", methods=["GET"])
+def export_formulas():
+    """Formulas as ?format=csv|xlsx, filtered by ?start=&end=, ?employee= (any role) and ?tipo_formula=."""
+    with store.lock:
+        selection = formula_bitmaps.select(start=request.args.get("start"), end=request.args.get("end"),
+                                           tipos=request.args.getlist("tipo_formula") or None,
+                                           employee=request.args.get("employee"))
+        ids = list(selection.ids())
+    return export_response("formulas", ids)
+
+@app.route("/errors/export", methods=["GET"])
+def export_errors():
+    """Error records as ?format=csv|xlsx, with the filters of GET /errors."""
+    with store.lock:
+        ids = error_ids(request.args.get("start"), request.args.get("end"),
+                        request.args.get("funcionario"), request.args.get("tipo_erro"))
+    return export_response("errors", ids)
+
+# --- NR join: production formulas x error records ---
+@app.route("/nr/<nr>", methods=["GET"])
+def get_nr(nr):
+    """Formulas and error records sharing an NR."""
+    with store.lock:
+        formula_ids, error_ids = nr_join.lookup(nr)
+        return jsonify({"nr": nr,
+                        "formulas": store.get_many("formulas", formula_ids),
+                        "errors": store.get_many("errors", error_ids)})
+
+@app.route("/reports/error-cost", methods=["GET"])
+def get_error_cost_report():
+    """Cost of errors per production employee (by role) and per tipo_formula."""
+    with store.lock:
+        return jsonify(nr_join.report())
+
+# New codes are internal and not part of the feed; a rename is, since records already
+# sent to a follower show the old name (live_updates.py reloads on it)
+FEED_OPS = ("insert", "put", "delete", "rename")
+
+def format_change(entry):
+    change = {"version": entry["v"], "collection": entry["c"],
+              "op": entry["op"] if entry["op"] in ("delete", "rename") else "insert"}
+    if entry["op"] == "rename":
+        change["value"] = entry["value"]
+    if "id" in entry:
+        change["id"] = entry["id"]
+    if "key" in entry:
+        change["key"] = entry["key"]
+    if "r" in entry:
+        change["record"] = store.decode(entry["c"], entry["r"])
+    return change
+
+@app.route("/changes", methods=["GET"])
+def get_changes():
+    """Mutations after ?since=<version>; waits up to ?timeout= seconds if there are none.
+
+    Start from the X-Data-Version header of GET /formulas or /employees. When the
+    response has "reset": true, the client is too far behind and must refetch everything.
+    """
+    try:
+        since = int(request.args.get("since", 0))
+        timeout = min(float(request.args.get("timeout", 0)), MAX_CHANGES_TIMEOUT)
+    except ValueError:
+        return jsonify({"error": "'since' and 'timeout' must be numbers."}), 400
+
+    collection = request.args.get("collection")
+    version, entries, reset = store.changes_since(since, timeout)
+    changes = [format_change(e) for e in entries
+               if e["op"] in FEED_OPS and (collection is None or e["c"] == collection)]
+    return jsonify({"version": version, "reset": reset, "changes": changes})
+
+@app.route("/events", methods=["GET"])
+def events():
+    """Server-Sent Events stream of the change feed (same payloads as /changes).
+
+    Resumes after the Last-Event-ID header (sent automatically on reconnect) or ?since=.
+    Each stream holds one server thread while open.
+    """
+    try:
+        since = int(request.headers.get("Last-Event-ID") or request.args.get("since", store.version))
+    except ValueError:
+        return jsonify({"error": "'since' must be a number."}), 400
+    collections = set(request.args.getlist("collection"))
+
+    def stream(since):
+        yield "retry: 2000\n\n"
+        while True:
+            version, entries, reset = store.changes_since(since, EVENTS_KEEPALIVE)
+            if reset:
+                yield f"id: {version}\nevent: reset\ndata: {{}}\n\n"
+            for entry in entries:
+                if entry["op"] in FEED_OPS and (not collections or entry["c"] in collections):
+                    change = format_change(entry)
+                    yield f"id: {entry['v']}\nevent: {change['op']}\ndata: {storage.dumps(change)}\n\n"
+            if version == since and not reset:
+                yield ": keepalive\n\n"
+            since = version
+
+    return Response(stream(since), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def shutdown():
+    """Writes a final snapshot so the next start has no WAL to replay."""
+    store.close()
+
+atexit.register(shutdown)
 
 if __name__ == "__main__":
+    # Development server only; use serve.py for the benches.
     app.run(host="0.0.0.0", port=5000)
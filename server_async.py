@@ -0,0 +1,274 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote
+
+import shards
+import storage
+from indexes import ROLES
+from schema import upgrade_formula
+from validation import describe, validate_employee, validate_formula
+
+# Async (ASGI) version of server.py, with the same routes:
+#   GET/POST /employees, DELETE /employees/<name>, GET/POST /formulas
+#
+# DELETE /employees/<name> refuses (409) an employee that formulas still reference,
+# unless ?force=1, like server.py; this server holds no error records, so only the
+# formulas are counted.
+#
+# Data is held in memory and served from there; writes are buffered and flushed to
+# disk by a background task (write-behind), on a single I/O thread so the event loop
+# never blocks on disk. Run it as ONE process, the event loop handles the concurrency:
+#
+#   pip install uvicorn
+#   uvicorn server_async:app --host 0.0.0.0 --port 5000
+
+DATABASE_FILE = "funcionarios.json"
+FORMULAS_FILE = "formulas.json"
+FLUSH_INTERVAL = float(os.environ.get("FLUSH_INTERVAL", "1.0"))
+FORMULAS = shards.formulas(FORMULAS_FILE)
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-headers", b"Content-Type"),
+    (b"access-control-allow-methods", b"GET, POST, DELETE, OPTIONS"),
+]
+
+
+class AsyncStore:
+    """In-memory employees/formulas with write-behind persistence."""
+
+    def __init__(self):
+        self.employees = {}
+        self.formulas = []
+        self._new_formulas = []  # appended since the last flush
+        self.generation = 0      # bumped on every formula write
+        self._formulas_body = (None, None)  # (generation, future of the encoded GET /formulas)
+        self._dirty = set()
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-io")
+        self._flusher = None
+
+    async def _run_io(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._io, func, *args)
+
+    async def start(self):
+        await self._run_io(storage.ensure_file, DATABASE_FILE, {})
+        self.employees = await self._run_io(storage.read_json, DATABASE_FILE, {})
+        self.formulas = await self._run_io(FORMULAS.load)
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+        await self.flush()
+        self._io.shutdown(wait=True)
+
+    def mark_dirty(self, path):
+        self._dirty.add(path)
+
+    def append_formula(self, record):
+        self.formulas.append(record)
+        self._new_formulas.append(record)
+        self.generation += 1
+        self.mark_dirty(FORMULAS_FILE)
+
+    def formulas_body(self):
+        """Future of the JSON body of GET /formulas. Encoded once per generation, on the
+        default executor: serializing the whole list would stall every connection."""
+        generation, body = self._formulas_body
+        if generation != self.generation:
+            formulas = list(self.formulas)  # appends after this point go to the next generation
+            body = asyncio.get_running_loop().run_in_executor(None, _encode, formulas)
+            self._formulas_body = (self.generation, body)
+        return body
+
+    async def flush(self):
+        """Writes every dirty file; a failed one stays dirty (the others are still written)
+        and the first error is raised at the end."""
+        dirty, self._dirty = self._dirty, set()
+        error = None
+        for path in dirty:
+            # Snapshot under the event loop, serialize and write on the I/O thread
+            try:
+                if path == FORMULAS_FILE:
+                    # Only the new formulas, appended to the shards of their months
+                    batch, self._new_formulas = self._new_formulas, []
+                    await self._run_io(FORMULAS.append_many, batch, True)
+                else:
+                    await self._run_io(_locked_write, path, dict(self.employees))
+            except (OSError, ValueError) as e:
+                if path == FORMULAS_FILE:
+                    self._new_formulas[:0] = batch
+                self._dirty.add(path)  # retry on the next flush
+                error = error or e
+        if error is not None:
+            raise error
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except (OSError, ValueError) as e:
+                print(f"Error flushing data: {e}")
+
+
+def _encode(data):
+    return storage.dumps(data).encode("utf-8")
+
+
+def _locked_write(path, data):
+    with storage.locked(path):
+        storage.write_json(path, data)
+
+
+store = AsyncStore()
+
+
+# --- Handlers ---
+async def get_employees(body, name=None, query=None):
+    return 200, store.employees
+
+
+async def add_employee(body, name=None, query=None):
+    body, errors = validate_employee(body)
+    if errors:
+        return 400, {"error": describe(errors)}
+    name = body["name"]
+    role = body.get("role")
+
+    if name in store.employees:
+        return 400, {"error": f"Employee '{name}' already exists."}
+
+    employee = {"name": name}
+    if role == "Farmaceutico":
+        employee["role"] = "Farmaceutico"
+    store.employees[name] = employee
+    store.mark_dirty(DATABASE_FILE)
+
+    return 200, {"success": True, "message": f"Employee '{name}' added."}
+
+
+def formula_references(formulas, name):
+    """{role: formulas naming the employee in that role}."""
+    counts = dict.fromkeys(ROLES, 0)
+    for record in formulas:
+        for role, field in ROLES.items():
+            if record.get(field) == name:
+                counts[role] += 1
+    return counts
+
+
+async def remove_employee(body, name=None, query=None):
+    if name not in store.employees:
+        return 404, {"error": f"Employee '{name}' not found."}
+
+    if (query or {}).get("force") != ["1"]:
+        # A scan of every formula: off the event loop
+        counts = await asyncio.get_running_loop().run_in_executor(
+            None, formula_references, list(store.formulas), name)
+        if any(counts.values()):
+            return 409, {"error": f"Employee '{name}' is referenced by {sum(counts.values())} records; "
+                                  "pass ?force=1 to remove anyway.", "references": counts}
+        if name not in store.employees:  # removed while counting
+            return 404, {"error": f"Employee '{name}' not found."}
+
+    del store.employees[name]
+    store.mark_dirty(DATABASE_FILE)
+
+    return 200, {"success": True, "message": f"Employee '{name}' removed."}
+
+
+async def add_formula(body, name=None, query=None):
+    record, errors = validate_formula(body)
+    if errors:
+        return 400, {"error": describe(errors)}
+    store.append_formula(upgrade_formula(record))
+    return 200, {"success": True, "message": "Formula added."}
+
+
+async def get_formulas(body, name=None, query=None):
+    return 200, await store.formulas_body()
+
+
+ROUTES = {
+    ("GET", "/employees"): get_employees,
+    ("POST", "/employees"): add_employee,
+    ("GET", "/formulas"): get_formulas,
+    ("POST", "/formulas"): add_formula,
+}
+
+
+def resolve(method, path):
+    handler = ROUTES.get((method, path.rstrip("/") or "/"))
+    if handler is not None:
+        return handler, None
+    if method == "DELETE" and path.startswith("/employees/"):
+        return remove_employee, unquote(path[len("/employees/"):])
+    return None, None
+
+
+# --- ASGI plumbing ---
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def send_json(send, status, payload):
+    """`payload` is encoded here, unless it is already the encoded body (bytes)."""
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers + CORS_HEADERS})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await store.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await store.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    method = scope["method"]
+    if method == "OPTIONS":
+        await send({"type": "http.response.start", "status": 204, "headers": CORS_HEADERS})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    handler, name = resolve(method, scope["path"])
+    if handler is None:
+        await send_json(send, 404, {"error": "Not found."})
+        return
+
+    raw = await read_body(receive)
+    try:
+        body = json.loads(raw) if raw else {}
+    except ValueError:
+        await send_json(send, 400, {"error": "Invalid JSON body."})
+        return
+
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    status, payload = await handler(body, name, query)
+    await send_json(send, status, payload)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=5000)
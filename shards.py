@@ -0,0 +1,547 @@
+import datetime
+import gzip
+import os
+import re
+
+import schema
+import storage
+from encoding import FormulaCodec, is_encoded
+from jsonstream import chunked, first_char, iter_array
+
+# --- Monthly shards ---
+# A list collection such as formulas.json is stored as one file per month, in a
+# directory named after it, plus a manifest:
+#
+#   formulas/manifest.json
+#     {"format": "shards-v1",
+#      "dictionaries": {...},       # encoded collections only, shared by every shard
+#      "shards": {"2025-09": {"file": "2025-09.json.gz", "sealed": true, "count": 812,
+#                             "min_date": "2025-09-01", "max_date": "2025-09-30"},
+#                 "2025-10": {"file": "2025-10.json", "sealed": false, ...}}}
+#   formulas/2025-09.json.gz        # closed month: compressed, not rewritten again
+#   formulas/2025-10.json           # current month: plain JSON, rewritten on change
+#
+# A record goes to the shard of its "date" month. Appends and snapshots only rewrite
+# the shards they touch (normally the current month), and readers pick shards by their
+# min/max dates. Once a month is over its shard is sealed into a gzip archive; only a
+# late, back-dated record rewrites an archive.
+#
+# The manifest is written last and its "count" is authoritative: rows past it in a
+# shard file (a crash between the two writes) are ignored, so a reader always sees the
+# state of the last complete write.
+#
+# An entry's "revision" (0 when absent) goes up whenever rows already in the shard
+# change, e.g. a renamed employee or a schema upgrade; appends keep it. Whoever caches
+# a shard (the dashboards, ShardFollower) must read it again when the revision moves.
+#
+# A legacy single file (formulas.json) is split on first use and kept as "<file>.bak".
+#
+# With a `schema` (schema.py) every record is stored upgraded to its current version;
+# the manifest records that version, and shards written under an older one are
+# upgraded once when the collection is opened.
+
+MANIFEST_FORMAT = "shards-v1"
+MANIFEST_FILE = "manifest.json"
+# Records of a legacy file held in memory while it is split; past this they are
+# spilled to a temporary file per month
+SPLIT_BUFFER = 50000
+# Delta lines a ShardFollower appends before rewriting its whole file
+DELTA_COMPACT_AFTER = 100
+_MONTH = re.compile(r"^\d{4}-\d{2}$")
+
+
+def current_month():
+    return datetime.date.today().strftime("%Y-%m")
+
+
+def month_of(record):
+    """Shard key of a record: the YYYY-MM of its date (the current month if it has none)."""
+    month = str(record.get("date") or "")[:7]
+    return month if _MONTH.match(month) else current_month()
+
+
+class ShardedCollection:
+    def __init__(self, path, codec_class=None, schema=None):
+        """`path` is the collection's legacy file; shards live in the directory next to it.
+
+        `codec_class` (encoding.FormulaCodec) stores the shards dictionary-encoded and
+        `schema` (schema.Schema) keeps every record on one version.
+        """
+        self.path = path
+        self.directory = os.path.splitext(path)[0]
+        self.manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        self.codec_class = codec_class
+        self.schema = schema
+
+    # --- Manifest ---
+    def open(self):
+        """Creates the shard directory, splitting the legacy file if there is one."""
+        os.makedirs(self.directory, exist_ok=True)
+        with storage.locked(self.manifest_path):
+            if os.path.exists(self.manifest_path):
+                manifest = self.manifest()
+                if self.schema is not None and manifest.get("schema", 0) < self.schema.version:
+                    self._upgrade_schema(manifest)
+                return self
+            manifest = self._new_manifest()
+            if os.path.exists(self.path) and first_char(self.path) == "[":
+                # Legacy array, possibly huge: streamed, and each month written once
+                self._split(manifest, iter_array(self.path))
+            elif os.path.exists(self.path):
+                data = storage.read_json(self.path, [])
+                if is_encoded(data):
+                    # Keep the codes: employee ids in funcionarios.json refer to them
+                    codec = FormulaCodec()
+                    records = [codec.decode(row) for row in codec.load(data)]
+                    manifest["dictionaries"] = codec.dump_dictionaries()
+                    self._append(manifest, records, commit=False)
+            # Nothing counts as split until the manifest exists
+            self._commit(manifest)
+            if os.path.exists(self.path):
+                os.replace(self.path, self.path + ".bak")
+                print(f"{self.path}: split into monthly shards in {self.directory}/ (original kept as {self.path}.bak)")
+        return self
+
+    def _split(self, manifest, records):
+        """Writes the shards of a legacy file, each once (see _group)."""
+        months = self._group(records)
+        try:
+            self._write_months(manifest, months)
+        finally:
+            months.close()
+
+    def _group(self, records, upgraded=False):
+        """Records by month, to write each shard once at the end instead of re-reading
+        and re-compressing a month for every chunk it appears in."""
+        months = _MonthGroups(self.directory)
+        try:
+            for record in records:
+                if self.schema is not None and not upgraded:
+                    record = self.schema.upgrade(record)
+                months.add(month_of(record), record)
+        except BaseException:
+            months.close()
+            raise
+        return months
+
+    def _write_months(self, manifest, months):
+        """Appends the grouped records to their shards; returns the files replaced."""
+        codec = self.codec(manifest) if self.codec_class is not None else None
+        this_month = current_month()
+        replaced = []
+        for month in months.months():
+            entry = manifest["shards"].get(month)
+            rows = self.read_rows(entry, manifest, codec) if entry else []
+            new_records = months.records(month)
+            rows += [codec.encode(record)[0] for record in new_records] if codec else new_records
+            replaced.append(self._write_rows(month, rows, manifest, codec, sealed=month < this_month))
+        if codec is not None:
+            manifest["dictionaries"] = codec.dump_dictionaries()
+        return replaced
+
+    def _new_manifest(self):
+        manifest = {"format": MANIFEST_FORMAT, "shards": {}}
+        if self.schema is not None:
+            manifest["schema"] = self.schema.version
+        if self.codec_class is not None:
+            manifest["dictionaries"] = {}
+        return manifest
+
+    def manifest(self):
+        return storage.read_json(self.manifest_path, None) or self._new_manifest()
+
+    def shards(self, start=None, end=None, manifest=None):
+        """(month, entry) of the shards holding dates in [start, end], oldest first."""
+        manifest = manifest or self.manifest()
+        start = start and str(start)[:10]
+        end = end and str(end)[:10]
+        selected = []
+        for month, entry in sorted(manifest["shards"].items()):
+            if start and entry["max_date"] and entry["max_date"] < start:
+                continue
+            if end and entry["min_date"] and entry["min_date"] > end:
+                continue
+            selected.append((month, entry))
+        return selected
+
+    def codec(self, manifest):
+        """A codec holding the manifest's shared dictionaries."""
+        codec = self.codec_class()
+        codec.load_dictionaries(manifest["dictionaries"])
+        return codec
+
+    # --- Shard files ---
+    def load_shards(self, codec=None):
+        """[(month, rows)] of every shard, oldest first; `codec` takes the manifest's
+        dictionaries. Used by the Store, which keeps the rows in memory."""
+        self.open()
+        manifest = self.manifest()
+        if codec is not None:
+            codec.load_dictionaries(manifest.get("dictionaries", {}))
+        return [(month, self.read_rows(entry, manifest, codec)) for month, entry in self.shards(manifest=manifest)]
+
+    def read_rows(self, entry, manifest, codec=None):
+        """Rows of one shard (encoded rows for encoded collections)."""
+        path = os.path.join(self.directory, entry["file"])
+        if entry["sealed"]:
+            with gzip.open(path, 'rb') as f:
+                data = storage.loads(f.read())
+        else:
+            data = storage.read_json(path, [])
+        if codec is not None and data:
+            data = codec.load_rows(data)
+        return data[:entry["count"]]
+
+    def _write_rows(self, month, rows, manifest, codec=None, sealed=False, rewritten=False):
+        """Writes one shard and updates its manifest entry; returns the file it replaces
+        (a hot shard that got sealed), to be removed once the manifest is committed.
+        `rewritten`: rows that were already there changed (bumps the revision)."""
+        previous = manifest["shards"].get(month)
+        revision = (previous or {}).get("revision", 0) + (1 if rewritten and previous else 0)
+        if codec is not None:
+            text = codec.dumps(rows, dictionaries=False)
+            dates = [codec.decode(row).get("date") for row in rows]
+        else:
+            text = storage.dumps(rows)
+            dates = [record.get("date") for record in rows]
+        dates = [str(day)[:10] for day in dates if day]
+        file_name = f"{month}.json.gz" if sealed else f"{month}.json"
+        path = os.path.join(self.directory, file_name)
+        if sealed:
+            storage.write_bytes(path, gzip.compress(text.encode('utf-8')))
+        else:
+            storage.write_text(path, text)
+        manifest["shards"][month] = {"file": file_name, "sealed": sealed, "count": len(rows),
+                                     "min_date": min(dates, default=None), "max_date": max(dates, default=None)}
+        if revision:
+            manifest["shards"][month]["revision"] = revision
+        return previous["file"] if previous and previous["file"] != file_name else None
+
+    def _commit(self, manifest):
+        storage.write_json(self.manifest_path, manifest)
+
+    def _seal_closed(self, manifest, codec=None):
+        """Archives the shards of months that are over. Returns the files to remove."""
+        replaced = []
+        this_month = current_month()
+        for month, entry in list(manifest["shards"].items()):
+            if entry["sealed"] or month >= this_month:
+                continue
+            rows = self.read_rows(entry, manifest, codec)
+            replaced.append(self._write_rows(month, rows, manifest, codec, sealed=True))
+        return replaced
+
+    def write(self, rows_by_month, codec=None, rewritten=()):
+        """Rewrites whole shards: {month: rows} (encoded with `codec` if given); the months
+        in `rewritten` had rows changed, not only added.
+
+        Used by the Store's snapshots, which hold every row in memory.
+        """
+        with storage.locked(self.manifest_path):
+            manifest = self.manifest()
+            replaced = [self._write_rows(month, rows, manifest, codec, sealed=month < current_month(),
+                                         rewritten=month in rewritten)
+                        for month, rows in rows_by_month.items()]
+            replaced += self._seal_closed(manifest, codec)
+            if codec is not None:
+                manifest["dictionaries"] = codec.dump_dictionaries()
+            self._commit(manifest)
+            self._remove(replaced)
+
+    def _remove(self, file_names):
+        for file_name in filter(None, file_names):
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except OSError:
+                pass
+
+    # --- Helpers for the apps that read/write the files directly ---
+    def load(self, start=None, end=None):
+        """Plain records of the shards overlapping [start, end] (whole shards, so callers
+        still filter the exact dates)."""
+        return list(self.iter_records(start, end))
+
+    def iter_records(self, start=None, end=None):
+        """Like load(), one record at a time: only one shard is held in memory."""
+        self.open()
+        manifest = self.manifest()
+        codec = self.codec(manifest) if self.codec_class is not None else None
+        for _, entry in self.shards(start, end, manifest):
+            rows = self.read_rows(entry, manifest, codec)
+            if codec is None:
+                yield from rows
+            else:
+                yield from (codec.decode(row) for row in rows)
+
+    def append(self, record):
+        self.append_many([record])
+
+    def import_many(self, records, upgraded=False):
+        """Appends any number of records (an iterable, e.g. a streamed file) writing each
+        month's shard once; returns how many. Nothing is committed until the end, and the
+        manifest is only locked for the writes."""
+        self.open()
+        months = self._group(records, upgraded)
+        try:
+            with storage.locked(self.manifest_path):
+                manifest = self.manifest()
+                replaced = self._write_months(manifest, months)
+                replaced += self._seal_closed(manifest, self.codec(manifest) if self.codec_class is not None else None)
+                self._commit(manifest)
+                self._remove(replaced)
+        finally:
+            months.close()
+        return months.count
+
+    def append_many(self, records, upgraded=False):
+        """Appends records to the shards of their months (`upgraded`: already in the
+        current schema, e.g. by worker processes)."""
+        self.open()
+        with storage.locked(self.manifest_path):
+            self._append(self.manifest(), records, upgraded=upgraded)
+
+    def _append(self, manifest, records, commit=True, upgraded=False):
+        codec = self.codec(manifest) if self.codec_class is not None else None
+        if self.schema is not None and not upgraded:
+            records = [self.schema.upgrade(record) for record in records]
+        by_month = {}
+        replaced = []
+        for record in records:
+            by_month.setdefault(month_of(record), []).append(record)
+        for month, new_records in sorted(by_month.items()):
+            entry = manifest["shards"].get(month)
+            rows = self.read_rows(entry, manifest, codec) if entry else []
+            if codec is not None:
+                new_records = [codec.encode(record)[0] for record in new_records]
+            rows.extend(new_records)
+            replaced.append(self._write_rows(month, rows, manifest, codec, sealed=month < current_month()))
+        replaced += self._seal_closed(manifest, codec)
+        if codec is not None:
+            manifest["dictionaries"] = codec.dump_dictionaries()
+        if commit:
+            self._commit(manifest)
+            self._remove(replaced)
+
+    # --- Schema upgrades ---
+    def upgrade_schema(self, map_chunks=map):
+        """Rewrites the shards of an older schema version; returns the records upgraded.
+
+        `map_chunks` runs schema.upgrade_chunk over lists of records, e.g. Pool.imap to
+        spread the work over processes (see migrate_formulas.py).
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with storage.locked(self.manifest_path):
+            if not os.path.exists(self.manifest_path):
+                return 0
+            manifest = self.manifest()
+            if manifest.get("schema", 0) >= self.schema.version:
+                return 0
+            return self._upgrade_schema(manifest, map_chunks)
+
+    def _upgrade_schema(self, manifest, map_chunks=map):
+        codec = self.codec(manifest) if self.codec_class is not None else None
+        replaced = []
+        count = 0
+        for month, entry in self.shards(manifest=manifest):
+            rows = self.read_rows(entry, manifest, codec)
+            records = [codec.decode(row) for row in rows] if codec else rows
+            records = [record for chunk in map_chunks(self.schema.upgrade_chunk, chunked(records)) for record in chunk]
+            rows = [codec.encode(record)[0] for record in records] if codec else records
+            replaced.append(self._write_rows(month, rows, manifest, codec, sealed=entry["sealed"], rewritten=True))
+            count += len(rows)
+        manifest["schema"] = self.schema.version
+        if codec is not None:
+            manifest["dictionaries"] = codec.dump_dictionaries()
+        self._commit(manifest)
+        self._remove(replaced)
+        print(f"{self.directory}/: {count} records upgraded to schema version {self.schema.version}")
+        return count
+
+
+class _MonthGroups:
+    """Records grouped by month; past SPLIT_BUFFER in memory they are spilled to
+    ".split-<pid>-<month>.jsonl" files in `directory`."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.count = 0
+        self._pending = {}
+        self._buffered = 0
+        self._spills = {}  # month -> path
+
+    def add(self, month, record):
+        self._pending.setdefault(month, []).append(record)
+        self._buffered += 1
+        self.count += 1
+        if self._buffered >= SPLIT_BUFFER:
+            self._spill()
+
+    def _spill(self):
+        for month, pending in self._pending.items():
+            mode = 'a' if month in self._spills else 'w'
+            path = self._spills.setdefault(month, os.path.join(self.directory, f".split-{os.getpid()}-{month}.jsonl"))
+            with open(path, mode, encoding='utf-8') as f:
+                f.writelines(storage.dumps(record) + "\n" for record in pending)
+        self._pending, self._buffered = {}, 0
+
+    def months(self):
+        return sorted(set(self._pending) | set(self._spills))
+
+    def records(self, month):
+        """The month's records, in the order they were added."""
+        records = []
+        if month in self._spills:
+            with open(self._spills[month], 'r', encoding='utf-8') as f:
+                records = [storage.loads(line) for line in f]
+        return records + self._pending.get(month, [])
+
+    def close(self):
+        for path in self._spills.values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._spills = {}
+
+
+# --- Data derived from the shards ---
+class ShardFollower:
+    """Base of the data kept next to a collection's manifest and caught up with its
+    shards incrementally (textsearch.ShardTextIndex, catalog.ShardCatalog).
+
+    `counts` tells how many rows of each shard are already folded in; refresh() reads
+    only the shards that grew and hands their new rows to _fold(). Those go to a delta
+    file, one line per shard, which is folded into the JSON file (`file_name`) once
+    DELTA_COMPACT_AFTER lines pile up. If a shard lost rows (restored from a backup) or
+    its rows changed (its revision moved, e.g. after a rename) everything is folded again. Subclasses give:
+
+        format, file_name
+        _fold(month, start, rows) -> the delta of rows[start:], already applied here
+        _apply_delta(delta)       -> replays a delta line
+        _state() / _load_state(data) / _clear()  -> the JSON file's content
+    """
+
+    format = None
+    file_name = None
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.path = os.path.join(collection.directory, self.file_name)
+        self.delta_path = os.path.splitext(self.path)[0] + ".delta"
+        self.counts = {}  # month -> rows of that shard already folded in
+        self.revisions = {}  # month -> revision of that shard when they were folded
+        self._deltas = 0  # lines in the delta file
+        self._loaded = False
+
+    def _changed(self):
+        """Called after new rows were folded in (e.g. to drop derived caches)."""
+
+    def _read(self, month, manifest):
+        return self.collection.read_rows(manifest["shards"][month], manifest)
+
+    def _load(self):
+        data = storage.read_json(self.path, None)
+        if data and data.get("format") == self.format:
+            self.counts = data["counts"]
+            self.revisions = data.get("revisions", {})
+            self._load_state(data)
+        self._deltas = 0
+        try:
+            with open(self.delta_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._deltas += 1
+                    self._load_delta(line)
+        except OSError:
+            pass
+        self._loaded = True
+        self._changed()
+
+    def _load_delta(self, line):
+        try:
+            delta = storage.loads(line)
+            month, start = delta["month"], delta["start"]
+        except (ValueError, KeyError, TypeError):
+            return  # cut short by a crash: those rows are folded again
+        if start != self.counts.get(month, 0):
+            return  # already in the JSON file, or after a lost line
+        self._apply_delta(delta)
+        self.counts[month] = start + delta["count"]
+        self.revisions[month] = delta.get("revision", 0)
+
+    def _save(self):
+        """Writes the whole state and empties the delta file."""
+        try:
+            storage.write_json(self.path, dict(self._state(), format=self.format, counts=self.counts,
+                                                  revisions=self.revisions))
+            if os.path.exists(self.delta_path):
+                os.remove(self.delta_path)
+            self._deltas = 0
+        except OSError:
+            pass  # rebuilt from the shards next time
+
+    def _save_deltas(self, deltas):
+        try:
+            with open(self.delta_path, 'a', encoding='utf-8') as f:
+                f.write("".join(storage.dumps(delta) + "\n" for delta in deltas))
+            self._deltas += len(deltas)
+        except OSError:
+            return  # folded again next time
+        if self._deltas >= DELTA_COMPACT_AFTER:
+            self._save()
+
+    def refresh(self):
+        """Folds in the rows added to the shards since the last refresh."""
+        if not self._loaded:
+            self._load()
+        self.collection.open()
+        manifest = self.collection.manifest()
+        shards = manifest["shards"]
+        restarted = any(shards.get(month, {}).get("count", 0) < count
+                        or shards.get(month, {}).get("revision", 0) != self.revisions.get(month, 0)
+                        for month, count in self.counts.items())
+        if restarted:
+            self._clear()
+            self.counts = {}
+            self.revisions = {}
+        deltas = []
+        for month, entry in sorted(shards.items()):
+            start = self.counts.get(month, 0)
+            if entry["count"] == start:
+                continue
+            rows = self._read(month, manifest)
+            delta = self._fold(month, start, rows)
+            revision = entry.get("revision", 0)
+            deltas.append(dict(delta, month=month, start=start, count=len(rows) - start, revision=revision))
+            self.counts[month] = len(rows)
+            self.revisions[month] = revision
+        if restarted:
+            self._save()
+        elif deltas:
+            self._save_deltas(deltas)
+        if restarted or deltas:
+            self._changed()
+        return self
+
+
+# --- The app's collections ---
+def formulas(path="formulas.json"):
+    return ShardedCollection(path, FormulaCodec, schema.FORMULAS)
+
+
+def errors(path="data_julia.json"):
+    return ShardedCollection(path)
+
+
+def load_formulas(path, start=None, end=None):
+    """All formulas (or those in the months overlapping [start, end]) as plain dicts."""
+    return formulas(path).load(start, end)
+
+
+def append_formula(path, record):
+    """Appends one formula to the shard of its month; False (after printing why) on failure."""
+    try:
+        formulas(path).append(record)
+        return True
+    except (OSError, ValueError) as e:
+        print(e)
+        return False
@@ -2,26 +2,62 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import json
 import os
-import datetime
+import time
+import urllib.request
+from urllib.parse import quote
+
+import catalog
+import shards
+import storage
+import textsearch
+from validation import LABELS, describe, validate_employee, validate_error
 
 # --- File Management Functions ---
 EMPLOYEES_FILE = "funcionarios_julia.json"
-DATA_FILE = "data_julia.json"
+DATA_FILE = "data_julia.json"  # stored as monthly shards under data_julia/ (see shards.py)
 ERROR_TYPES_FILE = "tipos_erro.json"
 LOGO_FILE = "logo.png"
 
+# --- Server Mode ---
+# With SERVER_URL set (e.g. http://192.168.0.10:5000), error records are saved to and
+# searched on server.py, so several machines share the same data.
+SERVER_URL = os.environ.get("SERVER_URL", "").rstrip("/")
+ERRORS = shards.errors(DATA_FILE)
+TEXT_INDEX = textsearch.ShardTextIndex(ERRORS)  # words of observacoes/tipos_erro (local mode)
+CATALOG = catalog.ShardCatalog(ERRORS)  # nr/date/employee/valor of each record (local mode)
+
+# --- Search Results ---
+RESULTS_PAGE_SIZE = 20
+ALL_EMPLOYEES = "(Todos)"
+# Map internal keys to readable labels
+SOLUTION_LABELS = {
+    "desconto": "Desconto",
+    "cobrado": "Cobrado",
+    "acrescimo": "Acréscimo",
+    "deixado_credito": "Deixado de Crédito",
+    "reaproveitamento": "Reaproveitamento",
+    "nao_mudou_valor": "Não mudou valor",
+    "produto_refeito": "Produto Refeito"
+}
+
+def server_request(method, path, payload=None):
+    """Calls server.py and returns the decoded JSON response. Raises OSError on failure."""
+    body = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(f"{SERVER_URL}{path}", data=body, method=method,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)
+
 def create_databases():
     """Ensures the JSON files exist."""
     files_to_init = {
         EMPLOYEES_FILE: {},
-        DATA_FILE: [],
         ERROR_TYPES_FILE: []
     }
 
     for file_path, default_data in files_to_init.items():
         if not os.path.exists(file_path):
-            with open(file_path, 'w') as f:
-                json.dump(default_data, f, indent=4)
+            storage.write_json(file_path, default_data)
 
 # --- Employee Logic ---
 def get_employees():
@@ -33,6 +69,9 @@ def get_employees():
 
 def add_employee_logic(name, is_farmaceutico):
     employees = get_employees()
+    _, errors = validate_employee({"name": name})
+    if errors:
+        return False, describe(errors, LABELS, portuguese=True)
     if name in employees:
         return False, f"Erro: Funcionário '{name}' já existe."
     else:
@@ -40,8 +79,7 @@ def add_employee_logic(name, is_farmaceutico):
         if is_farmaceutico:
             employee_data["role"] = "Farmaceutico"
         employees[name] = employee_data
-        with open(EMPLOYEES_FILE, 'w') as f:
-            json.dump(employees, f, indent=4)
+        storage.write_json(EMPLOYEES_FILE, employees)
         return True, f"Funcionário '{name}' adicionado com sucesso."
 
 def remove_employee_logic(name):
@@ -50,8 +88,7 @@ def remove_employee_logic(name):
         return False, f"Erro: Funcionário '{name}' não encontrado."
     else:
         del employees[name]
-        with open(EMPLOYEES_FILE, 'w') as f:
-            json.dump(employees, f, indent=4)
+        storage.write_json(EMPLOYEES_FILE, employees)
         return True, f"Funcionário '{name}' removido com sucesso."
 
 # --- Error Types Logic ---
@@ -71,8 +108,7 @@ def add_error_type_logic(error_name):
         return False, f"Erro: Tipo de erro '{error_name}' já existe."
     
     errors.append(error_name)
-    with open(ERROR_TYPES_FILE, 'w') as f:
-        json.dump(errors, f, indent=4)
+    storage.write_json(ERROR_TYPES_FILE, errors)
     return True, f"Tipo de erro '{error_name}' cadastrado."
 
 def remove_error_type_logic(error_name):
@@ -81,37 +117,37 @@ def remove_error_type_logic(error_name):
         return False, f"Erro: Tipo de erro '{error_name}' não encontrado."
     
     errors.remove(error_name)
-    with open(ERROR_TYPES_FILE, 'w') as f:
-        json.dump(errors, f, indent=4)
+    storage.write_json(ERROR_TYPES_FILE, errors)
     return True, f"Tipo de erro '{error_name}' excluído."
 
 # --- Save Error Record Logic ---
 def save_error_record(data):
-    """Saves the error record to data_julia.json."""
-    create_databases()
-    try:
-        with open(DATA_FILE, 'r') as f:
-            records = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        records = []
+    """Saves the error record to this month's shard (or to the server in server mode)."""
+    if SERVER_URL:
+        server_request("POST", "/errors", data)
+        return
 
-    records.append(data)
-
-    with open(DATA_FILE, 'w') as f:
-        json.dump(records, f, indent=4)
+    ERRORS.append(data)
+    try:
+        TEXT_INDEX.refresh()  # reads only this record's shard
+    except (OSError, ValueError):
+        pass  # the record is saved; the index catches up on the next search
 
 # --- Search Logic ---
 def search_by_nr(target_nr):
-    """Searches for records matching the NR."""
-    try:
-        with open(DATA_FILE, 'r') as f:
-            records = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-    
-    # Filter records where NR matches
-    # converting to str to ensure match even if saved as int
-    return [r for r in records if str(r.get('nr')) == str(target_nr)]
+    """Record source (catalog.py) of the records matching the NR."""
+    if SERVER_URL:
+        return catalog.ListSource(server_request("GET", f"/errors/nr/{quote(str(target_nr), safe='')}"))
+
+    # The catalog maps each NR to its records' positions in the shards
+    # (NRs compared as str, so a match is found even if saved as int)
+    return CATALOG.source(nr=target_nr)
+
+def search_text(query):
+    """Records whose notes or error types hold every word of the query, newest first."""
+    if SERVER_URL:
+        return server_request("GET", f"/errors/search?q={quote(query, safe='')}")["records"]
+    return TEXT_INDEX.find(query)
 
 # --- GUI Application Class ---
 
@@ -119,7 +155,7 @@ class App:
     def __init__(self, root):
         self.root = root
         self.root.title("Gestão de Erros de Produção")
-        self.root.geometry("450x650") 
+        self.root.geometry("450x710") 
         
         create_databases()
         self.employees = get_employees()
@@ -139,6 +175,9 @@ class App:
             tk.Label(self.main_frame, text="(Logo ausente)", fg="gray", font=("Helvetica", 8)).pack(pady=(0, 10))
         # ========================================
 
+        mode_text = f"Modo: Servidor ({SERVER_URL})" if SERVER_URL else "Modo: Arquivos Locais"
+        tk.Label(self.main_frame, text=mode_text, fg="blue", font=("Arial", 8)).pack()
+
         self.title_label = tk.Label(self.main_frame, text="Menu Principal", font=("Helvetica", 16, "bold"))
         self.title_label.pack(pady=10)
 
@@ -150,6 +189,10 @@ class App:
         self.btn_search = tk.Button(self.main_frame, text="Consultar NR", width=30, bg="#b3e5fc", height=2, command=self.show_search_input_window)
         self.btn_search.pack(pady=5)
 
+        # 2b. Buscar nas observações
+        self.btn_search_text = tk.Button(self.main_frame, text="Buscar nas Observações", width=30, bg="#b3e5fc", command=self.show_text_search_window)
+        self.btn_search_text.pack(pady=5)
+
         tk.Frame(self.main_frame, height=10).pack() # Spacer
 
         # 3. Cadastrar Tipo de Erro
@@ -190,7 +233,11 @@ class App:
                 messagebox.showwarning("Atenção", "Digite um NR.")
                 return
             
-            results = search_by_nr(nr)
+            try:
+                results = search_by_nr(nr)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Erro", f"Falha ao consultar os registros: {e}")
+                return
             if not results:
                 messagebox.showinfo("Resultado", f"Nenhum registro encontrado para o NR: {nr}")
             else:
@@ -201,11 +248,101 @@ class App:
         win.bind('<Return>', perform_search)
         tk.Button(win, text="Buscar", command=perform_search, bg="#2196F3", fg="white").pack(pady=10)
 
-    def show_search_results_window(self, nr, results):
-        """Displays the details of the found NR(s)"""
+    # ==========================================
+    # WINDOW: Search observations (full text)
+    # ==========================================
+    def show_text_search_window(self):
+        """Searches the words of the observations and error types; double-click opens a record."""
+        win = tk.Toplevel(self.root)
+        win.title("Buscar nas Observações")
+        win.geometry("750x450")
+
+        top = tk.Frame(win, padx=10, pady=10)
+        top.pack(fill=tk.X)
+        tk.Label(top, text="Palavras:", font=("Helvetica", 12)).pack(side=tk.LEFT)
+        entry = tk.Entry(top, font=("Helvetica", 12))
+        entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        entry.focus()
+        status = tk.Label(win, text="Ex.: rotulo trocado (acentos e maiúsculas são ignorados)", fg="gray")
+        status.pack(anchor="w", padx=10)
+
+        columns = ("date", "nr", "funcionario", "tipos", "obs")
+        tree = ttk.Treeview(win, columns=columns, show="headings")
+        for column, heading, width in zip(columns, ("Data", "NR", "Funcionário", "Tipos de Erro", "OBS"),
+                                          (80, 70, 120, 160, 300)):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor="w")
+        scrollbar = tk.Scrollbar(win, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True, padx=(10, 0), pady=(5, 10))
+        found = {}
+
+        def perform_search(event=None):
+            query = entry.get().strip()
+            if not textsearch.tokenize(query):
+                messagebox.showwarning("Atenção", "Digite uma ou mais palavras.", parent=win)
+                return
+            started = time.perf_counter()
+            try:
+                results = search_text(query)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Erro", f"Falha ao consultar os registros: {e}", parent=win)
+                return
+            elapsed = (time.perf_counter() - started) * 1000
+            tree.delete(*tree.get_children())
+            found.clear()
+            for data in results:
+                types = data.get('tipos_erro', [])
+                types_str = ", ".join(types) if isinstance(types, list) else str(types)
+                obs = " ".join(str(data.get('observacoes') or "").split())
+                item = tree.insert("", tk.END, values=(data.get('date'), data.get('nr'), data.get('funcionario'), types_str, obs))
+                found[item] = data
+            status.config(text=f"{len(results)} registro(s) em {elapsed:.0f} ms")
+
+        def open_record(event=None):
+            selection = tree.selection()
+            if selection:
+                data = found[selection[0]]
+                self.show_search_results_window(data.get('nr'), catalog.ListSource([data]))
+
+        win.bind('<Return>', perform_search)
+        tree.bind('<Double-1>', open_record)
+        tk.Button(top, text="Buscar", command=perform_search, bg="#2196F3", fg="white").pack(side=tk.LEFT)
+
+    def show_search_results_window(self, nr, source):
+        """Displays the records of the NR (a catalog.py record source) a page at a time.
+
+        Sorting and the employee filter work on the source's entries; only the records
+        of the page on screen are read and rendered.
+        """
         res_win = tk.Toplevel(self.root)
         res_win.title(f"Detalhes do NR: {nr}")
-        res_win.geometry("500x600")
+        res_win.geometry("500x650")
+
+        # Sorting / filter
+        controls = tk.Frame(res_win, padx=10, pady=5)
+        controls.pack(fill=tk.X)
+        sorts = {label: key for key, (label, _, _) in catalog.SORTS.items()}
+        sort_var = tk.StringVar(value=catalog.SORTS["date_desc"][0])
+        employee_var = tk.StringVar(value=ALL_EMPLOYEES)
+        tk.Label(controls, text="Ordenar:").pack(side=tk.LEFT)
+        sort_box = ttk.Combobox(controls, textvariable=sort_var, values=list(sorts), state="readonly", width=14)
+        sort_box.pack(side=tk.LEFT, padx=(2, 10))
+        tk.Label(controls, text="Funcionário:").pack(side=tk.LEFT)
+        employee_box = ttk.Combobox(controls, textvariable=employee_var, values=[ALL_EMPLOYEES] + source.employees(),
+                                    state="readonly", width=16)
+        employee_box.pack(side=tk.LEFT, padx=2)
+
+        # Pages
+        nav = tk.Frame(res_win, pady=5)
+        nav.pack(side=tk.BOTTOM, fill=tk.X)
+        prev_btn = tk.Button(nav, text="< Anterior", command=lambda: turn(-1))
+        prev_btn.pack(side=tk.LEFT, padx=10)
+        next_btn = tk.Button(nav, text="Próxima >", command=lambda: turn(1))
+        next_btn.pack(side=tk.RIGHT, padx=10)
+        page_label = tk.Label(nav)
+        page_label.pack()
 
         # Scrollable Text Area
         txt = tk.Text(res_win, padx=10, pady=10, font=("Helvetica", 10))
@@ -215,59 +352,79 @@ class App:
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         txt.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
-        # Format and insert data
-        for i, data in enumerate(results):
-            txt.insert(tk.END, f"=== REGISTRO {i+1} ===\n", "header")
-            txt.insert(tk.END, f"Data/Hora: {data.get('date')} às {data.get('time')}\n")
-            txt.insert(tk.END, f"Funcionário: {data.get('funcionario')}\n")
-            
-            # Format Value
-            val = data.get('valor', 0)
-            txt.insert(tk.END, f"Valor: R$ {val:.2f}\n")
-            
-            # Error Types
-            types = data.get('tipos_erro', [])
-            if isinstance(types, list):
-                types_str = ", ".join(types)
-            else:
-                types_str = str(types)
-            txt.insert(tk.END, f"Tipos de Erro: {types_str}\n\n")
-
-            # --- Checkbox Solutions (Only True ones) ---
-            txt.insert(tk.END, "Solução / Detalhes:\n", "subheader")
-            solutions = []
-            
-            # Map internal keys to readable labels
-            bool_map = {
-                "desconto": "Desconto",
-                "cobrado": "Cobrado",
-                "acrescimo": "Acréscimo",
-                "deixado_credito": "Deixado de Crédito",
-                "reaproveitamento": "Reaproveitamento",
-                "nao_mudou_valor": "Não mudou valor",
-                "produto_refeito": "Produto Refeito"
-            }
-
-            for key, label in bool_map.items():
-                if data.get(key) is True:
-                    solutions.append(f"• {label}")
-            
-            if solutions:
-                txt.insert(tk.END, "\n".join(solutions) + "\n\n")
-            else:
-                txt.insert(tk.END, "• Nenhuma opção selecionada\n\n")
-
-            # Observations
-            obs = data.get('observacoes', '')
-            txt.insert(tk.END, f"OBS:\n{obs}\n")
-            txt.insert(tk.END, "-"*50 + "\n\n")
-
         # Styles
         txt.tag_config("header", font=("Helvetica", 12, "bold"), background="#eeeeee")
         txt.tag_config("subheader", font=("Helvetica", 10, "bold", "underline"))
+
+        view = {"entries": [], "page": 0}
+
+        def render():
+            entries = view["entries"]
+            pages = max(1, -(-len(entries) // RESULTS_PAGE_SIZE))
+            first = view["page"] * RESULTS_PAGE_SIZE
+            try:
+                records = source.fetch(entries[first:first + RESULTS_PAGE_SIZE])
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Erro", f"Falha ao ler os registros: {e}", parent=res_win)
+                return
+
+            txt.config(state=tk.NORMAL)
+            txt.delete("1.0", tk.END)
+            for number, data in enumerate(records, first + 1):
+                self.insert_record(txt, number, data)
+            # Make read-only
+            txt.config(state=tk.DISABLED)
+            txt.yview_moveto(0)
+
+            page_label.config(text=f"Página {view['page'] + 1} de {pages} ({len(entries)} registros)")
+            prev_btn.config(state=tk.NORMAL if view["page"] > 0 else tk.DISABLED)
+            next_btn.config(state=tk.NORMAL if view["page"] < pages - 1 else tk.DISABLED)
+
+        def turn(step):
+            view["page"] += step
+            render()
+
+        def apply_filters(event=None):
+            employee = employee_var.get()
+            view["entries"] = source.select(sorts[sort_var.get()], None if employee == ALL_EMPLOYEES else employee)
+            view["page"] = 0
+            render()
+
+        sort_box.bind("<<ComboboxSelected>>", apply_filters)
+        employee_box.bind("<<ComboboxSelected>>", apply_filters)
+        apply_filters()
+
+    def insert_record(self, txt, number, data):
+        """Formats one error record into the results Text widget."""
+        txt.insert(tk.END, f"=== REGISTRO {number} ===\n", "header")
+        txt.insert(tk.END, f"Data/Hora: {data.get('date')} às {data.get('time')}\n")
+        txt.insert(tk.END, f"Funcionário: {data.get('funcionario')}\n")
         
-        # Make read-only
-        txt.config(state=tk.DISABLED)
+        # Format Value
+        val = data.get('valor', 0)
+        txt.insert(tk.END, f"Valor: R$ {val:.2f}\n")
+        
+        # Error Types
+        types = data.get('tipos_erro', [])
+        if isinstance(types, list):
+            types_str = ", ".join(types)
+        else:
+            types_str = str(types)
+        txt.insert(tk.END, f"Tipos de Erro: {types_str}\n\n")
+
+        # --- Checkbox Solutions (Only True ones) ---
+        txt.insert(tk.END, "Solução / Detalhes:\n", "subheader")
+        solutions = [f"• {label}" for key, label in SOLUTION_LABELS.items() if data.get(key) is True]
+        
+        if solutions:
+            txt.insert(tk.END, "\n".join(solutions) + "\n\n")
+        else:
+            txt.insert(tk.END, "• Nenhuma opção selecionada\n\n")
+
+        # Observations
+        obs = data.get('observacoes', '')
+        txt.insert(tk.END, f"OBS:\n{obs}\n")
+        txt.insert(tk.END, "-"*50 + "\n\n")
 
     # ==========================================
     # WINDOW: Adicionar Erro 
@@ -369,28 +526,16 @@ class App:
         
         obs_content = self.obs_text.get("1.0", tk.END).strip()
 
-        if not nr or not func or not valor_str:
-            messagebox.showerror("Erro", "Preencha NR, Funcionário e Valor.")
-            return
-
         if not selected_errors or (len(selected_errors) == 1 and selected_errors[0] == "Nenhum tipo cadastrado"):
             messagebox.showerror("Erro", "Selecione pelo menos um Tipo de Erro.")
             return
 
-        try:
-            valor_str = valor_str.replace(",", ".")
-            valor_float = float(valor_str)
-        except ValueError:
-            messagebox.showerror("Erro", "O campo Valor deve ser numérico.")
-            return
-
+        # date/time are filled with the current ones, "12,50" is read as 12.5
         record = {
-            "date": datetime.date.today().isoformat(),
-            "time": datetime.datetime.now().strftime("%H:%M"),
             "nr": nr,
             "tipos_erro": selected_errors,
             "funcionario": func,
-            "valor": valor_float,
+            "valor": valor_str,
             "desconto": self.desconto_var.get(),
             "cobrado": self.cobrado_var.get(),
             "acrescimo": self.acrescimo_var.get(),
@@ -400,8 +545,16 @@ class App:
             "produto_refeito": self.produto_refeito_var.get(),
             "observacoes": obs_content
         }
+        record, errors = validate_error(record)
+        if errors:
+            messagebox.showerror("Erro", describe(errors, LABELS, portuguese=True))
+            return
 
-        save_error_record(record)
+        try:
+            save_error_record(record)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Erro", f"Falha ao salvar o registro: {e}")
+            return
         messagebox.showinfo("Sucesso", "Erro registrado com sucesso!")
         
         self.nr_entry.delete(0, tk.END)
@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    import orjson  # optional (pip install orjson): several times faster than json
+except ImportError:
+    orjson = None
+
+# --- Locking ---
+# Every read-modify-write of a data file goes through `locked(path)`, which takes a
+# per-process thread lock and then an OS-level lock on "<path>.lock". That keeps the
+# JSON files consistent whether the server runs as threads, processes, or both.
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_guard:
+        lock = _thread_locks.get(path)
+        if lock is None:
+            lock = _thread_locks[path] = threading.RLock()
+        return lock
+
+
+class FileLock:
+    """Exclusive cross-process lock held on a sidecar "<path>.lock" file."""
+
+    def __init__(self, path):
+        self.lock_path = path + ".lock"
+        self._fd = None
+
+    def acquire(self):
+        self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.01)
+
+    def release(self):
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+@contextmanager
+def locked(path):
+    """Serializes access to `path` across threads and worker processes."""
+    with _thread_lock(path):
+        with FileLock(path):
+            yield
+
+
+# --- Serialization ---
+# Data files are written compact: they are read by the programs, not by people, and
+# indentation roughly doubles their size and the time to write them. For a readable
+# copy use `python export_json.py`. orjson is used when installed; without it the
+# standard json module writes the same compact form.
+
+def dumps(data):
+    """Compact JSON text (UTF-8, no indentation, one line)."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps_pretty(data):
+    """Indented JSON for people to read (exports)."""
+    return json.dumps(data, indent=4, ensure_ascii=False)
+
+
+def loads(text):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+# --- File I/O ---
+def read_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def write_bytes(path, data):
+    """Writes atomically: readers see either the old or the new file, never a partial one."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_text(path, text):
+    write_bytes(path, text.encode('utf-8'))
+
+
+def read_json(path, default=None):
+    try:
+        return loads(read_text(path))
+    except FileNotFoundError:
+        return default
+
+
+def write_json(path, data):
+    if orjson is not None:
+        write_bytes(path, orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS))
+    else:
+        write_text(path, dumps(data))
+
+
+def ensure_file(path, default):
+    with locked(path):
+        if not os.path.exists(path):
+            write_json(path, default)
@@ -0,0 +1,399 @@
+import os
+import threading
+from collections import deque
+
+import storage
+from shards import month_of
+
+# --- In-memory store with write-ahead log ---
+# Collections live in memory and reads never touch the disk. Every mutation is first
+# appended to the WAL (one JSON line, fsynced), then applied in memory. A background
+# thread periodically writes each changed collection back to its JSON file (the
+# snapshot) and drops the WAL entries it covers. The lock is only held to copy the
+# changed rows and to rotate the WAL; the files are written without it, so reads and
+# writes go on during a snapshot. On startup the snapshots are loaded and the WAL is
+# replayed on top of them. Collections registered with set_shards() are snapshotted as
+# monthly shards (shards.py), rewriting only the months that changed.
+#
+# WAL entries are idempotent, so replaying a WAL over a snapshot that already contains
+# some of its entries (crash between snapshot and truncate) is harmless:
+#   {"v": 7, "c": "formulas",  "op": "insert", "id": 41, "r": {...}}  -> skipped if id exists
+#   {"v": 8, "c": "employees", "op": "put",    "key": "Ana", "r": {...}}
+#   {"v": 9, "c": "employees", "op": "delete", "key": "Ana"}
+
+WAL_FILE = "store.wal"
+META_FILE = "store.meta.json"
+SNAPSHOT_INTERVAL = float(os.environ.get("SNAPSHOT_INTERVAL", "30"))
+WAL_FSYNC = os.environ.get("WAL_FSYNC", "1") != "0"
+# How many recent mutations are kept for the change feed (/changes)
+CHANGE_LOG_SIZE = int(os.environ.get("CHANGE_LOG_SIZE", "10000"))
+
+
+class Store:
+    def __init__(self, collections, wal_file=WAL_FILE, meta_file=META_FILE,
+                 snapshot_interval=SNAPSHOT_INTERVAL, fsync=WAL_FSYNC):
+        """`collections` maps a name to (json_file, default) where default is {} or []."""
+        self.files = {name: path for name, (path, _) in collections.items()}
+        self.defaults = {name: default for name, (_, default) in collections.items()}
+        self.data = {}
+        self.wal_file = wal_file
+        self.meta_file = meta_file
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self.version = 0
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.changes = deque(maxlen=CHANGE_LOG_SIZE)
+        self.indexes = {name: {} for name in collections}
+        self.codecs = {}
+        self.shards = {}
+        self.shard_ids = {}  # sharded collection -> {month: [record ids]}
+        self._dirty_shards = {}
+        self._rewritten_shards = {}  # dirty months whose existing rows changed
+        self._wal = None
+        self._dirty = set()
+        self._snapshot_lock = threading.Lock()  # one snapshot at a time
+        self._stop = threading.Event()
+        self._snapshotter = None
+
+    # --- Lifecycle ---
+    def open(self):
+        with self.lock:
+            for name, path in self.files.items():
+                if name in self.shards:
+                    self._load_shards(name)
+                else:
+                    storage.ensure_file(path, self.defaults[name])
+                    raw = storage.read_json(path, type(self.defaults[name])())
+                    codec = self.codecs.get(name)
+                    self.data[name] = codec.load(raw) if codec else raw
+                self._build_indexes(name)
+            meta = storage.read_json(self.meta_file, {}) or {}
+            self.version = meta.get("version", 0)
+            replayed = self._replay()
+            self._wal = open(self.wal_file, 'a', encoding='utf-8')
+        if replayed:
+            print(f"Store: replayed {replayed} WAL entries (version {self.version})")
+            self.snapshot()
+        if self.snapshot_interval > 0:
+            self._snapshotter = threading.Thread(target=self._snapshot_loop, name="store-snapshot", daemon=True)
+            self._snapshotter.start()
+        return self
+
+    def close(self):
+        if self._wal is None:
+            return
+        self._stop.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        self.snapshot()
+        with self.lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+
+    def _replay(self):
+        if not os.path.exists(self.wal_file):
+            return 0
+        count = 0
+        with open(self.wal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = storage.loads(line)
+                except ValueError:
+                    break  # torn last line from a crash mid-append
+                self._apply(entry)
+                self._dirty.add(entry["c"])
+                if entry["v"] > self.version:
+                    self.version = entry["v"]
+                    self.changes.append(entry)
+                count += 1
+        return count
+
+    # --- Shards ---
+    def set_shards(self, name, sharded):
+        """Stores a list collection as monthly shards (shards.ShardedCollection); snapshots
+        then only rewrite the months that changed."""
+        self.shards[name] = sharded
+
+    def _load_shards(self, name):
+        rows = []
+        self.shard_ids[name] = {}
+        self._dirty_shards[name] = set()
+        self._rewritten_shards[name] = set()
+        for month, shard_rows in self.shards[name].load_shards(self.codecs.get(name)):
+            self.shard_ids[name][month] = list(range(len(rows), len(rows) + len(shard_rows)))
+            rows.extend(shard_rows)
+        self.data[name] = rows
+
+    # --- Codecs ---
+    def set_codec(self, name, codec):
+        """Stores a list collection encoded (see encoding.py); reads decode transparently."""
+        self.codecs[name] = codec
+
+    def decode(self, name, row):
+        codec = self.codecs.get(name)
+        return codec.decode(row) if codec else row
+
+    def intern(self, name, dictionary, value):
+        """Stable integer code of `value` in one of the collection's dictionaries."""
+        with self.lock:
+            code, new_entry = self.codecs[name].intern(dictionary, value)
+            if new_entry is not None:
+                self._log(dict(new_entry, c=name))
+            return code
+
+    def rename_code(self, name, dictionary, code, value):
+        with self.lock:
+            self._log({"c": name, "op": "rename", "dict": dictionary, "id": code, "value": value})
+
+    def _rewrite(self, name, ids):
+        """Has the next snapshot rewrite the shards holding these records, as changed rows
+        (e.g. so the files show an employee's new name). Caller holds the lock."""
+        collection = self.data[name]
+        months = {month_of(self.decode(name, collection[i])) for i in ids}
+        self._dirty_shards[name] |= months
+        self._rewritten_shards[name] |= months
+
+    # --- Indexes ---
+    def add_index(self, name, index_name, index):
+        """Registers a secondary index (see indexes.py) on a list collection."""
+        with self.lock:
+            self.indexes[name][index_name] = index
+            if name in self.data:
+                self._build_indexes(name)
+        return index
+
+    def index(self, name, index_name):
+        return self.indexes[name][index_name]
+
+    def _build_indexes(self, name):
+        for index in self.indexes[name].values():
+            index.clear()
+            for record_id, row in enumerate(self.data[name]):
+                index.add(record_id, self.decode(name, row))
+
+    # --- Mutations ---
+    def _apply(self, entry):
+        collection = self.data[entry["c"]]
+        op = entry["op"]
+        if op == "insert":
+            if entry["id"] == len(collection):
+                collection.append(entry["r"])
+                name = entry["c"]
+                if self.indexes[name] or name in self.shards:
+                    record = self.decode(name, entry["r"])
+                    for index in self.indexes[name].values():
+                        index.add(entry["id"], record)
+                    if name in self.shards:
+                        month = month_of(record)
+                        self.shard_ids[name].setdefault(month, []).append(entry["id"])
+                        self._dirty_shards[name].add(month)
+        elif op in ("code", "rename"):
+            codec = self.codecs[entry["c"]]
+            codec.apply(entry)
+            if op == "rename" and entry["c"] in self.shards:
+                # Also on WAL replay: the files may still show the old value
+                self._rewrite(entry["c"], codec.rows_to_rewrite(entry, collection))
+        elif op == "put":
+            collection[entry["key"]] = entry["r"]
+        elif op == "delete":
+            collection.pop(entry["key"], None)
+
+    def _log(self, entry, sync=True):
+        """Appends to the WAL, then applies in memory. Caller holds the lock."""
+        self.version += 1
+        entry["v"] = self.version
+        self._wal.write(storage.dumps(entry) + "\n")
+        if sync:
+            self._sync()
+        self._apply(entry)
+        self._dirty.add(entry["c"])
+        self.changes.append(entry)
+        self.changed.notify_all()
+        return entry
+
+    def _sync(self):
+        self._wal.flush()
+        if self.fsync:
+            os.fsync(self._wal.fileno())
+
+    def _encode(self, name, record):
+        codec = self.codecs.get(name)
+        if codec is None:
+            return record
+        row, new_codes = codec.encode(record)
+        for new_entry in new_codes:
+            self._log(dict(new_entry, c=name), sync=False)
+        return row
+
+    def insert(self, name, record):
+        """Appends a record to a list collection and returns its id (position)."""
+        with self.lock:
+            row = self._encode(name, record)
+            entry = self._log({"c": name, "op": "insert", "id": len(self.data[name]), "r": row})
+            return entry["id"]
+
+    def insert_many(self, name, records):
+        """Appends several records with a single WAL sync; returns their ids."""
+        with self.lock:
+            ids = []
+            try:
+                for record in records:
+                    row = self._encode(name, record)
+                    entry = self._log({"c": name, "op": "insert", "id": len(self.data[name]), "r": row}, sync=False)
+                    ids.append(entry["id"])
+            finally:
+                self._sync()
+            return ids
+
+    def add(self, name, key, value):
+        """Adds a new key to a dict collection; returns False if it already exists."""
+        with self.lock:
+            if key in self.data[name]:
+                return False
+            self._log({"c": name, "op": "put", "key": key, "r": value})
+            return True
+
+    def put(self, name, key, value):
+        """Sets a key of a dict collection, replacing any previous value."""
+        with self.lock:
+            self._log({"c": name, "op": "put", "key": key, "r": value})
+
+    def delete(self, name, key):
+        """Removes a key from a dict collection; returns False if it does not exist."""
+        with self.lock:
+            if key not in self.data[name]:
+                return False
+            self._log({"c": name, "op": "delete", "key": key})
+            return True
+
+    # --- Reads ---
+    def _records(self, name):
+        codec = self.codecs.get(name)
+        if codec is None:
+            return self.data[name].copy()
+        return [codec.decode(row) for row in self.data[name]]
+
+    def get(self, name):
+        """Decoded copy of a collection, safe to serialize outside the lock."""
+        with self.lock:
+            return self._records(name)
+
+    def get_with_version(self, name):
+        """Like get(), plus the version it reflects (the starting point for /changes)."""
+        with self.lock:
+            return self._records(name), self.version
+
+    def get_many(self, name, ids):
+        """Decoded records of a list collection by id, in the given order."""
+        with self.lock:
+            collection = self.data[name]
+            return [self.decode(name, collection[i]) for i in ids]
+
+    def count(self, name):
+        with self.lock:
+            return len(self.data[name])
+
+    # --- Change feed ---
+    def changes_since(self, since, timeout=0):
+        """Returns (version, entries, reset) for every mutation after `since`.
+
+        Waits up to `timeout` seconds for a new mutation when there is none yet (long-poll).
+        `reset` is True when `since` is older than the retained log, in which case the
+        client has to refetch the full collections.
+        """
+        with self.changed:
+            if since >= self.version and timeout > 0:
+                self.changed.wait_for(lambda: self.version > since, timeout)
+            if since >= self.version:
+                return self.version, [], since > self.version
+            oldest = self.changes[0]["v"] if self.changes else self.version + 1
+            if since + 1 < oldest:
+                return self.version, [], True
+            start = len(self.changes) - (self.version - since)
+            return self.version, [self.changes[i] for i in range(start, len(self.changes))], False
+
+    # --- Snapshots ---
+    def snapshot(self):
+        """Writes changed collections to their JSON files and drops the WAL entries they cover."""
+        with self._snapshot_lock:
+            with self.lock:
+                dirty, self._dirty = self._dirty, set()
+                if not dirty:
+                    return
+                # Copy what changed (rows are never modified in place, so copying the
+                # lists is enough) and remember where the WAL stands
+                copies, shard_months, rewritten = {}, {}, {}
+                for name in dirty:
+                    codec = self.codecs.get(name)
+                    codec = codec.copy() if codec is not None else None
+                    if name in self.shards:
+                        collection, ids = self.data[name], self.shard_ids[name]
+                        shard_months[name], self._dirty_shards[name] = self._dirty_shards[name], set()
+                        rewritten[name], self._rewritten_shards[name] = self._rewritten_shards[name], set()
+                        copies[name] = ({month: [collection[i] for i in ids[month]] for month in shard_months[name]}, codec)
+                    else:
+                        copies[name] = (self.data[name].copy(), codec)
+                version = self.version
+                offset = self._wal_offset()
+
+            try:
+                for name, (data, codec) in copies.items():
+                    if name in self.shards:
+                        self.shards[name].write(data, codec, rewritten.get(name, ()))
+                        continue
+                    path = self.files[name]
+                    with storage.locked(path):
+                        if codec is not None:
+                            storage.write_text(path, codec.dumps(data))
+                        else:
+                            storage.write_json(path, data)
+                storage.write_json(self.meta_file, {"version": version})
+            except OSError:
+                with self.lock:
+                    self._dirty |= dirty  # keep the WAL, retry on the next snapshot
+                    for name, months in shard_months.items():
+                        self._dirty_shards[name] |= months
+                        self._rewritten_shards[name] |= rewritten[name]
+                raise
+
+            with self.lock:
+                self._rotate_wal(offset)
+
+    def _wal_offset(self):
+        """End of the WAL, i.e. of the entries up to self.version. Caller holds the lock."""
+        if self._wal is not None:
+            self._wal.flush()
+            return self._wal.tell()
+        return os.path.getsize(self.wal_file) if os.path.exists(self.wal_file) else 0
+
+    def _rotate_wal(self, offset):
+        """Drops the WAL entries before `offset` (now in the snapshot files), keeping the
+        ones appended while the snapshot was written. Caller holds the lock."""
+        if self._wal is not None:
+            self._wal.flush()
+        size = os.path.getsize(self.wal_file) if os.path.exists(self.wal_file) else 0
+        if size <= offset:
+            if self._wal is not None:
+                self._wal.truncate(0)
+                self._wal.seek(0)
+            else:
+                open(self.wal_file, 'w').close()
+            return
+        with open(self.wal_file, 'rb') as f:
+            f.seek(offset)
+            tail = f.read()
+        reopen = self._wal is not None
+        if reopen:
+            self._wal.close()  # Windows cannot replace an open file
+        storage.write_bytes(self.wal_file, tail)
+        if reopen:
+            self._wal = open(self.wal_file, 'a', encoding='utf-8')
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self.snapshot_interval):
+            try:
+                self.snapshot()
+            except OSError as e:
+                print(f"Store: snapshot failed: {e}")
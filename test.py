@@ -1,45 +1,63 @@
+import os
+import threading
+
 import pandas as pd
 import dash
-from dash import html, dcc, Input, Output
+from dash import html, dcc, Input, Output, State, ClientsideFunction
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import date
 
+from profiling import profiler
+from live_updates import SERVER_URL, LiveCollection
+import shards
+from bitmaps import FormulaBitmaps
+import cube
+import dashcache
+import export_reports
+from precompute import Precomputer, default_ranges
+from jsonstream import chunked
+from downsample import AUTO, chart_title, compact_figure, line_points, resolve_freq
+
 print("--- STARTING APP ---")
 
 # --- LOAD DATA SECTION ---
+# Bitmap indexes for the count charts (bit i = row i of df)
+bitmaps = FormulaBitmaps()
+
+def frame_from_chunks(records):
+    """Builds the DataFrame (and the bitmaps) a chunk of records at a time, so the whole
+    list of dicts is never held in memory next to the DataFrame."""
+    frames = []
+    for chunk in chunked(records):
+        for record in chunk:
+            bitmaps.add(bitmaps.size, record)
+        frames.append(pd.DataFrame(chunk))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+# With SERVER_URL set, data comes from server.py and new formulas are pushed over SSE
+live = LiveCollection(SERVER_URL, "formulas") if SERVER_URL else None
+load_run = profiler.run("load_data")
+loaded_version = "dummy"  # what was loaded, for the shared cache in local mode
 try:
-    print("Attempting to load formulas.json...")
-    df = pd.read_json("formulas.json")
+    if live is not None:
+        print(f"Loading formulas from {SERVER_URL}...")
+        df = frame_from_chunks(live.load())
+    else:
+        print("Attempting to load formulas.json...")
+        formulas = shards.formulas("formulas.json")
+        df = frame_from_chunks(formulas.iter_records())
+        loaded_version = os.path.getmtime(formulas.manifest_path)
     
     # Check if data loaded
     print(f"Data loaded successfully! Found {len(df)} rows.")
+    load_run.lap("read_json")
 
     # Convert date
     df['date'] = pd.to_datetime(df['date'])
+    load_run.lap("parse_dates")
 
-    # 1. Handle "horario" vs "time" (Still needed for timeline charts or fallback)
-    if 'horario' in df.columns:
-        print("Using 'horario' column for time logic.")
-        def get_hour(t):
-            try:
-                return int(str(t).split(':')[0])
-            except:
-                return 0
-        df['hour_int'] = df['horario'].apply(get_hour)
-    
-    elif 'time' in df.columns:
-        print("Using 'time' column for time logic.")
-        def get_hour(t):
-            try:
-                return int(str(t).split(':')[0])
-            except:
-                return 0
-        df['hour_int'] = df['time'].apply(get_hour)
-        
-    else:
-        print("Warning: No time column found. Defaulting to 0.")
-        df['hour_int'] = 0
+    # Records are in the canonical schema (schema.py): "time" and "turno" need no checks
 
 except ValueError as e:
     print(f"Error reading JSON: {e}")
@@ -47,7 +65,7 @@ except ValueError as e:
     # Dummy data fallback with specific categories for testing
     data = {
         'date': pd.date_range(start='2025-05-20', periods=10, freq='D'),
-        'horario': ['09:00', '13:00', '10:00', '14:00', '11:00', '09:30', '15:00', '08:00', '16:00', '10:00'],
+        'time': ['09:00', '13:00', '10:00', '14:00', '11:00', '09:30', '15:00', '08:00', '16:00', '10:00'],
         # NEW: Adding turno to dummy data to test the logic
         'turno': ['manha', 'tarde', 'manha', 'tarde', 'manha', 'manha', 'tarde', 'manha', 'tarde', 'manha'],
         'nr': range(1, 11),
@@ -63,11 +81,86 @@ except ValueError as e:
         'pm_mais_20': [False] * 10
     }
     df = pd.DataFrame(data)
-    df['hour_int'] = df['horario'].apply(lambda x: int(x.split(':')[0]))
+    bitmaps.clear()
+    for row_id, record in enumerate(df.to_dict('records')):
+        bitmaps.add(row_id, record)
+
+load_run.finish()
+
+# --- LIVE UPDATES ---
+df_lock = threading.Lock()
+
+def fold_live_updates():
+    """Appends the formulas pushed since the last callback to df (or reloads on reset)."""
+    global df
+    new_records, reset = live.take()
+    if reset:
+        new_records = live.load()
+    if not new_records:
+        return
+    new_df = pd.DataFrame(new_records)
+    new_df['date'] = pd.to_datetime(new_df['date'])
+    if reset:
+        bitmaps.clear()
+    first_id = bitmaps.size
+    for offset, record in enumerate(new_records):
+        bitmaps.add(first_id + offset, record)
+    df = new_df if reset else pd.concat([df, new_df], ignore_index=True)
+
+# Category Definitions
+SOLIDS_TYPES = ['Cápsulas', 'Sub-lingual/oleosas', 'Capsula',"Sub-Lingual/Cápsulas Oleosas", "Sachês"]
+SEMI_SOLIDS_TYPES = ['Semi-Sólidos',"Líquidos Orais", 'Líquidos orais', 'Semi-solidos', 'Liquidos orais', 'Creme', 'Xarope']
+
+def formulas_cube(frame):
+    """Daily aggregates behind every chart, for the clientside mode (cube.py)."""
+    turno = frame['turno'] if 'turno' in frame else pd.Series('', index=frame.index)
+    manha, tarde = turno == 'manha', turno == 'tarde'
+    solids = frame['tipo_formula'].isin(SOLIDS_TYPES)
+    semi = frame['tipo_formula'].isin(SEMI_SOLIDS_TYPES)
+    totals = {
+        'count': pd.Series(1, index=frame.index), 'manha': manha, 'tarde': tarde,
+        'solids': solids, 'solids_manha': solids & manha, 'solids_tarde': solids & tarde,
+        'semi': semi, 'semi_manha': semi & manha, 'semi_tarde': semi & tarde,
+        'estoque_feito': frame['estoque_feito'].fillna(0), 'estoque_usado': frame['estoque_usado'].fillna(0),
+    }
+    def flagged(flag):
+        return frame[frame[flag] == True]
+    groups = {
+        'tipo_formula': (frame, 'tipo_formula', None),
+        'pesagem': (frame, 'funcionario_pesagem', None),
+        'manipulacao': (frame, 'funcionario_manipulacao', None),
+        'pm': (frame, 'funcionario_pm', None),
+        'estoque_feito': (flagged('estoque_feito'), 'funcionario_manipulacao', None),
+        'refeito_exc': (flagged('refeito_exc'), 'funcionario_pesagem', None),
+        'refeito_pm': (flagged('refeito_pm'), 'funcionario_manipulacao', None),
+        'pm_mais_20': (flagged('pm_mais_20'), 'funcionario_manipulacao', None),
+    }
+    return cube.build(frame, totals, groups)
+
+def count_frame(counts, columns=('Funcionário', 'Contagem')):
+    """{key: count} from FormulaBitmaps.counts() as a two-column DataFrame for px.bar."""
+    return pd.DataFrame(list(counts.items()), columns=list(columns))
+
+if live is not None:
+    live.start()
+
+# Results shared by the worker processes of serve_dash.py (a pass-through otherwise)
+shared_cache = dashcache.for_app("test")
+
+def current_version():
+    """Version of the data the callbacks see: in live mode the server's, once the new
+    formulas are folded into df (so a cache key never names data not in df yet), else
+    the formulas loaded at startup (local mode does not reload)."""
+    if live is None:
+        return loaded_version
+    with df_lock:
+        fold_live_updates()
+    return live.taken_version
 
 # --- DASH APP ---
 app = dash.Dash(__name__, meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1"}])
 app.title = "Painel de Produção de Fórmulas"
+profiler.install(app)
 
 # Calculate Min/Max dates safely for the layout
 min_date = df['date'].min().date()
@@ -80,6 +173,12 @@ app.layout = html.Div(
     children=[
         html.H1("Painel de Produção de Fórmulas", style={"textAlign": "center", "color": "#0056b3", "marginBottom": "30px"}),
 
+        # --- Live updates: a cheap version check, the dashboard only recomputes on change ---
+        dcc.Interval(id='live_tick', interval=1000, disabled=live is None),
+        dcc.Store(id='data_version'),
+        # Clientside mode only (DASH_CLIENTSIDE=1): the daily aggregates the browser filters
+        dcc.Store(id='cube'),
+
         # --- Controls Row ---
         html.Div(
             className="row",
@@ -107,6 +206,7 @@ app.layout = html.Div(
                                 {"label": "Dia", "value": "D"},
                                 {"label": "Semana", "value": "W"},
                                 {"label": "Mês", "value": "M"},
+                                {"label": "Automático", "value": AUTO},
                             ],
                             value="D",
                             clearable=False
@@ -208,27 +308,65 @@ app.layout = html.Div(
     ]
 )
 
-# Callback
 @app.callback(
-    [Output('kpi_cards', 'children'),
-     Output('tipo_formula_pie', 'figure'),
-     Output('production_employee_counts', 'figure'),
-     Output('pm_distinct_bar', 'figure'),
-     Output('weighing_employee_bar', 'figure'),
-     Output('handling_employee_bar', 'figure'),
-     Output('pm_employee_bar', 'figure'),
-     Output('stock_made_employee_bar', 'figure'),
-     Output('exc_reworked_weighing_bar', 'figure'),
-     Output('pm_reworked_handling_bar', 'figure'),
-     Output('formulas_over_time', 'figure'),
-     Output('stock_over_time', 'figure'),
-     Output('pm_mais_20_handling_bar', 'figure')],
-    [Input('date_range_picker', 'start_date'),
-     Input('date_range_picker', 'end_date'),
-     Input('time_filter', 'value')]
+    Output('data_version', 'data'),
+    [Input('live_tick', 'n_intervals')],
+    [State('data_version', 'data')]
 )
-def update_dashboard(start_date, end_date, time_freq):
+def check_live_updates(_, known_version):
+    if live is None or live.version == known_version:
+        return dash.no_update
+    return live.version
+
+# Callback
+DASHBOARD_OUTPUTS = [
+    Output('kpi_cards', 'children'),
+    Output('tipo_formula_pie', 'figure'),
+    Output('production_employee_counts', 'figure'),
+    Output('pm_distinct_bar', 'figure'),
+    Output('weighing_employee_bar', 'figure'),
+    Output('handling_employee_bar', 'figure'),
+    Output('pm_employee_bar', 'figure'),
+    Output('stock_made_employee_bar', 'figure'),
+    Output('exc_reworked_weighing_bar', 'figure'),
+    Output('pm_reworked_handling_bar', 'figure'),
+    Output('formulas_over_time', 'figure'),
+    Output('stock_over_time', 'figure'),
+    Output('pm_mais_20_handling_bar', 'figure')]
+FILTER_INPUTS = [
+    Input('date_range_picker', 'start_date'),
+    Input('date_range_picker', 'end_date'),
+    Input('time_filter', 'value')]
+
+@profiler.timed("update_dashboard")
+@shared_cache.memoize("update_dashboard", current_version, arguments=3)
+def update_dashboard(start_date, end_date, time_freq, _data_version):
+    if live is not None:
+        with df_lock:
+            fold_live_updates()
+        profiler.lap("live_updates")
+
     filtered_df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
+    profiler.lap("filter")
+
+    # Every count below is a bitmap intersection + popcount (see bitmaps.py)
+    with df_lock:
+        selection = bitmaps.select(start=start_date, end=end_date)
+        solids = bitmaps.select(tipos=SOLIDS_TYPES, within=selection)
+        semi = bitmaps.select(tipos=SEMI_SOLIDS_TYPES, within=selection)
+        kpi_counts = {
+            name: (len(subset), len(bitmaps.select(turno='manha', within=subset)), len(bitmaps.select(turno='tarde', within=subset)))
+            for name, subset in (("all", selection), ("solids", solids), ("semi", semi))
+        }
+        tipo_counts = bitmaps.counts('tipo_formula', selection)
+        role_counts = {role: bitmaps.counts(role, selection) for role in ('pesagem', 'manipulacao', 'pm')}
+        flag_counts = {
+            'estoque_feito': bitmaps.counts('manipulacao', bitmaps.select(flag='estoque_feito', within=selection)),
+            'refeito_exc': bitmaps.counts('pesagem', bitmaps.select(flag='refeito_exc', within=selection)),
+            'refeito_pm': bitmaps.counts('manipulacao', bitmaps.select(flag='refeito_pm', within=selection)),
+            'pm_mais_20': bitmaps.counts('manipulacao', bitmaps.select(flag='pm_mais_20', within=selection)),
+        }
+    profiler.lap("bitmap_counts")
 
     if filtered_df.empty:
         empty_fig = go.Figure()
@@ -242,44 +380,11 @@ def update_dashboard(start_date, end_date, time_freq):
     # KPI LOGIC (MODIFIED FOR TURNO)
     # ==========================
     
-    # 1. General Totals
-    total_formulas = len(filtered_df)
-
-    # 2. Category Definitions
-    solids_types = ['Cápsulas', 'Sub-lingual/oleosas', 'Capsula',"Sub-Lingual/Cápsulas Oleosas", "Sachês"] 
-    semi_solids_types = ['Semi-Sólidos',"Líquidos Orais", 'Líquidos orais', 'Semi-solidos', 'Liquidos orais', 'Creme', 'Xarope']
-
-    # 3. Filter Dataframes
-    df_solids = filtered_df[filtered_df['tipo_formula'].isin(solids_types)]
-    df_semi = filtered_df[filtered_df['tipo_formula'].isin(semi_solids_types)]
-
-    solids_total = len(df_solids)
-    semi_total = len(df_semi)
-
-    # ---------------------------------------------------------
-    # CONDITIONAL LOGIC: TURNO vs TIMESTAMP
-    # ---------------------------------------------------------
-    if 'turno' in filtered_df.columns:
-        # Use explicit flags if the column exists
-        formulas_morning = len(filtered_df[filtered_df['turno'] == 'manha'])
-        formulas_afternoon = len(filtered_df[filtered_df['turno'] == 'tarde'])
-        
-        solids_am = len(df_solids[df_solids['turno'] == 'manha'])
-        solids_pm = len(df_solids[df_solids['turno'] == 'tarde'])
-        
-        semi_am = len(df_semi[df_semi['turno'] == 'manha'])
-        semi_pm = len(df_semi[df_semi['turno'] == 'tarde'])
-    else:
-        # Fallback to Old Logic (Time < 12)
-        formulas_morning = len(filtered_df[filtered_df['hour_int'] < 12])
-        formulas_afternoon = len(filtered_df[filtered_df['hour_int'] >= 12])
-        
-        solids_am = len(df_solids[df_solids['hour_int'] < 12])
-        solids_pm = len(df_solids[df_solids['hour_int'] >= 12])
-        
-        semi_am = len(df_semi[df_semi['hour_int'] < 12])
-        semi_pm = len(df_semi[df_semi['hour_int'] >= 12])
-    # ---------------------------------------------------------
+    # 1. General Totals + category totals
+    # Turno: filled from the time for records that had none (schema.py)
+    total_formulas, formulas_morning, formulas_afternoon = kpi_counts["all"]
+    solids_total, solids_am, solids_pm = kpi_counts["solids"]
+    semi_total, semi_am, semi_pm = kpi_counts["semi"]
 
     # 6. Styling
     big_card_style = {
@@ -336,70 +441,107 @@ def update_dashboard(start_date, end_date, time_freq):
             ])
         ])
     ])
+    profiler.lap("kpis")
 
     # --- Charts Generation ---
-    formula_counts = filtered_df['tipo_formula'].value_counts().reset_index()
-    formula_counts.columns = ['tipo_formula', 'count']
+    formula_counts = count_frame(tipo_counts, ['tipo_formula', 'count'])
     tipo_formula_pie = px.pie(formula_counts, values='count', names='tipo_formula', title='Distribuição por Tipo', hole=.4)
     tipo_formula_pie.update_traces(textposition='inside', textinfo='percent+label')
+    profiler.lap("tipo_formula_pie")
 
-    prod_melted = filtered_df.melt(id_vars=['date'], value_vars=['funcionario_pesagem', 'funcionario_manipulacao'], var_name='role', value_name='employee')
-    production_counts = prod_melted.groupby('employee').size().reset_index(name='count').sort_values('count', ascending=False)
+    production_totals = dict(role_counts['pesagem'])
+    for employee, count in role_counts['manipulacao'].items():
+        production_totals[employee] = production_totals.get(employee, 0) + count
+    production_counts = count_frame(production_totals, ['employee', 'count']).sort_values('count', ascending=False)
     production_fig = px.bar(production_counts, x='employee', y='count', color='employee', title="Produção (Pesagem + Manipulação)", text_auto=True)
     production_fig.update_layout(showlegend=False)
+    profiler.lap("production_employee_counts")
 
-    pm_counts_distinct = filtered_df['funcionario_pm'].value_counts().reset_index()
-    pm_counts_distinct.columns = ['Funcionário', 'Contagem']
+    pm_counts_distinct = count_frame(role_counts['pm'])
     pm_distinct_fig = px.bar(pm_counts_distinct, x='Funcionário', y='Contagem', title='Verificadas (PM)', text_auto=True, color_discrete_sequence=['#6f42c1'])
+    profiler.lap("pm_distinct_bar")
 
-    weighing_counts = filtered_df['funcionario_pesagem'].value_counts().reset_index()
-    weighing_counts.columns = ['Funcionário', 'Contagem']
+    weighing_counts = count_frame(role_counts['pesagem'])
     weighing_fig = px.bar(weighing_counts, x='Funcionário', y='Contagem', title='Pesagem', text_auto=True)
+    profiler.lap("weighing_employee_bar")
 
-    handling_counts = filtered_df['funcionario_manipulacao'].value_counts().reset_index()
-    handling_counts.columns = ['Funcionário', 'Contagem']
+    handling_counts = count_frame(role_counts['manipulacao'])
     handling_fig = px.bar(handling_counts, x='Funcionário', y='Contagem', title='Manipulação', text_auto=True)
+    profiler.lap("handling_employee_bar")
 
-    pm_counts = filtered_df['funcionario_pm'].value_counts().reset_index()
-    pm_counts.columns = ['Funcionário', 'Contagem']
+    pm_counts = count_frame(role_counts['pm'])
     pm_fig = px.bar(pm_counts, x='Funcionário', y='Contagem', title='Verificadas (PM) Detalhe', text_auto=True)
+    profiler.lap("pm_employee_bar")
     
-    stock_made_df = filtered_df[filtered_df['estoque_feito'] == True]
-    stock_made_counts = stock_made_df['funcionario_manipulacao'].value_counts().reset_index()
-    stock_made_counts.columns = ['Funcionário', 'Contagem']
+    stock_made_counts = count_frame(flag_counts['estoque_feito'])
     stock_made_fig = px.bar(stock_made_counts, x='Funcionário', y='Contagem', title='Estoque Feito', text_auto=True)
+    profiler.lap("stock_made_employee_bar")
 
-    exc_reworked_df = filtered_df[filtered_df['refeito_exc'] == True]
-    exc_reworked_counts = exc_reworked_df['funcionario_pesagem'].value_counts().reset_index()
-    exc_reworked_counts.columns = ['Funcionário', 'Contagem']
+    exc_reworked_counts = count_frame(flag_counts['refeito_exc'])
     exc_reworked_fig = px.bar(exc_reworked_counts, x='Funcionário', y='Contagem', title='Refeito EXC', text_auto=True)
+    profiler.lap("exc_reworked_weighing_bar")
 
-    pm_reworked_df = filtered_df[filtered_df['refeito_pm'] == True]
-    pm_reworked_counts = pm_reworked_df['funcionario_manipulacao'].value_counts().reset_index()
-    pm_reworked_counts.columns = ['Funcionário', 'Contagem']
+    pm_reworked_counts = count_frame(flag_counts['refeito_pm'])
     pm_reworked_fig = px.bar(pm_reworked_counts, x='Funcionário', y='Contagem', title='Refeito PM', text_auto=True)
-
-    formulas_over_time_df = filtered_df.groupby(pd.Grouper(key='date', freq=time_freq)).size().reset_index(name='count')
-    formulas_over_time_fig = px.line(formulas_over_time_df, x='date', y='count', markers=True, title='Histórico de Produção')
-
-    stock_over_time_df = filtered_df.groupby(pd.Grouper(key='date', freq=time_freq)).agg({
+    profiler.lap("pm_reworked_handling_bar")
+
+    # Timelines stay under downsample.MAX_POINTS points whatever the date range
+    freq = resolve_freq(time_freq, start_date, end_date)
+    formulas_over_time_df = filtered_df.groupby(pd.Grouper(key='date', freq=freq)).size().reset_index(name='count')
+    dates, values, sampled = line_points(formulas_over_time_df, 'date', ['count'])
+    formulas_over_time_fig = go.Figure(go.Scatter(x=dates, y=values['count'], mode='lines+markers', name='Fórmulas'))
+    formulas_over_time_fig.update_layout(title=chart_title('Histórico de Produção', freq, time_freq, sampled))
+    compact_figure(formulas_over_time_fig)
+    profiler.lap("formulas_over_time")
+
+    stock_over_time_df = filtered_df.groupby(pd.Grouper(key='date', freq=freq)).agg({
         'estoque_feito': 'sum',
         'estoque_usado': 'sum'
     }).reset_index()
+    dates, values, sampled = line_points(stock_over_time_df, 'date', ['estoque_feito', 'estoque_usado'])
     stock_over_time_fig = go.Figure()
-    stock_over_time_fig.add_trace(go.Scatter(x=stock_over_time_df['date'], y=stock_over_time_df['estoque_feito'], mode='lines+markers', name='Estoque Feito'))
-    stock_over_time_fig.add_trace(go.Scatter(x=stock_over_time_df['date'], y=stock_over_time_df['estoque_usado'], mode='lines+markers', name='Estoque Usado'))
-    stock_over_time_fig.update_layout(title='Estoque (Linha do Tempo)', hovermode="x unified")
+    stock_over_time_fig.add_trace(go.Scatter(x=dates, y=values['estoque_feito'], mode='lines+markers', name='Estoque Feito'))
+    stock_over_time_fig.add_trace(go.Scatter(x=dates, y=values['estoque_usado'], mode='lines+markers', name='Estoque Usado'))
+    stock_over_time_fig.update_layout(title=chart_title('Estoque (Linha do Tempo)', freq, time_freq, sampled))
+    compact_figure(stock_over_time_fig)
+    profiler.lap("stock_over_time")
 
-    pm_mais_20_df = filtered_df[filtered_df['pm_mais_20'] == True]
-    pm_mais_20_counts = pm_mais_20_df['funcionario_manipulacao'].value_counts().reset_index()
-    pm_mais_20_counts.columns = ['Funcionário', 'Contagem']
+    pm_mais_20_counts = count_frame(flag_counts['pm_mais_20'])
     pm_mais_20_fig = px.bar(pm_mais_20_counts, x='Funcionário', y='Contagem', title='PM +20', text_auto=True)
+    profiler.lap("pm_mais_20_handling_bar")
 
     return (kpi_layout, tipo_formula_pie, production_fig, pm_distinct_fig, weighing_fig, handling_fig, pm_fig, 
             stock_made_fig, exc_reworked_fig, pm_reworked_fig, formulas_over_time_fig, stock_over_time_fig,
             pm_mais_20_fig)
 
+if cube.CLIENTSIDE:
+    # Filters run in the browser (assets/clientside.js); the server only rebuilds the
+    # cube when the data changes
+    @app.callback(Output('cube', 'data'), [Input('data_version', 'data')])
+    @profiler.timed("update_cube")
+    @shared_cache.memoize("update_cube", current_version, arguments=0)
+    def update_cube(_data_version):
+        with df_lock:
+            if live is not None:
+                fold_live_updates()
+            return formulas_cube(df)
+
+    app.clientside_callback(ClientsideFunction(namespace='formulas', function_name='update_dashboard'),
+                            DASHBOARD_OUTPUTS, FILTER_INPUTS + [Input('cube', 'data')])
+else:
+    app.callback(DASHBOARD_OUTPUTS, FILTER_INPUTS + [Input('data_version', 'data')])(update_dashboard)
+
+# --- Precompute: the default views are in the cache before anyone opens them ---
+def precompute_views():
+    if cube.CLIENTSIDE:
+        return {"cube": lambda: update_cube(None)}
+    return {view: (lambda start=start, end=end: update_dashboard(start, end, 'D', None))
+            for view, (start, end) in default_ranges(min_date, max_date).items()}
+
+precomputer = Precomputer("test", current_version, precompute_views, getattr(shared_cache, "directory", None)).start()
+precomputer.install(app)
+export_reports.install(app)  # closed periods, pre-rendered by export_reports.py
+
 if __name__ == "__main__":
     print("Starting Server on Port 8050...")
     app.run(debug=True, host='127.0.0.1', port=8050)
\ No newline at end of file
@@ -0,0 +1,154 @@
+import bisect
+import re
+import unicodedata
+
+from shards import ShardFollower
+
+# --- Full-text search over the error records ---
+# An inverted index from the words of "observacoes" and of the error type names to the
+# records holding them. Words are compared without case or accents, so "Rótulo",
+# "rotulo" and "RÓTULO" are the same word, and every word of a query matches as a
+# prefix ("rotul" finds "rótulo" and "rotulagem"); a record must match all of them.
+#
+#   index.search("rotulo trocado")  ->  ids of the records with both words
+#
+# TextIndex has the interface of the Store's indexes (indexes.py), so server.py keeps it
+# up to date on every insert. Without a server, ShardTextIndex keeps the same index for
+# the shard files in a JSON file next to their manifest, with (month, position) ids; it
+# reads only the shards that grew since it was saved, so it catches up with records
+# written by any app (the bookkeeping is shards.ShardFollower's).
+
+INDEX_FORMAT = "text-v1"
+INDEX_FILE = "text_index.json"
+_WORD = re.compile(r"\w+")
+# Too common in the notes to narrow a search
+STOPWORDS = frozenset("a o as os ao aos de da do das dos e em na no nas nos um uma uns umas "
+                      "para por pra pro com sem que se".split())
+
+
+def normalize(text):
+    """Lowercase, without accents: "Rótulo" -> "rotulo"."""
+    decomposed = unicodedata.normalize("NFKD", str(text).casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    return [word for word in _WORD.findall(normalize(text)) if word not in STOPWORDS]
+
+
+def record_words(record):
+    """The distinct words of a record's notes and error types."""
+    types = record.get("tipos_erro") or []
+    types = [types] if isinstance(types, str) else types
+    words = tokenize(record.get("observacoes") or "")
+    for name in types:
+        words += tokenize(name)
+    return set(words)
+
+
+class TextIndex:
+    """word -> ids of the records holding it (ids in insertion order)."""
+
+    def __init__(self):
+        self.postings = {}
+        self._vocabulary = None  # sorted words, rebuilt after new words appear
+
+    def clear(self):
+        self.postings = {}
+        self._vocabulary = None
+
+    def add(self, record_id, record):
+        """Indexes a record; returns its words."""
+        words = record_words(record)
+        for word in words:
+            if word not in self.postings:
+                self.postings[word] = []
+                self._vocabulary = None
+            self.postings[word].append(record_id)
+        return words
+
+    def vocabulary(self):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+    def prefix_ids(self, prefix):
+        """Ids of the records with a word starting with `prefix`."""
+        vocabulary = self.vocabulary()
+        position = bisect.bisect_left(vocabulary, prefix)
+        ids = set()
+        while position < len(vocabulary) and vocabulary[position].startswith(prefix):
+            ids.update(self.postings[vocabulary[position]])
+            position += 1
+        return ids
+
+    def search(self, query):
+        """Sorted ids of the records matching every word of `query` (none for an empty query)."""
+        words = sorted(set(tokenize(query)), key=len, reverse=True)  # longest (rarest) first
+        if not words:
+            return []
+        ids = self.prefix_ids(words[0])
+        for word in words[1:]:
+            if not ids:
+                break
+            ids &= self.prefix_ids(word)
+        return sorted(ids)
+
+
+class ShardTextIndex(ShardFollower, TextIndex):
+    """TextIndex of a ShardedCollection (shards.py), saved next to its manifest."""
+
+    format = INDEX_FORMAT
+    file_name = INDEX_FILE
+
+    def __init__(self, collection):
+        TextIndex.__init__(self)
+        ShardFollower.__init__(self, collection)
+
+    def _clear(self):
+        self.clear()
+
+    def _state(self):
+        postings = {}
+        for word, ids in self.postings.items():
+            by_month = postings[word] = {}
+            for month, position in ids:
+                by_month.setdefault(month, []).append(position)
+        return {"postings": postings}
+
+    def _load_state(self, data):
+        self.postings = {word: [(month, position) for month, positions in by_month.items() for position in positions]
+                         for word, by_month in data["postings"].items()}
+        self._vocabulary = None
+
+    def _fold(self, month, start, rows):
+        postings = {}
+        for position in range(start, len(rows)):
+            for word in self.add((month, position), rows[position]):
+                postings.setdefault(word, []).append(position)
+        return {"postings": postings}
+
+    def _apply_delta(self, delta):
+        month = delta["month"]
+        for word, positions in delta["postings"].items():
+            if word not in self.postings:
+                self.postings[word] = []
+                self._vocabulary = None
+            self.postings[word].extend((month, position) for position in positions)
+
+    def find(self, query):
+        """Records matching `query`, newest first."""
+        self.refresh()
+        ids = self.search(query)
+        if not ids:
+            return []
+        manifest = self.collection.manifest()
+        by_month = {}
+        for month, position in ids:
+            by_month.setdefault(month, []).append(position)
+        records = []
+        for month, positions in by_month.items():
+            rows = self.collection.read_rows(manifest["shards"][month], manifest)
+            records += [rows[position] for position in positions if position < len(rows)]
+        records.sort(key=lambda record: (str(record.get("date") or ""), str(record.get("time") or "")), reverse=True)
+        return records
@@ -0,0 +1,259 @@
+import datetime
+import math
+import re
+from functools import lru_cache
+
+from schema import FLAGS as FORMULA_FLAGS
+
+# --- Record validation ---
+# One declarative spec per record type (formula, employee, error), compiled once into
+# a validator shared by every entry point: the Tk forms, server.py (single and batch
+# endpoints), server_async.py and migrate_formulas.py --import.
+#
+#   record, errors = validate_formula({"nr": "123", "date": "2025-09-16", ...})
+#
+# A validator returns the record normalized (nr as int, valor as float, flags as bool,
+# dates as YYYY-MM-DD, times as HH:MM) and a list of (field, problem) pairs, empty when
+# the record is valid. Only valid records reach the data files, so readers (dashboards,
+# reports) never need to coerce or skip bad values. Fields outside the spec are kept
+# as they are.
+#
+# Compiling turns the spec into one generated function with a block per field, so
+# validating a record does no loops or lookups into the spec: 100k formulas take
+# about a quarter of a second.
+
+PROBLEMS = {
+    "object": ("must be a JSON object", "registro inválido"),
+    "required": ("is required", "é obrigatório"),
+    "integer": ("must be an integer", "deve ser um número inteiro"),
+    "number": ("must be a number", "deve ser numérico"),
+    "date": ("must be a date (YYYY-MM-DD)", "deve ser uma data (AAAA-MM-DD)"),
+    "time": ("must be a time (HH:MM)", "deve ser um horário (HH:MM)"),
+    "flag": ("must be true or false", "deve ser verdadeiro ou falso"),
+    "choice": ("has an unknown value", "tem um valor desconhecido"),
+    "text": ("must be text", "deve ser texto"),
+    "list": ("must be a list of text", "deve ser uma lista de textos"),
+}
+
+_TIME = re.compile(r"^(\d{1,2}):(\d{2})(?::\d{2})?$")
+# True/1 and False/0 are the same dict keys
+_FLAGS = {True: True, False: False, **{text: True for text in ("true", "1", "sim", "s", "yes")},
+          **{text: False for text in ("false", "0", "nao", "não", "n", "no")}}
+
+
+# --- Converters: value -> normalized value, or ValueError ---
+def _text(value):
+    if type(value) is str:
+        return value.strip()
+    if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+        raise ValueError
+    return str(value).strip()
+
+
+def _integer(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError
+    return int(value)
+
+
+def _number(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, str):
+        value = value.strip().replace(",", ".")
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError
+    return number
+
+
+@lru_cache(maxsize=4096)
+def _date(value):
+    # Timestamps ("2025-09-16T11:21:00") keep their day; bulk data repeats days, hence the cache
+    return datetime.date.fromisoformat(value[:10]).isoformat()
+
+
+@lru_cache(maxsize=4096)
+def _time(value):
+    match = _TIME.match(value.strip())
+    if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+        raise ValueError
+    return f"{int(match.group(1)):02d}:{match.group(2)}"
+
+
+def _flag(value):
+    if type(value) is str:
+        value = value.strip().lower()
+    return _FLAGS[value]
+
+
+def _text_list(value):
+    if not isinstance(value, (list, tuple)):
+        raise ValueError
+    items = [_text(item) for item in value]
+    return [item for item in items if item]
+
+
+def _choice(values):
+    allowed = frozenset(values)
+
+    def convert(value):
+        if value not in allowed:
+            raise ValueError
+        return value
+    return convert
+
+
+def _today():
+    return datetime.date.today().isoformat()
+
+
+def _now():
+    return datetime.datetime.now().strftime("%H:%M")
+
+
+# --- Specs ---
+class Field:
+    """How to check one field: `kind` names the converter (and the problem reported)."""
+
+    CONVERTERS = {"text": _text, "integer": _integer, "number": _number, "date": _date,
+                  "time": _time, "flag": _flag, "list": _text_list}
+
+    def __init__(self, kind, required=False, default=None, choices=None):
+        self.kind = kind
+        self.required = required
+        self.default = default  # callable filling a missing optional field
+        self.convert = _choice(choices) if choices is not None else self.CONVERTERS[kind]
+
+
+def compile_spec(spec):
+    """A validator for `spec` ({field: Field}): record -> (normalized record, errors).
+
+    The spec is turned into the source of one straight-line function (a block per
+    field, converters bound as globals) and compiled with exec().
+    """
+    namespace = {"_ERRORS": (TypeError, ValueError, KeyError, AttributeError)}
+    lines = ["def validate(record):",
+             "    if not isinstance(record, dict):",
+             "        return None, [(None, 'object')]",
+             "    clean = dict(record)",
+             "    errors = []",
+             "    get = record.get"]
+    for position, (name, field) in enumerate(spec.items()):
+        namespace[f"convert_{position}"] = field.convert
+        namespace[f"default_{position}"] = field.default
+        if field.required:
+            missing = f"errors.append(({name!r}, 'required'))"
+        elif field.default is not None:
+            missing = f"clean[{name!r}] = default_{position}()"
+        else:
+            missing = None  # left as it is
+        lines += [f"    value = get({name!r})",
+                  "    if value is not None and value != '':",
+                  "        try:",
+                  f"            value = convert_{position}(value)",
+                  "        except _ERRORS:",
+                  f"            errors.append(({name!r}, {field.kind!r}))",
+                  "        else:"]
+        if field.kind in ("text", "list") and missing:
+            # Blank text and empty lists count as missing
+            lines += ["            if value:",
+                      f"                clean[{name!r}] = value",
+                      "            else:",
+                      f"                {missing}"]
+        else:
+            lines += [f"            clean[{name!r}] = value"]
+        if missing:
+            lines += ["    else:",
+                      f"        {missing}"]
+    lines.append("    return clean, errors")
+    exec("\n".join(lines), namespace)
+    return namespace["validate"]
+
+
+def validate_many(validate, records, limit=20):
+    """(valid records, [(position, errors)]) of a batch; stops collecting errors after `limit`."""
+    valid = []
+    rejected = []
+    for position, record in enumerate(records):
+        clean, errors = validate(record)
+        if errors:
+            if len(rejected) < limit:
+                rejected.append((position, errors))
+            else:
+                break
+        else:
+            valid.append(clean)
+    return valid, rejected
+
+
+def describe(errors, labels=None, portuguese=False):
+    """One line per problem: "Field 'nr' must be an integer." / "NR: deve ser um número inteiro."."""
+    lines = []
+    for name, problem in errors:
+        text = PROBLEMS[problem][1 if portuguese else 0]
+        if name is None:
+            lines.append(text[0].upper() + text[1:] + ".")
+        elif portuguese:
+            lines.append(f"{(labels or {}).get(name, name)}: {text}.")
+        else:
+            lines.append(f"Field '{name}' {text}.")
+    return "\n".join(lines) if portuguese else " ".join(lines)
+
+
+ERROR_FLAGS = ("desconto", "cobrado", "acrescimo", "deixado_credito", "reaproveitamento",
+               "nao_mudou_valor", "produto_refeito")
+
+FORMULA = {
+    "date": Field("date", default=_today),
+    "time": Field("time"),
+    "horario": Field("time"),  # version-0 name of "time" (schema.py)
+    "nr": Field("integer", required=True),
+    "turno": Field("choice", choices=("manha", "tarde")),
+    "tipo_formula": Field("text"),
+    "funcionario_pesagem": Field("text", required=True),
+    "funcionario_manipulacao": Field("text", required=True),
+    "funcionario_pm": Field("text"),
+    **{flag: Field("flag") for flag in FORMULA_FLAGS},
+}
+
+EMPLOYEE = {
+    "name": Field("text", required=True),
+    "role": Field("choice", choices=("Farmaceutico", "Operador")),
+}
+
+ERROR = {
+    "date": Field("date", default=_today),
+    "time": Field("time", default=_now),
+    "nr": Field("text", required=True),
+    "funcionario": Field("text", required=True),
+    "valor": Field("number", required=True),
+    "tipos_erro": Field("list"),
+    **{flag: Field("flag") for flag in ERROR_FLAGS},
+    "observacoes": Field("text"),
+}
+
+# Form labels, for the messages shown by the Tk apps
+LABELS = {"nr": "NR", "date": "Data", "time": "Horário", "turno": "Turno", "tipo_formula": "Tipo de fórmula",
+          "funcionario_pesagem": "Pesagem", "funcionario_manipulacao": "Manipulação", "funcionario_pm": "PM",
+          "name": "Nome", "role": "Função", "funcionario": "Funcionário", "valor": "Valor",
+          "tipos_erro": "Tipos de erro", "observacoes": "OBS"}
+
+validate_formula = compile_spec(FORMULA)
+validate_employee = compile_spec(EMPLOYEE)
+validate_error = compile_spec(ERROR)
+
+
+def validate_formula_chunk(records):
+    """(valid records, [(record, errors)]) of one chunk, for worker processes (see migrate_formulas.py)."""
+    valid = []
+    rejected = []
+    for record in records:
+        clean, errors = validate_formula(record)
+        if errors:
+            rejected.append((record, errors))
+        else:
+            valid.append(clean)
+    return valid, rejected